@@ -0,0 +1,190 @@
+"""
+Archivo de movimientos de años cerrados en bases aparte, una por año.
+
+La tabla movimientos solo crece. Para que stock.db siga chica, los movimientos
+de los años ya cerrados se mueven a un archivo por año (stock-movimientos-2023.db,
+junto a la base) y el año queda anotado en archivos_movimientos. Las consultas
+de inventario (get_pagina_movimientos, contar_movimientos, ...) parten el rango
+de fechas en tramos y leen cada tramo de su base, adjuntándola con ATTACH solo
+si el rango la necesita. Los resúmenes diarios y mensuales quedan en la base
+principal, así los reportes por período no necesitan los archivos.
+
+Para archivar los años cerrados y compactar la base:
+    python cli.py archivar
+"""
+import os
+from datetime import date, datetime
+
+import db
+from db import get_conn, transaccion
+
+
+def crear_tabla(c):
+    """Crea el registro de años archivados (la usa la migración que lo introduce)."""
+    c.execute('''CREATE TABLE IF NOT EXISTS archivos_movimientos (
+        anio INTEGER PRIMARY KEY,
+        archivo TEXT NOT NULL,   -- nombre del archivo, en la carpeta de la base
+        movimientos INTEGER NOT NULL,
+        fecha TEXT NOT NULL
+    )''')
+
+
+def nombre_archivo(anio):
+    """Nombre del archivo del año, derivado del de la base (stock.db -> stock-movimientos-2023.db)."""
+    base = os.path.splitext(os.path.basename(db.DB_NAME))[0]
+    return f"{base}-movimientos-{anio}.db"
+
+
+def _ruta(archivo):
+    return os.path.join(os.path.dirname(os.path.abspath(db.DB_NAME)), archivo)
+
+
+def _alias(anio):
+    return f"movimientos_{anio}"
+
+
+def rango(anio):
+    """(desde, hasta) del año como texto 'YYYY-MM-DD'; hasta es exclusivo."""
+    return date(anio, 1, 1).isoformat(), date(anio + 1, 1, 1).isoformat()
+
+
+def anios_archivados(c=None):
+    """
+    Años archivados, de menor a mayor.
+    Parámetros:
+        c: Cursor a usar (p. ej. el de una migración); por defecto, la conexión del hilo.
+    """
+    c = c or get_conn()
+    existe = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='archivos_movimientos'").fetchone()
+    if not existe:
+        return []
+    return [fila[0] for fila in c.execute("SELECT anio FROM archivos_movimientos ORDER BY anio").fetchall()]
+
+
+def tabla_movimientos(anio):
+    """
+    Adjunta el archivo del año a la conexión del hilo y devuelve el nombre calificado
+    de su tabla de movimientos (p. ej. 'movimientos_2023.movimientos').
+    """
+    fila = get_conn().execute("SELECT archivo FROM archivos_movimientos WHERE anio = ?", (anio,)).fetchone()
+    if fila is None:
+        raise ValueError(f"El año {anio} no está archivado.")
+    ruta = _ruta(fila[0])
+    if not os.path.exists(ruta):
+        raise ValueError(f"No se encontró el archivo de movimientos {ruta}.")
+    db.adjuntar(_alias(anio), ruta)
+    return f"{_alias(anio)}.movimientos"
+
+
+def tramos(desde, hasta):
+    """
+    Parte el rango [desde, hasta) según dónde están guardados sus movimientos.
+    Retorna:
+        list: Tuplas (desde, hasta, anio) del tramo más nuevo al más viejo; anio es None
+              para los tramos de la base principal y el año archivado para los demás.
+    """
+    resultado = []
+    inicio = desde
+    for anio in anios_archivados():
+        anio_desde, anio_hasta = rango(anio)
+        if anio_hasta <= inicio or anio_desde >= hasta:
+            continue
+        if inicio < anio_desde:
+            resultado.append((inicio, anio_desde, None))
+        resultado.append((max(inicio, anio_desde), min(hasta, anio_hasta), anio))
+        inicio = min(hasta, anio_hasta)
+    if inicio < hasta:
+        resultado.append((inicio, hasta, None))
+    return resultado[::-1]
+
+
+def anios_cerrados():
+    """Años anteriores al actual que todavía tienen movimientos en la base principal."""
+    conn = get_conn()
+    anios = []
+    limite = rango(date.today().year)[0]
+    # Un MIN por año sobre el índice de fecha, sin recorrer la tabla
+    fecha = conn.execute("SELECT MIN(fecha) FROM movimientos WHERE fecha < ?", (limite,)).fetchone()[0]
+    while fecha is not None:
+        anio = int(fecha[:4])
+        anios.append(anio)
+        fecha = conn.execute("SELECT MIN(fecha) FROM movimientos WHERE fecha >= ? AND fecha < ?",
+                             (rango(anio)[1], limite)).fetchone()[0]
+    return anios
+
+
+def archivar_anio(anio):
+    """
+    Mueve los movimientos del año a su archivo. Se hace en dos pasos: primero se copian
+    al archivo (sin bloquear las escrituras de la base principal) y después, en una
+    transacción de la base principal, se borran los ya copiados y se anota el año.
+    Si se corta en el medio, volver a archivar el año completa el trabajo.
+    Parámetros:
+        anio (int): Año cerrado (anterior al actual).
+    Retorna:
+        int: Movimientos archivados.
+    """
+    if anio >= date.today().year:
+        raise ValueError(f"Solo se pueden archivar años cerrados ({anio} no terminó).")
+    desde, hasta = rango(anio)
+    archivo = nombre_archivo(anio)
+    alias = _alias(anio)
+    db.adjuntar(alias, _ruta(archivo))
+    with transaccion() as c:
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {alias}.movimientos (
+            id INTEGER PRIMARY KEY,
+            producto_id INTEGER,
+            tipo TEXT,
+            cantidad INTEGER,
+            fecha TEXT,
+            precio_unitario REAL
+        )''')
+        # Mismos índices que la tabla principal (ver migraciones._m4_indices_paginacion)
+        c.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_movimientos_fecha ON movimientos(fecha)")
+        c.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_movimientos_producto_fecha "
+                  f"ON movimientos(producto_id, fecha)")
+        # Los ids se conservan: la paginación por (fecha, id) sigue igual entre bases
+        c.execute(f"""
+            INSERT OR IGNORE INTO {alias}.movimientos (id, producto_id, tipo, cantidad, fecha, precio_unitario)
+            SELECT id, producto_id, tipo, cantidad, fecha, precio_unitario
+            FROM main.movimientos WHERE fecha >= ? AND fecha < ?
+        """, (desde, hasta))
+    with transaccion(inmediata=True) as c:
+        c.execute(f"""
+            DELETE FROM main.movimientos
+            WHERE fecha >= ? AND fecha < ? AND id IN (SELECT id FROM {alias}.movimientos)
+        """, (desde, hasta))
+        movidos = c.rowcount
+        c.execute(f"SELECT COUNT(*) FROM {alias}.movimientos")
+        total = c.fetchone()[0]
+        c.execute("INSERT OR REPLACE INTO archivos_movimientos (anio, archivo, movimientos, fecha) VALUES (?, ?, ?, ?)",
+                  (anio, archivo, total, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    return movidos
+
+
+def archivar(hasta_anio=None):
+    """
+    Archiva todos los años cerrados que tengan movimientos en la base principal.
+    Parámetros:
+        hasta_anio (int): Último año a archivar (por defecto, el anterior al actual).
+    Retorna:
+        dict: Movimientos archivados por año.
+    """
+    return {anio: archivar_anio(anio) for anio in anios_cerrados()
+            if hasta_anio is None or anio <= hasta_anio}
+
+
+def compactar():
+    """
+    Devuelve al disco el espacio libre de la base principal (checkpoint del WAL y VACUUM).
+    Toma la base en exclusiva mientras dura, así que conviene hacerlo después de archivar
+    y con las escrituras en pausa (ver escritor.EscritorLotes.en_pausa).
+    Retorna:
+        tuple: (bytes antes, bytes después) del archivo de la base.
+    """
+    conn = get_conn()
+    antes = os.path.getsize(db.DB_NAME)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return antes, os.path.getsize(db.DB_NAME)
@@ -0,0 +1,37 @@
+"""
+Benchmark de la exportación de stock a PDF (reporte_pdf.exportar_stock_pdf).
+
+Uso:
+    python benchmarks/bench_pdf.py [10000 ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import inventario  # noqa: E402
+import reporte_pdf  # noqa: E402
+from bench_refresh import generar_db  # noqa: E402
+
+
+def main_bench(tamanios):
+    tmp = tempfile.mkdtemp()
+    db.usar_base(os.path.join(tmp, "bench.db"))
+    inventario.init_db()
+    salida = os.path.join(tmp, "stock.pdf")
+    print(f"{'productos':>10} {'filtro':>28} {'segundos':>10} {'filas/s':>10} {'KB':>8}")
+    for n in tamanios:
+        generar_db(db.DB_NAME, n)
+        for filtro in reporte_pdf.FILTROS:
+            t0 = time.perf_counter()
+            filas = reporte_pdf.exportar_stock_pdf(salida, 1000.0, filtro)
+            segundos = time.perf_counter() - t0
+            print(f"{n:>10} {filtro:>28} {segundos:>10.3f} {filas / segundos:>10.0f} {os.path.getsize(salida) // 1024:>8}")
+
+
+if __name__ == "__main__":
+    tamanios = [int(a) for a in sys.argv[1:]] or [10000]
+    main_bench(tamanios)
@@ -0,0 +1,100 @@
+"""
+Benchmark del armado de la tabla principal (refresh_table).
+Compara el camino anterior (dos consultas por producto + recorrido aparte para el IVA)
+con el de la tabla virtual de la aplicación (main.TablaVirtual): la primera pintada
+(IDs + una página + IVA) y el recorrido de toda la tabla por páginas (paginación por
+clave, como al desplazarse hasta el final), para 1k/10k/100k productos.
+
+Uso:
+    python benchmarks/bench_refresh.py [1000 10000 100000]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import inventario  # noqa: E402
+
+
+def generar_db(path, n):
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM productos")
+    rnd = random.Random(n)
+    filas = []
+    for i in range(n):
+        en_dolares = 1 if rnd.random() < 0.3 else 0
+        costo = round(rnd.uniform(100, 50000), 2)
+        venta = costo * (1.5 if en_dolares else 1.8)
+        filas.append((f"Producto {i:06d}", costo, venta, 21.0, en_dolares,
+                      rnd.randint(0, 50), rnd.randint(0, 10)))
+    conn.executemany("INSERT INTO productos (nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", filas)
+    conn.commit()
+    conn.close()
+
+
+def refresh_anterior(usd_price):
+    """Reproduce el armado de filas previo: 2N+2 consultas."""
+    filas = []
+    for p in inventario.get_productos():
+        inventario.obtener_precio_compra(p[0])
+        inventario.obtener_precio_venta(p[0])
+        filas.append(inventario.formatear_producto(p, usd_price))
+    total = 0
+    for p in inventario.get_productos():
+        total += p[3] * (p[4] / 100)
+    return filas, total
+
+
+BUFFER_TABLA = 30  # TablaVirtual.BUFFER en main.py
+
+
+def primera_pagina_virtual(usd_price, visibles=10):
+    ids = inventario.get_ids_productos()
+    pagina = inventario.get_pagina_productos(ids[0], visibles + 2 * BUFFER_TABLA) if ids else []
+    return [inventario.formatear_producto(p, usd_price) for p in pagina[:visibles]], inventario.calcular_iva_total()
+
+
+def recorrido_virtual(usd_price, visibles=10):
+    """Toda la tabla de a una página de la tabla virtual, como al desplazarse de punta a punta."""
+    filas = []
+    limite = visibles + 2 * BUFFER_TABLA
+    ids = inventario.get_ids_productos()
+    for inicio in range(0, len(ids), limite):
+        for p in inventario.get_pagina_productos(ids[inicio], limite):
+            filas.append(inventario.formatear_producto(p, usd_price))
+    return filas
+
+
+def medir(fn, *args, repeticiones=3):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn(*args)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def main_bench(tamanios):
+    tmp = tempfile.mkdtemp()
+    db.usar_base(os.path.join(tmp, "bench.db"))
+    inventario.init_db()
+    print(f"{'productos':>10} {'anterior (s)':>14} {'virtual (s)':>12} {'recorrido (s)':>14}")
+    for n in tamanios:
+        generar_db(db.DB_NAME, n)
+        # El camino anterior es demasiado lento para 100k: se mide solo hasta 10k
+        anterior = medir(refresh_anterior, 1000.0, repeticiones=1) if n <= 10000 else None
+        virtual = medir(primera_pagina_virtual, 1000.0)
+        recorrido = medir(recorrido_virtual, 1000.0)
+        anterior_str = f"{anterior:.4f}" if anterior is not None else "-"
+        print(f"{n:>10} {anterior_str:>14} {virtual:>12.4f} {recorrido:>14.4f}")
+
+
+if __name__ == "__main__":
+    tamanios = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]
+    main_bench(tamanios)
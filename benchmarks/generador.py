@@ -0,0 +1,104 @@
+"""
+Generador de bases stock.db sintéticas para benchmarks.
+
+Crea productos (mezcla de pesos y dólares, con stock mínimo variado) y años de
+movimientos repartidos día por día hasta hoy, y reconstruye los resúmenes.
+Con la misma semilla genera siempre la misma base.
+
+Uso:
+    python benchmarks/generador.py salida.db [--productos 10000] [--anios 3] [--movimientos-por-dia 200]
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import inventario  # noqa: E402
+import resumenes  # noqa: E402
+
+PROPORCION_DOLARES = 0.3
+USD_PRICE = 1000.0         # cotización con la que se "cargaron" los productos en dólares
+PROPORCION_ENTRADAS = 0.3
+FILAS_POR_LOTE = 50000
+
+
+def generar_productos(c, cantidad, rnd):
+    filas = []
+    for i in range(cantidad):
+        en_dolares = 1 if rnd.random() < PROPORCION_DOLARES else 0
+        costo = round(rnd.uniform(100, 50000), 2)
+        venta = round(costo * (1.5 if en_dolares else 1.8), 2)
+        iva = rnd.choice((10.5, 21.0, 21.0, 27.0))
+        filas.append((f"Producto {i:06d}", costo, venta, iva, en_dolares,
+                      rnd.randint(0, 500), rnd.choice((0, 1, 1, 5, 10, 50))))
+    c.executemany("INSERT INTO productos (nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)", filas)
+    c.execute("INSERT INTO costos_dolares (producto_id, costo_usd) "
+              "SELECT id, costo_real / ? FROM productos WHERE en_dolares = 1", (USD_PRICE,))
+
+
+def generar_movimientos(c, anios, por_dia, rnd, hasta=None):
+    """Genera movimientos desde hace 'anios' años hasta hoy (por_dia movimientos cada día)."""
+    precios = c.execute("SELECT id, costo_real, costo_comprador FROM productos").fetchall()
+    if not precios:
+        return 0
+    hasta = hasta or date.today()
+    dia = hasta - timedelta(days=365 * anios)
+    lote = []
+    total = 0
+    while dia <= hasta:
+        prefijo = dia.isoformat()
+        segundos = sorted(rnd.randrange(8 * 3600, 20 * 3600) for _ in range(por_dia))
+        for s in segundos:
+            producto_id, costo, venta = rnd.choice(precios)
+            fecha = f"{prefijo} {s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}"
+            if rnd.random() < PROPORCION_ENTRADAS:
+                lote.append((producto_id, "entrada", rnd.randint(1, 50), fecha, costo))
+            else:
+                lote.append((producto_id, "salida", rnd.randint(1, 5), fecha, venta))
+        if len(lote) >= FILAS_POR_LOTE:
+            c.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) "
+                          "VALUES (?, ?, ?, ?, ?)", lote)
+            total += len(lote)
+            lote = []
+        dia += timedelta(days=1)
+    c.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) "
+                  "VALUES (?, ?, ?, ?, ?)", lote)
+    return total + len(lote)
+
+
+def generar_db(path, productos=10000, anios=3, movimientos_por_dia=200, semilla=1):
+    """
+    Crea (o reemplaza) la base en path con el esquema actual y datos sintéticos.
+    Retorna:
+        dict: Cantidades generadas (productos, movimientos).
+    """
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(path + sufijo):
+            os.remove(path + sufijo)
+    db.usar_base(path)
+    inventario.init_db()
+    rnd = random.Random(semilla)
+    with db.transaccion(inmediata=True) as c:
+        generar_productos(c, productos, rnd)
+        movimientos = generar_movimientos(c, anios, movimientos_por_dia, rnd)
+        resumenes.reconstruir(c)
+    db.get_conn().execute("ANALYZE")
+    return {"productos": productos, "movimientos": movimientos}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una base stock.db sintética.")
+    parser.add_argument("salida")
+    parser.add_argument("--productos", type=int, default=10000)
+    parser.add_argument("--anios", type=int, default=3)
+    parser.add_argument("--movimientos-por-dia", type=int, default=200)
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+    generado = generar_db(args.salida, args.productos, args.anios, args.movimientos_por_dia, args.semilla)
+    db.cerrar_todas()
+    print(f"{args.salida}: {generado['productos']} productos, {generado['movimientos']} movimientos")
@@ -0,0 +1,286 @@
+"""
+Suite de benchmarks con datos sintéticos y resultados en JSON.
+
+Genera una base (ver generador.py), mide los caminos principales de la aplicación
+y guarda los tiempos en un JSON para comparar entre versiones:
+
+    get_productos           lectura del catálogo completo
+    refresh_table           StockApp.refresh_table (Tk real si hay pantalla; si no, Treeview simulado)
+    calcular_iva_total      SUM del IVA
+    get_stock_bajo          productos por debajo del mínimo (índice parcial)
+    cargar_movimientos_*    lo que hace el visor al abrir (conteo + primera página + totales) mensual/anual
+    descontar_stock         ventas de una unidad por segundo
+    ventas_encoladas        las mismas ventas por el hilo escritor de la interfaz (commit agrupado)
+    repreciar_dolares       nuevos precios de todos los productos en dólares (cotización +10%)
+    exportar_stock_pdf      PDF del catálogo completo (requiere reportlab)
+
+Uso:
+    python benchmarks/suite.py [--productos 10000] [--anios 3] [--salida resultados.json]
+    python benchmarks/suite.py --comparar resultados-1.1.1.json      # muestra la variación
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import types
+from array import array
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import inventario  # noqa: E402
+from escritor import EscritorLotes  # noqa: E402
+import resumenes  # noqa: E402
+from generador import generar_db  # noqa: E402
+
+USD_PRICE = 1000.0
+PAGINA_MOVIMIENTOS = 500  # igual que en ver_movimientos
+
+
+def medir(fn, repeticiones):
+    """Ejecuta fn repeticiones veces. Retorna dict con los tiempos en segundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return {"repeticiones": repeticiones, "mejor_s": min(tiempos),
+            "mediana_s": statistics.median(tiempos), "peor_s": max(tiempos)}
+
+
+class TreeSimulado:
+    """Treeview sin Tk: guarda los items en un dict (mide todo menos el dibujo)."""
+
+    def __init__(self, columnas):
+        self.columnas = columnas
+        self.items = {}
+        self._seleccion = ()
+
+    def __getitem__(self, clave):
+        return self.columnas
+
+    def column(self, *args, **kwargs):
+        pass
+
+    def get_children(self):
+        return tuple(self.items)
+
+    def delete(self, *iids):
+        for iid in iids:
+            del self.items[iid]
+
+    def insert(self, padre, posicion, iid, values):
+        self.items[iid] = values
+
+    def item(self, iid, values):
+        self.items[iid] = values
+
+    def exists(self, iid):
+        return iid in self.items
+
+    def selection(self):
+        return self._seleccion
+
+    def selection_set(self, iids):
+        self._seleccion = tuple(iids)
+
+    def focus(self, iid=None):
+        return ""
+
+
+def crear_app_refresh():
+    """
+    Arma lo mínimo de StockApp para llamar a su refresh_table.
+    Retorna:
+        tuple: (app, 'tk' o 'simulado', función para cerrar)
+    """
+    import main
+    columnas = ("Nombre", "Precio de Compra", "Precio de Venta", "IVA (%)", "En Dólares", "Cantidad")
+    formatear = lambda p: inventario.formatear_producto(p, USD_PRICE)  # noqa: E731
+    try:
+        root = main.tk.Tk()
+        root.withdraw()
+        tabla = main.TablaVirtual(main.ttk.Frame(root), columns=columnas, formatear=formatear)
+        modo, cerrar = "tk", root.destroy
+    except main.tk.TclError:
+        # Sin pantalla: misma TablaVirtual, con el Treeview y la medición de anchos simulados
+        tabla = object.__new__(main.TablaVirtual)
+        tabla.formatear = formatear
+        tabla.cache = None
+        tabla.scroll = types.SimpleNamespace(set=lambda *a: None)
+        tabla.tree = TreeSimulado(columnas)
+        tabla.anchos = types.SimpleNamespace(reiniciar=lambda: None, ensanchar=lambda filas: None)
+        tabla.visibles = 10
+        tabla.ids = array("q")
+        tabla.offset = 0
+        tabla._buffer_inicio = 0
+        tabla._buffer = []
+        tabla._seleccion = set()
+        modo, cerrar = "simulado", lambda: None
+    app = types.SimpleNamespace(tabla=tabla, productos=inventario.CacheProductos(), usd_price=USD_PRICE,
+                                panel_stock_bajo=types.SimpleNamespace(cargar=lambda productos: None),
+                                total_iva=0, stock_bajo=0, actualizar_totales=lambda: None)
+    return app, modo, cerrar
+
+
+def cargar_movimientos(desde, hasta):
+    """Lo que hace el visor de movimientos al aplicar un período."""
+    inventario.contar_movimientos(desde, hasta)
+    inventario.get_pagina_movimientos(desde, hasta, limite=PAGINA_MOVIMIENTOS)
+    resumenes.totales_periodo(desde, hasta)
+
+
+def _copiar_sqlite(origen, destino):
+    fuente, copia = sqlite3.connect(origen), sqlite3.connect(destino)
+    try:
+        fuente.backup(copia)
+    finally:
+        fuente.close()
+        copia.close()
+
+
+def copiar_base(origen, carpeta):
+    """
+    Copia la base (con lo que tenga en el WAL) y sus archivos de movimientos por año a carpeta,
+    así los escenarios que escriben no tocan la original.
+    Retorna:
+        str: Ruta de la copia.
+    """
+    destino = os.path.join(carpeta, os.path.basename(origen))
+    _copiar_sqlite(origen, destino)
+    # Mismo nombre de archivo: los años archivados se siguen encontrando (ver archivado.nombre_archivo)
+    base = os.path.splitext(origen)[0]
+    for archivo in glob.glob(glob.escape(base) + "-movimientos-*.db"):
+        shutil.copy2(archivo, carpeta)
+    return destino
+
+
+def correr(args):
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "bench.db")
+    t0 = time.perf_counter()
+    if args.db and os.path.exists(args.db):
+        path = copiar_base(args.db, tmp)
+        db.usar_base(path)
+        inventario.init_db()
+        datos = {"productos": db.get_conn().execute("SELECT COUNT(*) FROM productos").fetchone()[0],
+                 "movimientos": db.get_conn().execute("SELECT COUNT(*) FROM movimientos").fetchone()[0]}
+    else:
+        datos = generar_db(path, args.productos, args.anios, args.movimientos_por_dia, args.semilla)
+        if args.db:
+            # Se guarda la base generada para reusarla; se mide sobre la copia temporal
+            _copiar_sqlite(path, args.db)
+    datos["generacion_s"] = time.perf_counter() - t0
+    rep = args.repeticiones
+    escenarios = {}
+
+    escenarios["get_productos"] = medir(inventario.get_productos, rep)
+
+    import main
+    app, modo, cerrar = crear_app_refresh()
+    escenarios["refresh_table"] = dict(medir(lambda: main.StockApp.refresh_table(app), rep), render=modo)
+    cerrar()
+
+    escenarios["calcular_iva_total"] = medir(inventario.calcular_iva_total, rep)
+    escenarios["get_stock_bajo"] = medir(inventario.get_stock_bajo, rep)
+
+    mes = inventario.rango_mes()
+    anio = inventario.rango_anio()
+    escenarios["cargar_movimientos_mensual"] = medir(lambda: cargar_movimientos(*mes), rep)
+    escenarios["cargar_movimientos_anual"] = medir(lambda: cargar_movimientos(*anio), rep)
+
+    # Ventas de una unidad sobre productos con stock (modifica la base)
+    ids = [fila[0] for fila in db.get_conn().execute("SELECT id FROM productos WHERE cantidad > 0")]
+    if ids:
+        rnd = random.Random(args.semilla)
+        t0 = time.perf_counter()
+        for _ in range(args.ventas):
+            inventario.descontar_stock(rnd.choice(ids), 1)
+        segundos = time.perf_counter() - t0
+        escenarios["descontar_stock"] = {"ventas": args.ventas, "total_s": segundos,
+                                         "por_venta_s": segundos / args.ventas,
+                                         "ventas_por_segundo": args.ventas / segundos}
+
+        # Lo mismo encolado en el escritor, como lo hace la interfaz al registrar ventas seguidas
+        escritor = EscritorLotes()
+        t0 = time.perf_counter()
+        futuros = [escritor.enviar(inventario.descontar_stock, rnd.choice(ids), 1) for _ in range(args.ventas)]
+        for futuro in futuros:
+            futuro.result()
+        segundos = time.perf_counter() - t0
+        escritor.detener()
+        escenarios["ventas_encoladas"] = {"ventas": args.ventas, "total_s": segundos, "commits": escritor.lotes,
+                                          "por_venta_s": segundos / args.ventas,
+                                          "ventas_por_segundo": args.ventas / segundos}
+
+    # Cada repetición sube la cotización un 10%, así todos los productos en dólares cambian
+    cotizaciones = iter(USD_PRICE * 1.1 ** (i + 1) for i in range(rep))
+    escenarios["repreciar_dolares"] = medir(lambda: inventario.repreciar_dolares(next(cotizaciones)), rep)
+
+    try:
+        import reporte_pdf
+        salida = os.path.join(tmp, "stock.pdf")
+        escenarios["exportar_stock_pdf"] = medir(lambda: reporte_pdf.exportar_stock_pdf(salida, USD_PRICE), 1)
+    except ImportError as e:
+        escenarios["exportar_stock_pdf"] = {"omitido": str(e)}
+
+    db.cerrar_todas()
+    return {
+        "version": main.__version__,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "parametros": {"productos": args.productos, "anios": args.anios, "semilla": args.semilla,
+                       "movimientos_por_dia": args.movimientos_por_dia, "repeticiones": rep, "db": args.db},
+        "datos": datos,
+        "escenarios": escenarios,
+    }
+
+
+def _tiempo(resultado):
+    return resultado.get("mediana_s", resultado.get("por_venta_s"))
+
+
+def comparar(anterior, actual):
+    print(f"{'escenario':>28} {'anterior (s)':>14} {'actual (s)':>12} {'variación':>10}")
+    for nombre, resultado in actual["escenarios"].items():
+        nuevo = _tiempo(resultado)
+        viejo = _tiempo(anterior["escenarios"].get(nombre, {}))
+        if nuevo is None or viejo is None:
+            continue
+        print(f"{nombre:>28} {viejo:>14.5f} {nuevo:>12.5f} {(nuevo / viejo - 1) * 100:>+9.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de Control de Stock.")
+    parser.add_argument("--productos", type=int, default=10000)
+    parser.add_argument("--anios", type=int, default=3)
+    parser.add_argument("--movimientos-por-dia", type=int, default=200)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--ventas", type=int, default=1000)
+    parser.add_argument("--db", help="medir sobre una copia de esta base en vez de generar una (la original no se modifica; si no existe, se guarda ahí la generada)")
+    parser.add_argument("--salida", help=f"archivo JSON (por defecto resultados-<versión>-{date.today()}.json)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    resultado = correr(args)
+    salida = args.salida or f"resultados-{resultado['version']}-{date.today()}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    for nombre, valores in resultado["escenarios"].items():
+        print(f"{nombre:>28} {json.dumps(valores)}")
+    print(f"Resultados guardados en {salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(json.load(f), resultado)
@@ -0,0 +1,382 @@
+"""
+Línea de comandos de Control de Stock (sin interfaz gráfica).
+
+Usa el mismo motor que la aplicación (inventario.py) y no importa tkinter, PIL
+ni requests, así arranca rápido y funciona en servidores sin pantalla:
+tareas nocturnas, cargas masivas por script y pruebas de rendimiento.
+
+Ejemplos:
+    python cli.py listar --stock-bajo
+    python cli.py agregar "Leche entera" 850 --cantidad 24 --min-stock 6
+    python cli.py agregar "Semillas" 12.5 --dolares --usd 1000
+    python cli.py vender "Leche entera:2" 15:1
+    python cli.py ingresar "Leche entera" 12
+    python cli.py precio "Leche entera" 900
+    python cli.py repreciar --usd 1250
+    python cli.py movimientos --desde 2025-01-01 --hasta 2025-12-31 --salida movs.csv
+    python cli.py importar lista_proveedor.csv
+    python cli.py archivar --hasta-anio 2023
+    python cli.py foto
+    python cli.py pedido --salida pedido.csv
+    python cli.py valorizar --fecha 2025-06-30
+    python cli.py resumen --anio 2025
+    python cli.py cotizaciones --desde 2025-01-01
+    python cli.py historial-precios "Leche entera"
+Todas aceptan --db para usar otro archivo de base de datos.
+"""
+import argparse
+import csv
+import sys
+from datetime import date, timedelta
+
+import db
+import inventario
+from precios import calcular_precios, validar_producto
+
+PAGINA_MOVIMIENTOS = 5000  # filas por consulta al exportar movimientos
+
+
+class ErrorCLI(Exception):
+    """Error de uso que se informa al usuario sin traza."""
+
+
+def _producto(texto):
+    p = inventario.buscar_producto(texto)
+    if p is None:
+        raise ErrorCLI(f"No se encontró el producto '{texto}'.")
+    return p
+
+
+def _fecha(texto):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida '{texto}' (se espera AAAA-MM-DD)")
+
+
+def _usd_price(args):
+    """Cotización a usar: la indicada con --usd o la última guardada (no consulta internet)."""
+    if args.usd:
+        return args.usd
+    from cotizacion import ultima_cotizacion
+    guardada = ultima_cotizacion()
+    return guardada[0] if guardada else 0
+
+
+def cmd_listar(args):
+    usd_price = _usd_price(args)
+    escritor = csv.writer(sys.stdout) if args.csv else None
+    columnas = ("ID", "Nombre", "Precio de Compra", "Precio de Venta", "IVA (%)", "En Dólares", "Cantidad")
+    if escritor:
+        escritor.writerow(columnas)
+    else:
+        print("\t".join(columnas))
+    sql = "SELECT * FROM productos"
+    if args.stock_bajo:
+        sql += " WHERE cantidad < min_stock"
+    for p in db.get_conn().execute(sql + " ORDER BY id"):
+        fila = (p[0],) + inventario.formatear_producto(p, usd_price)
+        if escritor:
+            escritor.writerow(fila)
+        else:
+            print("\t".join(str(v) for v in fila))
+
+
+def cmd_agregar(args):
+    validar_producto(args.nombre.strip(), args.precio_compra, args.iva, args.cantidad, args.min_stock)
+    usd_price = _usd_price(args)
+    en_dolares = 1 if args.dolares else 0
+    costo_real, costo_comprador = calcular_precios(args.precio_compra, en_dolares, usd_price)
+    producto_id = inventario.add_producto(args.nombre.strip(), costo_real, costo_comprador, args.iva,
+                                          en_dolares, usd_price, args.cantidad, args.min_stock)
+    print(f"Producto creado con ID {producto_id}.")
+
+
+def cmd_vender(args):
+    lineas = []
+    for item in args.lineas:
+        producto, _, cantidad = item.rpartition(":")
+        if not producto:
+            producto, cantidad = cantidad, "1"
+        try:
+            lineas.append((_producto(producto)[0], int(cantidad)))
+        except ValueError:
+            raise ErrorCLI(f"Cantidad inválida en '{item}'.")
+    total = inventario.registrar_venta(lineas)
+    print(f"Venta registrada. Total: ${total:.2f}")
+
+
+def cmd_ingresar(args):
+    if args.cantidad <= 0:
+        raise ErrorCLI("Cantidad inválida")
+    p = _producto(args.producto)
+    inventario.ingresar_stock(p[0], args.cantidad)
+    print(f"Stock de '{p[1]}': {p[6] + args.cantidad}")
+
+
+def cmd_precio(args):
+    p = _producto(args.producto)
+    if args.precio_compra <= 0:
+        raise ErrorCLI("El precio de compra debe ser mayor a 0")
+    usd_price = _usd_price(args)
+    costo_real, costo_comprador = calcular_precios(args.precio_compra, p[5], usd_price)
+    inventario.modificar_precios(p[0], costo_real, costo_comprador, usd_price)
+    print(f"'{p[1]}': compra ${costo_real:.2f}, venta ${costo_comprador:.2f}")
+
+
+def cmd_repreciar(args):
+    usd_price = _usd_price(args)
+    cantidad = inventario.repreciar_dolares(usd_price)
+    print(f"Precios recalculados con el dólar a ${usd_price:.2f}: {cantidad} productos modificados.")
+
+
+def cmd_movimientos(args):
+    desde, hasta = inventario.rango_mes()
+    if args.desde:
+        desde = args.desde.isoformat()
+    if args.hasta:
+        hasta = (args.hasta + timedelta(days=1)).isoformat()
+    producto_id = _producto(args.producto)[0] if args.producto else None
+    salida = open(args.salida, "w", newline="", encoding="utf-8") if args.salida else sys.stdout
+    try:
+        escritor = csv.writer(salida)
+        escritor.writerow(("ID", "Producto", "Tipo", "Cantidad", "Fecha", "Precio Unitario"))
+        cursor = None
+        total = 0
+        while True:
+            pagina = inventario.get_pagina_movimientos(desde, hasta, producto_id, args.tipo, cursor, limite=PAGINA_MOVIMIENTOS)
+            escritor.writerows(pagina)
+            total += len(pagina)
+            if len(pagina) < PAGINA_MOVIMIENTOS:
+                break
+            cursor = (pagina[-1][4], pagina[-1][0])
+    finally:
+        if args.salida:
+            salida.close()
+    if args.salida:
+        print(f"{total} movimientos exportados a {args.salida}")
+
+
+def cmd_importar(args):
+    from importacion import importar_productos
+    resultado = importar_productos(args.archivo, _usd_price(args))
+    print(resultado)
+    for linea, mensaje in resultado.errores:
+        print(f"Línea {linea}: {mensaje}", file=sys.stderr)
+
+
+def cmd_reconstruir_resumenes(args):
+    import resumenes
+    resumenes.reconstruir_resumenes()
+    print("Resúmenes reconstruidos.")
+
+
+def cmd_archivar(args):
+    import archivado
+    archivados = archivado.archivar(args.hasta_anio)
+    for anio, cantidad in archivados.items():
+        print(f"{anio}: {cantidad} movimientos archivados en {archivado.nombre_archivo(anio)}")
+    if not archivados:
+        print("No hay años cerrados para archivar.")
+    if args.sin_compactar:
+        return
+    antes, despues = archivado.compactar()
+    print(f"Base compactada: {antes / 1e6:.1f} MB -> {despues / 1e6:.1f} MB")
+
+
+def cmd_pedido(args):
+    filas = inventario.filas_lista_pedido(inventario.get_stock_bajo())
+    salida = open(args.salida, "w", newline="", encoding="utf-8") if args.salida else sys.stdout
+    try:
+        escritor = csv.writer(salida)
+        escritor.writerow(inventario.COLUMNAS_LISTA_PEDIDO)
+        escritor.writerows(filas)
+    finally:
+        if args.salida:
+            salida.close()
+    if args.salida:
+        print(f"{len(filas)} productos en la lista de pedido {args.salida}")
+
+
+def cmd_foto(args):
+    import fotos_stock
+    foto_id = fotos_stock.tomar_foto_si_corresponde(args.dias) if args.si_corresponde else fotos_stock.tomar_foto()
+    print(f"Foto {foto_id} guardada." if foto_id else "La última foto es reciente; no se tomó otra.")
+
+
+def cmd_valorizar(args):
+    import fotos_stock
+    productos = fotos_stock.stock_a_fecha(args.fecha)
+    escritor = csv.writer(sys.stdout) if args.csv else None
+    columnas = ("ID", "Nombre", "Cantidad", "Precio de Compra", "Precio de Venta")
+    if escritor:
+        escritor.writerow(columnas)
+        escritor.writerows(productos)
+        return
+    print("\t".join(columnas))
+    for p in productos:
+        print("\t".join(str(v) for v in p))
+    unidades = sum(p[2] for p in productos)
+    compra = sum(p[2] * (p[3] or 0) for p in productos)
+    venta = sum(p[2] * (p[4] or 0) for p in productos)
+    print(f"Stock al {args.fecha}: {unidades} unidades, ${compra:.2f} a precio de compra, ${venta:.2f} a precio de venta")
+
+
+def cmd_resumen(args):
+    import resumenes
+    producto_id = _producto(args.producto)[0] if args.producto else None
+    # Se lee resumen_mensual: no depende de cuántos movimientos tenga el año
+    meses = resumenes.totales_por_mes(f"{args.anio}-01", f"{args.anio + 1}-01", producto_id)
+    columnas = ("Mes", "Unidades Entrada", "Unidades Salida", "Costo Entradas", "Ingresos Salidas")
+    if args.csv:
+        escritor = csv.writer(sys.stdout)
+        escritor.writerow(columnas)
+        escritor.writerows(meses)
+        return
+    print("\t".join(columnas))
+    for mes, entradas, salidas, costo, ingresos in meses:
+        print(f"{mes}\t{entradas}\t{salidas}\t{costo:.2f}\t{ingresos:.2f}")
+    print(f"Total {args.anio}: {sum(m[1] for m in meses)} unidades de entrada (${sum(m[3] for m in meses):.2f}), "
+          f"{sum(m[2] for m in meses)} de salida (${sum(m[4] for m in meses):.2f})")
+
+
+def cmd_cotizaciones(args):
+    from cotizacion import historial_cotizaciones
+    desde = args.desde.isoformat() if args.desde else None
+    hasta = (args.hasta + timedelta(days=1)).isoformat() if args.hasta else None
+    cotizaciones = historial_cotizaciones(desde, hasta)
+    if args.csv:
+        escritor = csv.writer(sys.stdout)
+        escritor.writerow(("Fecha", "Valor", "Fuente"))
+        escritor.writerows(cotizaciones)
+        return
+    for fecha, valor, fuente in cotizaciones:
+        print(f"{fecha}\t${valor:.2f}\t{fuente or ''}")
+    if not cotizaciones:
+        print("No hay cotizaciones guardadas en ese período.")
+
+
+def cmd_historial_precios(args):
+    import historial_precios
+    producto_id = _producto(args.producto)[0] if args.producto else None
+    cambios = historial_precios.get_historial(producto_id, args.limite)
+    nombres = {p[0]: p[1] for p in inventario.get_productos_por_id(list({c[1] for c in cambios}))}
+    filas = [(fecha, nombres.get(pid, f"ID {pid}"), motivo, compra_antes, venta_antes, compra, venta, cotizacion)
+             for fecha, pid, motivo, compra_antes, venta_antes, compra, venta, cotizacion in cambios]
+    columnas = ("Fecha", "Producto", "Motivo", "Compra Anterior", "Venta Anterior", "Compra", "Venta", "Cotización")
+    escritor = csv.writer(sys.stdout, delimiter="," if args.csv else "\t")
+    escritor.writerow(columnas)
+    escritor.writerows(filas)
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Control de Stock sin interfaz gráfica.")
+    parser.add_argument("--db", default=db.DB_NAME, help="archivo de base de datos (por defecto stock.db)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("listar", help="lista los productos")
+    p.add_argument("--stock-bajo", action="store_true", help="solo productos por debajo del stock mínimo")
+    p.add_argument("--csv", action="store_true", help="salida en formato CSV")
+    p.add_argument("--usd", type=float, help="cotización del dólar a usar")
+    p.set_defaults(func=cmd_listar)
+
+    p = sub.add_parser("agregar", help="agrega un producto")
+    p.add_argument("nombre")
+    p.add_argument("precio_compra", type=float)
+    p.add_argument("--dolares", action="store_true", help="el precio de compra está en dólares")
+    p.add_argument("--iva", type=float, default=21.0)
+    p.add_argument("--cantidad", type=int, default=0)
+    p.add_argument("--min-stock", type=int, default=1)
+    p.add_argument("--usd", type=float, help="cotización del dólar a usar")
+    p.set_defaults(func=cmd_agregar)
+
+    p = sub.add_parser("vender", help="registra una venta (todas las líneas o ninguna)")
+    p.add_argument("lineas", nargs="+", metavar="PRODUCTO[:CANTIDAD]", help="ID o nombre del producto")
+    p.set_defaults(func=cmd_vender)
+
+    p = sub.add_parser("ingresar", help="registra una entrada de stock")
+    p.add_argument("producto", help="ID o nombre del producto")
+    p.add_argument("cantidad", type=int)
+    p.set_defaults(func=cmd_ingresar)
+
+    p = sub.add_parser("precio", help="modifica el precio de compra (recalcula el de venta)")
+    p.add_argument("producto", help="ID o nombre del producto")
+    p.add_argument("precio_compra", type=float, help="en la moneda del producto")
+    p.add_argument("--usd", type=float, help="cotización del dólar a usar")
+    p.set_defaults(func=cmd_precio)
+
+    p = sub.add_parser("repreciar", help="recalcula los precios de los productos en dólares con la cotización")
+    p.add_argument("--usd", type=float, help="cotización del dólar a usar (por defecto, la última guardada)")
+    p.set_defaults(func=cmd_repreciar)
+
+    p = sub.add_parser("movimientos", help="exporta movimientos a CSV (por defecto, los del mes)")
+    p.add_argument("--desde", type=_fecha, help="AAAA-MM-DD")
+    p.add_argument("--hasta", type=_fecha, help="AAAA-MM-DD (inclusive)")
+    p.add_argument("--producto", help="ID o nombre del producto")
+    p.add_argument("--tipo", choices=["entrada", "salida", "inicial"])
+    p.add_argument("--salida", help="archivo CSV (por defecto, la pantalla)")
+    p.set_defaults(func=cmd_movimientos)
+
+    p = sub.add_parser("importar", help="importa productos desde CSV/XLSX")
+    p.add_argument("archivo")
+    p.add_argument("--usd", type=float, help="cotización del dólar a usar")
+    p.set_defaults(func=cmd_importar)
+
+    p = sub.add_parser("archivar", help="mueve los movimientos de años cerrados a un archivo por año y compacta la base")
+    p.add_argument("--hasta-anio", type=int, help="último año a archivar (por defecto, el anterior al actual)")
+    p.add_argument("--sin-compactar", action="store_true", help="no ejecuta VACUUM después de archivar")
+    p.set_defaults(func=cmd_archivar)
+
+    p = sub.add_parser("pedido", help="exporta a CSV la lista de pedido (productos con stock bajo)")
+    p.add_argument("--salida", help="archivo CSV (por defecto, la pantalla)")
+    p.set_defaults(func=cmd_pedido)
+
+    p = sub.add_parser("foto", help="guarda una foto del stock actual (para consultar el stock a una fecha)")
+    p.add_argument("--si-corresponde", action="store_true", help="solo si la última foto es más vieja que --dias")
+    p.add_argument("--dias", type=int, default=30, help="antigüedad máxima de la última foto (por defecto, 30)")
+    p.set_defaults(func=cmd_foto)
+
+    p = sub.add_parser("valorizar", help="stock y valor que había al terminar un día")
+    p.add_argument("--fecha", type=_fecha, default=date.today(), help="AAAA-MM-DD (por defecto, hoy)")
+    p.add_argument("--csv", action="store_true", help="salida en formato CSV")
+    p.set_defaults(func=cmd_valorizar)
+
+    p = sub.add_parser("resumen", help="entradas y salidas mes a mes de un año (de los resúmenes mensuales)")
+    p.add_argument("--anio", type=int, default=date.today().year, help="año (por defecto, el actual)")
+    p.add_argument("--producto", help="solo ese producto (ID o nombre)")
+    p.add_argument("--csv", action="store_true", help="salida en formato CSV")
+    p.set_defaults(func=cmd_resumen)
+
+    p = sub.add_parser("cotizaciones", help="historial de cotizaciones del dólar guardadas")
+    p.add_argument("--desde", type=_fecha, help="AAAA-MM-DD")
+    p.add_argument("--hasta", type=_fecha, help="AAAA-MM-DD (inclusive)")
+    p.add_argument("--csv", action="store_true", help="salida en formato CSV")
+    p.set_defaults(func=cmd_cotizaciones)
+
+    p = sub.add_parser("historial-precios", help="últimos cambios de precio, del más reciente al más viejo")
+    p.add_argument("producto", nargs="?", help="solo ese producto (ID o nombre)")
+    p.add_argument("--limite", type=int, default=100, help="cantidad de cambios (por defecto, 100)")
+    p.add_argument("--csv", action="store_true", help="salida en formato CSV")
+    p.set_defaults(func=cmd_historial_precios)
+
+    p = sub.add_parser("reconstruir-resumenes", help="recalcula los resúmenes diarios y mensuales")
+    p.set_defaults(func=cmd_reconstruir_resumenes)
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    db.usar_base(args.db)
+    try:
+        inventario.init_db()
+        args.func(args)
+    except (ErrorCLI, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.cerrar_todas()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
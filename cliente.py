@@ -0,0 +1,214 @@
+"""
+Cliente del servidor de stock (ver servidor.py) para el modo caja.
+
+ClienteStock tiene las mismas funciones de datos que inventario (add_producto,
+registrar_venta, get_pagina_productos, ...), así la aplicación las usa sin
+saber si la base es local o está en otra PC. Usa solo la biblioteca estándar
+(http.client, con una conexión keep-alive por hilo).
+"""
+import http.client
+import json
+import threading
+from array import array
+from urllib.parse import urlsplit, urlencode
+
+from inventario import StockInsuficiente
+
+TIMEOUT = 10
+
+
+class ErrorServidor(Exception):
+    """El servidor no respondió o devolvió un error inesperado."""
+
+
+class ClienteStock:
+    """
+    Parámetros:
+        url (str): Dirección del servidor, p. ej. 'http://192.168.0.10:8765'.
+    Los cambios de productos (propios y de otras cajas) se informan a los
+    observadores registrados con al_cambiar_productos(); los de otras cajas
+    llegan al llamar a sincronizar().
+    """
+
+    def __init__(self, url, timeout=TIMEOUT):
+        partes = urlsplit(url if "://" in url else "http://" + url)
+        self.url = url
+        self.host = partes.hostname
+        self.puerto = partes.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._observadores = []
+        self._version = None
+        self._instancia = None  # id del servidor; si cambia, el servidor se reinició y se recarga todo
+        self._aplicadas = set()  # versiones propias ya notificadas (sincronizar no las repite)
+
+    # --- HTTP ---
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.puerto, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _pedir(self, metodo, ruta, params=None, cuerpo=None):
+        if params:
+            ruta += "?" + urlencode({k: v for k, v in params.items() if v is not None})
+        datos = json.dumps(cuerpo).encode("utf-8") if cuerpo is not None else None
+        cabeceras = {"Content-Type": "application/json"} if datos else {}
+        for intento in range(2):
+            conn = self._conexion()
+            try:
+                conn.request(metodo, ruta, body=datos, headers=cabeceras)
+                respuesta = conn.getresponse()
+                estado, contenido = respuesta.status, respuesta.read()
+                break
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                # Conexión keep-alive cerrada por el servidor: se reintenta una vez solo si es lectura
+                conn.close()
+                self._local.conn = None
+                if intento or metodo != "GET":
+                    raise ErrorServidor(f"No se pudo conectar con el servidor {self.url}: {e}")
+        try:
+            respuesta = json.loads(contenido)
+        except ValueError:
+            raise ErrorServidor(f"Respuesta inválida del servidor ({estado})")
+        if estado == 409:
+            raise StockInsuficiente([tuple(f) for f in respuesta.get("faltantes", [])])
+        if estado == 400:
+            raise ValueError(respuesta.get("error"))
+        if estado != 200:
+            raise ErrorServidor(respuesta.get("error") or f"Error {estado} del servidor")
+        return respuesta
+
+    def _escribir(self, ruta, cuerpo):
+        respuesta = self._pedir("POST", ruta, cuerpo=cuerpo)
+        cambios = []
+        with self._lock:
+            for version, producto_id, antes, despues in respuesta["cambios"]:
+                if self._version is not None:
+                    if version <= self._version:
+                        continue  # ya lo trajo una sincronización que terminó antes
+                    self._aplicadas.add(version)
+                cambios.append((producto_id, _fila(antes), _fila(despues)))
+        if cambios:
+            self._notificar_cambios(cambios)
+        return respuesta["resultado"]
+
+    # --- Cambios ---
+
+    def al_cambiar_productos(self, callback):
+        """Igual que inventario.al_cambiar_productos."""
+        self._observadores.append(callback)
+
+    def _notificar_cambios(self, cambios):
+        for callback in list(self._observadores):
+            callback(cambios)
+
+    def sincronizar(self):
+        """
+        Trae los cambios hechos desde la última sincronización (por cualquier caja)
+        que esta caja todavía no conoce. No notifica: devuelve los cambios para que
+        quien llama los aplique en su hilo.
+        Retorna:
+            list: Cambios (producto_id, antes, despues), o None si hay que recargar todo.
+        """
+        respuesta = self._pedir("GET", "/cambios", {"desde": self._version})
+        with self._lock:
+            if self._version is None or respuesta["recargar"] or respuesta.get("instancia") != self._instancia:
+                self._version = respuesta["version"]
+                self._instancia = respuesta.get("instancia")
+                self._aplicadas.clear()
+                return None
+            cambios = [(producto_id, _fila(antes), _fila(despues))
+                       for version, producto_id, antes, despues in respuesta["cambios"]
+                       if version not in self._aplicadas]
+            self._version = max(self._version, respuesta["version"])
+            self._aplicadas = {v for v in self._aplicadas if v > self._version}
+        return cambios
+
+    # --- Lecturas ---
+
+    def get_productos(self):
+        return [tuple(p) for p in self._pedir("GET", "/productos")]
+
+    def buscar_producto(self, texto):
+        return _fila(self._pedir("GET", "/productos/buscar", {"texto": texto}))
+
+    def buscar_productos(self, texto, limite=20):
+        return [tuple(p) for p in self._pedir("GET", "/productos/busqueda", {"texto": texto, "limite": limite})]
+
+    def get_ids_productos(self):
+        return array("q", self._pedir("GET", "/productos/ids"))
+
+    def get_pagina_productos(self, desde_id, limite):
+        return [tuple(p) for p in self._pedir("GET", "/productos/pagina", {"desde_id": desde_id, "limite": limite})]
+
+    def get_productos_por_id(self, ids):
+        return [tuple(p) for p in self._pedir("GET", "/productos/por_id", {"ids": ",".join(map(str, ids))})]
+
+    def get_stock_bajo(self):
+        return [tuple(p) for p in self._pedir("GET", "/productos/stock_bajo")]
+
+    def get_costo_usd(self, producto_id):
+        return self._pedir("GET", "/productos/costo_usd", {"producto_id": producto_id})
+
+    def calcular_iva_total(self):
+        return self._pedir("GET", "/totales")["iva"]
+
+    def contar_stock_bajo(self):
+        return self._pedir("GET", "/totales")["stock_bajo"]
+
+    def get_pagina_movimientos(self, desde, hasta, producto_id=None, tipo=None, despues_de=None, limite=500):
+        params = {"desde": desde, "hasta": hasta, "producto_id": producto_id, "tipo": tipo, "limite": limite}
+        if despues_de is not None:
+            params["despues_fecha"], params["despues_id"] = despues_de
+        return [tuple(m) for m in self._pedir("GET", "/movimientos", params)]
+
+    def contar_movimientos(self, desde, hasta, producto_id=None, tipo=None):
+        params = {"desde": desde, "hasta": hasta, "producto_id": producto_id, "tipo": tipo}
+        return self._pedir("GET", "/movimientos/total", params)["total"]
+
+    def totales_periodo(self, desde, hasta, producto_id=None):
+        return tuple(self._pedir("GET", "/resumen", {"desde": desde, "hasta": hasta, "producto_id": producto_id}))
+
+    # --- Escrituras ---
+
+    def add_producto(self, nombre, costo_real, costo_comprador, iva, en_dolares, usd_price, cantidad, min_stock):
+        return self._escribir("/productos", {
+            "nombre": nombre, "costo_real": costo_real, "costo_comprador": costo_comprador, "iva": iva,
+            "en_dolares": en_dolares, "usd_price": usd_price, "cantidad": cantidad, "min_stock": min_stock})
+
+    def registrar_venta(self, lineas):
+        return self._escribir("/ventas", {"lineas": [list(linea) for linea in lineas]})
+
+    def descontar_stock(self, producto_id, cantidad):
+        try:
+            self.registrar_venta([(producto_id, cantidad)])
+        except StockInsuficiente:
+            return False
+        return True
+
+    def ingresar_stock(self, producto_id, cantidad):
+        return self._escribir("/entradas", {"producto_id": producto_id, "cantidad": cantidad})
+
+    def modificar_precios(self, producto_id, costo_real, costo_comprador, usd_price=None):
+        self._escribir("/precios", {"producto_id": producto_id, "costo_real": costo_real,
+                                    "costo_comprador": costo_comprador, "usd_price": usd_price})
+
+    def repreciar_dolares(self, usd_price):
+        return self._escribir("/repreciar", {"usd_price": usd_price})
+
+    def eliminar_producto(self, producto_id, nombre):
+        self._escribir("/eliminar", {"producto_id": producto_id, "nombre": nombre})
+
+    def cerrar(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _fila(valores):
+    return tuple(valores) if valores is not None else None
@@ -0,0 +1,156 @@
+"""
+Cotización del dólar con caché.
+
+La última cotización válida se guarda en la tabla cotizaciones (con fecha), así
+la aplicación siempre tiene un valor para convertir precios aunque no haya
+internet. Las consultas a Bluelytics corren en segundo plano: si varios piden
+actualizar a la vez comparten la misma consulta en curso, y si la consulta
+falla se sigue usando el último valor conocido.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import db
+from db import get_conn, transaccion
+
+URL_BLUELYTICS = "https://api.bluelytics.com.ar/v2/latest"
+TTL_SEGUNDOS = 15 * 60   # antigüedad máxima antes de volver a consultar
+TIMEOUT = 5
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+def consultar_bluelytics(timeout=TIMEOUT):
+    """
+    Consulta la API pública de Bluelytics.
+    Retorna:
+        float: Valor de venta oficial (Banco Nación).
+    Lanza una excepción si no hay conexión o la respuesta no es válida.
+    """
+    import requests
+    response = requests.get(URL_BLUELYTICS, timeout=timeout)
+    response.raise_for_status()
+    valor = float(response.json()["oficial"]["value_sell"])
+    if valor <= 0:
+        raise ValueError(f"Cotización inválida: {valor}")
+    return valor
+
+
+def guardar_cotizacion(valor, fuente="bluelytics", fecha=None):
+    """Registra una cotización en el historial."""
+    fecha = fecha or datetime.now().strftime(FORMATO_FECHA)
+    with transaccion() as c:
+        c.execute("INSERT INTO cotizaciones (valor, fuente, fecha) VALUES (?, ?, ?)", (valor, fuente, fecha))
+
+
+def ultima_cotizacion():
+    """
+    Devuelve la última cotización guardada.
+    Retorna:
+        tuple: (valor, fecha) o None si nunca se obtuvo una.
+    """
+    return get_conn().execute("SELECT valor, fecha FROM cotizaciones ORDER BY id DESC LIMIT 1").fetchone()
+
+
+def historial_cotizaciones(desde=None, hasta=None):
+    """
+    Devuelve las cotizaciones guardadas entre dos fechas (texto 'YYYY-MM-DD ...', inclusive desde, exclusivo hasta).
+    Retorna:
+        list: Tuplas (fecha, valor, fuente) ordenadas por fecha.
+    """
+    sql = "SELECT fecha, valor, fuente FROM cotizaciones WHERE 1=1"
+    params = []
+    if desde:
+        sql += " AND fecha >= ?"
+        params.append(desde)
+    if hasta:
+        sql += " AND fecha < ?"
+        params.append(hasta)
+    return get_conn().execute(sql + " ORDER BY fecha", params).fetchall()
+
+
+class CacheCotizacion:
+    """
+    Cotización en memoria respaldada por la tabla cotizaciones.
+    valor() nunca espera a la red: devuelve el último valor conocido y, si está vencido,
+    dispara una actualización en segundo plano.
+    """
+
+    def __init__(self, consultar=consultar_bluelytics, ttl=TTL_SEGUNDOS):
+        self.consultar = consultar
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._en_curso = None
+        self._valor = 0
+        self._fecha = None
+        self._obtenida = 0.0
+        self._callbacks = []
+        guardada = ultima_cotizacion()
+        if guardada:
+            self._set(guardada[0], guardada[1])
+
+    def _set(self, valor, fecha):
+        self._valor = valor
+        self._fecha = fecha
+        self._obtenida = datetime.strptime(fecha, FORMATO_FECHA).timestamp()
+
+    @property
+    def fecha(self):
+        """Fecha de la cotización actual (None si nunca se obtuvo)."""
+        return self._fecha
+
+    def vencida(self):
+        return self._fecha is None or time.time() - self._obtenida > self.ttl
+
+    def valor(self):
+        """Último valor conocido (0 si nunca se obtuvo). Si está vencido, se actualiza en segundo plano."""
+        if self.vencida():
+            self.actualizar()
+        return self._valor
+
+    def al_actualizar(self, callback):
+        """Registra callback(valor) para cuando llegue una cotización nueva (se llama desde otro hilo)."""
+        self._callbacks.append(callback)
+
+    def actualizar(self, forzar=False):
+        """
+        Pide una cotización nueva en segundo plano.
+        Si ya hay una consulta en curso, devuelve la misma (no se consulta dos veces).
+        Retorna:
+            Future: Se resuelve con el valor obtenido, o con la excepción si falló la consulta.
+        """
+        with self._lock:
+            if self._en_curso is not None:
+                return self._en_curso
+            futuro = Future()
+            if not forzar and not self.vencida():
+                futuro.set_result(self._valor)
+                return futuro
+            self._en_curso = futuro
+        threading.Thread(target=self._consultar, args=(futuro,), daemon=True).start()
+        return futuro
+
+    def _consultar(self, futuro):
+        try:
+            self._consultar_y_guardar(futuro)
+        finally:
+            db.cerrar_conexion()
+
+    def _consultar_y_guardar(self, futuro):
+        try:
+            valor = self.consultar()
+            fecha = datetime.now().strftime(FORMATO_FECHA)
+            guardar_cotizacion(valor, fecha=fecha)
+        except Exception as e:
+            # Sin conexión: se mantiene el último valor válido
+            with self._lock:
+                self._en_curso = None
+            futuro.set_exception(e)
+            return
+        with self._lock:
+            self._set(valor, fecha)
+            self._en_curso = None
+        futuro.set_result(valor)
+        for callback in list(self._callbacks):
+            callback(valor)
@@ -0,0 +1,165 @@
+"""
+Capa de conexión a la base de datos SQLite.
+
+Mantiene una conexión abierta por hilo (en vez de abrir y cerrar una en cada
+operación), con journal WAL para que un hilo pueda leer mientras otro escribe,
+y con caché de sentencias preparadas. Todas las funciones de datos deben pedir
+la conexión con get_conn() y escribir dentro de transaccion().
+"""
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import diagnostico
+
+DB_NAME = "stock.db"
+
+# Ajustes aplicados a cada conexión nueva
+CACHE_KB = 20000               # caché de páginas (~20 MB)
+MMAP_BYTES = 256 * 1024 * 1024  # lectura por memory-map (256 MB)
+BUSY_TIMEOUT_MS = 5000
+SENTENCIAS_CACHEADAS = 256
+MAX_ADJUNTAS = 8               # bases adjuntas por conexión (SQLite admite 10 por defecto)
+
+_local = threading.local()
+# Referencias débiles: la conexión de un hilo que terminó se cierra al liberarse su
+# threading.local, aunque el hilo no haya llamado a cerrar_conexion()
+_conexiones = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+class _Conexion(sqlite3.Connection):
+    """Conexión común; como subclase admite referencias débiles (ver _conexiones)."""
+
+
+class _CierreAlTerminar:
+    """
+    Se guarda en el threading.local junto a la conexión y la cierra cuando el hilo termina.
+    La conexión sola no alcanza: su caché de sentencias forma un ciclo de referencias y
+    quedaría abierta hasta que pase el recolector de ciclos.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __del__(self):
+        try:
+            self.conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+
+
+def _abrir(path):
+    # isolation_level=None: las transacciones se abren explícitamente en transaccion()
+    # Con el log de consultas lentas activo, la conexión mide cada sentencia
+    medir = diagnostico.umbral_consulta_ms is not None
+    conn = sqlite3.connect(path, isolation_level=None, cached_statements=SENTENCIAS_CACHEADAS,
+                           timeout=BUSY_TIMEOUT_MS / 1000,
+                           factory=diagnostico.ConexionMedida if medir else _Conexion)
+    if medir:
+        diagnostico.preparar_conexion(conn)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def get_conn():
+    """
+    Devuelve la conexión del hilo actual, creándola si hace falta.
+    Si DB_NAME cambió desde que se abrió, se reabre sobre el archivo nuevo.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_NAME:
+        return conn
+    if conn is not None:
+        cerrar_conexion()
+    conn = _abrir(DB_NAME)
+    _local.conn = conn
+    _local.path = DB_NAME
+    _local.adjuntas = OrderedDict()
+    _local.cierre = _CierreAlTerminar(conn)
+    with _lock:
+        _conexiones.add(conn)
+    return conn
+
+
+@contextmanager
+def transaccion(inmediata=False):
+    """
+    Ejecuta un bloque dentro de una transacción sobre la conexión del hilo.
+    Hace commit al salir sin errores y rollback si se lanza una excepción.
+    Parámetros:
+        inmediata (bool): Usa BEGIN IMMEDIATE para tomar el lock de escritura al inicio.
+    """
+    conn = get_conn()
+    if conn.in_transaction:
+        # Transacción anidada: la maneja el bloque exterior
+        yield conn.cursor()
+        return
+    conn.execute("BEGIN IMMEDIATE" if inmediata else "BEGIN")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def adjuntar(alias, path):
+    """
+    Adjunta (ATTACH) otra base a la conexión del hilo con el nombre alias, si no lo estaba.
+    Con MAX_ADJUNTAS ya adjuntas se suelta la usada hace más tiempo.
+    No puede llamarse dentro de una transacción.
+    """
+    conn = get_conn()
+    adjuntas = _local.adjuntas
+    if adjuntas.get(alias) == path:
+        adjuntas.move_to_end(alias)
+        return
+    if alias in adjuntas or len(adjuntas) >= MAX_ADJUNTAS:
+        viejo = alias if alias in adjuntas else next(iter(adjuntas))
+        conn.execute(f"DETACH DATABASE {viejo}")
+        del adjuntas[viejo]
+    conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+    adjuntas[alias] = path
+
+
+def cerrar_conexion():
+    """Cierra la conexión del hilo actual, si existe."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        return
+    with _lock:
+        _conexiones.discard(conn)
+    conn.close()
+    _local.conn = None
+    _local.path = None
+    _local.cierre = None
+
+
+def cerrar_todas():
+    """Cierra todas las conexiones abiertas (al salir de la aplicación)."""
+    with _lock:
+        conexiones = list(_conexiones)
+        _conexiones.clear()
+    for conn in conexiones:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # Conexión de otro hilo que sigue vivo: se cierra cuando ese hilo termina
+            pass
+    _local.conn = None
+    _local.path = None
+    _local.cierre = None
+
+
+def usar_base(path):
+    """Cambia el archivo de base de datos (usado por benchmarks y herramientas)."""
+    global DB_NAME
+    DB_NAME = path
@@ -0,0 +1,345 @@
+"""
+Diagnóstico de rendimiento: tiempos por función, consultas lentas y perfiles.
+
+- @medido registra cantidad de llamadas y duración (reloj de pared) de las
+  funciones de datos y de los manejadores de la interfaz. Se guardan las últimas
+  MUESTRAS duraciones de cada una para calcular p50/p95. El tiempo que un
+  manejador pasa esperando al usuario en un diálogo (ver SinMedir) no cuenta.
+- Con configurar(umbral_ms=...) las conexiones nuevas registran en el log cada
+  consulta SQL que tarde más que el umbral (ejecución más lectura de las filas),
+  con el texto y los parámetros (los da el trace callback de sqlite3).
+- perfilar_proxima() corre la próxima función medida bajo cProfile y guarda el
+  perfil en un archivo .prof (y un resumen en el log).
+- medir_importaciones() mide cuánto tarda cada import, como python -X importtime
+  (que no se puede usar con el .exe empaquetado).
+
+En la aplicación: Ctrl+Shift+D abre la ventana de diagnóstico; con
+--diagnostico se activa el log de consultas lentas y al salir se escribe el
+resumen en diagnostico.log.
+"""
+import builtins
+import functools
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+MUESTRAS = 1000            # duraciones guardadas por función (para los percentiles)
+ARCHIVO_LOG = "diagnostico.log"
+
+log = logging.getLogger("control_stock.diagnostico")
+
+umbral_consulta_ms = None  # None: no se registran consultas lentas
+_lock = threading.Lock()
+_metricas = {}             # nombre -> [llamadas, total_s, deque de duraciones]
+_local = threading.local()
+_perfilar = None           # None, o los prefijos de nombre pendientes (se perfila la próxima función de cada uno)
+_import_original = None    # builtins.__import__ mientras se miden las importaciones
+_importaciones = []        # (módulo, propio_s, total_s, nivel) de cada import medido
+
+
+def configurar(umbral_ms=None, archivo=ARCHIVO_LOG):
+    """
+    Activa el log de diagnóstico en archivo y, si se indica umbral_ms, el registro
+    de consultas lentas. Afecta a las conexiones que se abran después.
+    """
+    global umbral_consulta_ms
+    umbral_consulta_ms = umbral_ms
+    if archivo and not any(isinstance(h, logging.FileHandler) for h in log.handlers):
+        handler = logging.FileHandler(archivo, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+
+
+def registrar(nombre, segundos):
+    with _lock:
+        metrica = _metricas.get(nombre)
+        if metrica is None:
+            metrica = _metricas[nombre] = [0, 0.0, deque(maxlen=MUESTRAS)]
+        metrica[0] += 1
+        metrica[1] += segundos
+        metrica[2].append(segundos)
+
+
+def medido(nombre=None):
+    """
+    Decorador que mide la función. El nombre por defecto es 'modulo.Clase.funcion'
+    (las funciones anidadas quedan como 'Clase.metodo.funcion').
+    """
+    def decorador(funcion):
+        clave = nombre or f"{funcion.__module__}.{funcion.__qualname__.replace('<locals>.', '')}"
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if _perfilar is not None and _tomar_perfil(clave):
+                return _correr_perfilado(clave, funcion, args, kwargs)
+            pausas = _pausas()
+            pausas.append(0.0)
+            t0 = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                segundos = time.perf_counter() - t0
+                pausa = pausas.pop()
+                if pausas:
+                    pausas[-1] += pausa
+                registrar(clave, segundos - pausa)
+        return envoltura
+    return decorador
+
+
+def _pausas():
+    pausas = getattr(_local, "pausas", None)
+    if pausas is None:
+        pausas = _local.pausas = []
+    return pausas
+
+
+def sin_medir(funcion):
+    """El tiempo dentro de funcion (p. ej. un diálogo esperando al usuario) no se suma a las funciones medidas."""
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            pausas = _pausas()
+            if pausas:
+                pausas[-1] += time.perf_counter() - t0
+    return envoltura
+
+
+class SinMedir:
+    """Envuelve un módulo (p. ej. tkinter.messagebox) para que todas sus funciones sean sin_medir."""
+
+    def __init__(self, modulo):
+        self._modulo = modulo
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._modulo, nombre)
+        return sin_medir(atributo) if callable(atributo) else atributo
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def resumen():
+    """
+    Estadísticas de las funciones medidas, de la más costosa (tiempo total) a la menos.
+    Retorna:
+        list: Tuplas (nombre, llamadas, total_ms, p50_ms, p95_ms, max_ms); percentiles de las últimas MUESTRAS.
+    """
+    with _lock:
+        copia = [(nombre, llamadas, total, sorted(duraciones))
+                 for nombre, (llamadas, total, duraciones) in _metricas.items()]
+    filas = [(nombre, llamadas, total * 1000, _percentil(d, 0.5) * 1000, _percentil(d, 0.95) * 1000, d[-1] * 1000)
+             for nombre, llamadas, total, d in copia if d]
+    return sorted(filas, key=lambda fila: fila[2], reverse=True)
+
+
+def reiniciar():
+    with _lock:
+        _metricas.clear()
+
+
+def escribir_resumen():
+    """Escribe el resumen de tiempos en el log."""
+    filas = resumen()
+    if not filas:
+        return
+    lineas = [f"{'función':<45} {'llamadas':>8} {'total ms':>10} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8}"]
+    lineas += [f"{n:<45} {c:>8} {t:>10.1f} {p50:>8.2f} {p95:>8.2f} {m:>8.2f}" for n, c, t, p50, p95, m in filas]
+    log.info("Resumen de tiempos:\n%s", "\n".join(lineas))
+
+
+# --- Consultas lentas ---
+
+def _al_ejecutar_sql(sql):
+    # trace callback: se llama con el SQL (con parámetros) de cada sentencia que se ejecuta
+    _local.sql = sql
+
+
+_EJECUCIONES = (sqlite3.Cursor.execute, sqlite3.Cursor.executemany)
+
+
+class CursorMedido(sqlite3.Cursor):
+    """
+    Cursor que registra en el log las sentencias que superan umbral_consulta_ms.
+    Se suma el tiempo de la ejecución y de la lectura de las filas (fetchone,
+    fetchmany, fetchall o recorrer el cursor), y cada sentencia se registra una vez.
+    """
+    _sql = None
+    _ms = 0.0
+    _registrada = False
+
+    def _medir(self, metodo, *args):
+        t0 = time.perf_counter()
+        try:
+            return metodo(self, *args)
+        finally:
+            self._ms += (time.perf_counter() - t0) * 1000
+            if metodo in _EJECUCIONES:
+                # El trace callback deja el SQL con los parámetros; se guarda para las lecturas que siguen
+                self._sql = getattr(_local, "sql", None) or self._sql
+            if umbral_consulta_ms is not None and self._ms >= umbral_consulta_ms and not self._registrada:
+                self._registrada = True
+                log.warning("Consulta lenta (%.1f ms, hasta %s): %s",
+                            self._ms, metodo.__name__, " ".join((self._sql or "?").split()))
+
+    def _ejecutar(self, metodo, *args):
+        self._sql = args[0] if args and isinstance(args[0], str) else None
+        self._ms, self._registrada = 0.0, False
+        _local.sql = None
+        return self._medir(metodo, *args)
+
+    def execute(self, *args):
+        return self._ejecutar(sqlite3.Cursor.execute, *args)
+
+    def executemany(self, *args):
+        return self._ejecutar(sqlite3.Cursor.executemany, *args)
+
+    def fetchone(self):
+        return self._medir(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._medir(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._medir(sqlite3.Cursor.fetchall)
+
+    def __next__(self):
+        return self._medir(sqlite3.Cursor.__next__)
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores son CursorMedido (se usa si hay umbral configurado)."""
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+
+def preparar_conexion(conn):
+    """La llama db al abrir cada conexión ConexionMedida: instala el trace callback."""
+    conn.set_trace_callback(_al_ejecutar_sql)
+
+
+# --- Perfiles ---
+
+def perfilar_proxima(*prefijos):
+    """
+    Perfila la próxima llamada a una función medida cuyo nombre empiece con cada prefijo
+    (p. ej. 'main.StockApp.' para la próxima acción de la interfaz y
+    'escritor.EscritorLotes.' para la escritura que esa acción encola en el hilo escritor).
+    Sin prefijos se perfila la próxima función medida, sea cual sea.
+    """
+    global _perfilar
+    with _lock:
+        _perfilar = list(prefijos or ("",))
+
+
+def _tomar_perfil(clave):
+    global _perfilar
+    if getattr(_local, "perfilando", False):
+        return False  # ya se perfila una función de este hilo (que incluye a esta)
+    with _lock:
+        prefijo = next((p for p in _perfilar or () if clave.startswith(p)), None)
+        if prefijo is None:
+            return False
+        _perfilar.remove(prefijo)
+        if not _perfilar:
+            _perfilar = None
+    return True
+
+
+def _correr_perfilado(clave, funcion, args, kwargs):
+    import cProfile
+    import io
+    import pstats
+    perfil = cProfile.Profile()
+    _local.perfilando = True
+    t0 = time.perf_counter()
+    try:
+        return perfil.runcall(funcion, *args, **kwargs)
+    finally:
+        registrar(clave, time.perf_counter() - t0)
+        _local.perfilando = False
+        archivo = f"perfil-{clave.replace('.', '_')}-{datetime.now():%Y%m%d-%H%M%S}.prof"
+        perfil.dump_stats(archivo)
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats("cumulative").print_stats(25)
+        log.info("Perfil de %s guardado en %s\n%s", clave, archivo, texto.getvalue())
+
+
+# --- Importaciones ---
+
+def medir_importaciones():
+    """
+    Empieza a registrar el tiempo de cada módulo que se importa por primera vez
+    (propio y con lo que importa adentro). Hay que llamarla antes de los imports a medir.
+    """
+    global _import_original
+    if _import_original is not None:
+        return
+    original = _import_original = builtins.__import__
+
+    def importar(nombre, globals=None, locals=None, fromlist=(), level=0):
+        if level:
+            return original(nombre, globals, locals, fromlist, level)
+        modulo = sys.modules.get(nombre)
+        if modulo is not None:
+            # 'from paquete import submodulo' con el paquete ya cargado
+            subs = [sub for sub in fromlist or () if sub != "*" and not hasattr(modulo, sub)]
+            if not subs:
+                return original(nombre, globals, locals, fromlist, level)
+            nombre_medido = f"{nombre}.{','.join(subs)}"
+        else:
+            nombre_medido = nombre
+        pila = getattr(_local, "importando", None)
+        if pila is None:
+            pila = _local.importando = []
+        pila.append(0.0)
+        t0 = time.perf_counter()
+        try:
+            return original(nombre, globals, locals, fromlist, level)
+        finally:
+            segundos = time.perf_counter() - t0
+            hijos = pila.pop()
+            if pila:
+                pila[-1] += segundos
+            _importaciones.append((nombre_medido, segundos - hijos, segundos, len(pila)))
+
+    builtins.__import__ = importar
+
+
+def terminar_importaciones():
+    """
+    Deja de medir importaciones.
+    Retorna:
+        list: Tuplas (módulo, propio_s, total_s, nivel) en el orden en que terminaron.
+    """
+    global _import_original
+    if _import_original is not None:
+        builtins.__import__ = _import_original
+        _import_original = None
+    return list(_importaciones)
+
+
+def reporte_importaciones(importaciones, cantidad=25):
+    """Texto con los imports más lentos (total incluye los imports anidados; nivel 0 = directo)."""
+    total = sum(t for _, _, t, nivel in importaciones if nivel == 0)
+    lineas = [f"Importaciones: {len(importaciones)} módulos, {total * 1000:.0f} ms",
+              f"{'propio ms':>10} {'total ms':>10}  módulo"]
+    for nombre, propio, segundos, nivel in sorted(importaciones, key=lambda i: i[2], reverse=True)[:cantidad]:
+        lineas.append(f"{propio * 1000:>10.1f} {segundos * 1000:>10.1f}  {'  ' * nivel}{nombre}")
+    return "\n".join(lineas)
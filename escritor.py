@@ -0,0 +1,154 @@
+"""
+Escrituras en segundo plano con commit agrupado.
+
+La interfaz no escribe en SQLite desde el hilo de Tk: encola cada operación
+(registrar_venta, ingresar_stock, modificar_precios, ...) en un EscritorLotes,
+que las ejecuta en un único hilo. Las que llegan dentro de una ventana corta
+(VENTANA_MS) se confirman juntas con un solo COMMIT, cada una en su SAVEPOINT:
+si una falla (p. ej. stock insuficiente) se deshace solo esa y las demás se
+guardan. Como hay un solo hilo y la cola es FIFO, las operaciones se aplican
+en el orden en que se encolaron; en particular, las de un mismo producto.
+
+No depende de tkinter: el resultado de cada operación se entrega en un
+concurrent.futures.Future, y quien lo encoló decide en qué hilo leerlo.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import db
+from diagnostico import medido
+
+VENTANA_MS = 5      # espera por más operaciones antes de confirmar un lote
+LOTE_MAXIMO = 256   # operaciones por COMMIT como máximo
+
+
+class EscritorLotes:
+    """
+    Hilo escritor con cola de operaciones y commit agrupado.
+    Parámetros:
+        al_cambiar_productos (callable): Registro de observadores de la fuente de datos
+            (inventario.al_cambiar_productos o el del ClienteStock); así cada resultado
+            trae los cambios de productos que produjo su operación.
+        agrupar (bool): Ejecuta cada lote en una transacción local. En modo caja las
+            operaciones van al servidor (que agrupa por su cuenta) y se ejecutan de a una.
+    """
+
+    def __init__(self, al_cambiar_productos=None, agrupar=True, ventana_ms=VENTANA_MS, lote_maximo=LOTE_MAXIMO):
+        self.agrupar = agrupar
+        self.ventana = ventana_ms / 1000
+        self.lote_maximo = lote_maximo
+        self.lotes = 0        # COMMITs hechos (para medir el agrupamiento)
+        self.escrituras = 0
+        self._cola = queue.Queue()
+        self._cambios = None  # cambios de la operación en curso (solo los toca el hilo escritor)
+        self._detenido = False
+        self._ejecutando = threading.Lock()  # lo toma el hilo escritor en cada lote (ver en_pausa)
+        if al_cambiar_productos is not None:
+            al_cambiar_productos(self._capturar)
+        self._hilo = threading.Thread(target=self._trabajar, name="escritor", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, funcion, *args):
+        """
+        Encola funcion(*args) para el hilo escritor.
+        Retorna:
+            Future: Se resuelve con (resultado, cambios) cuando la operación queda
+            confirmada, o con la excepción de la operación (o del COMMIT de su lote).
+        """
+        if self._detenido:
+            raise RuntimeError("El escritor está detenido.")
+        futuro = Future()
+        self._cola.put((funcion, args, futuro))
+        return futuro
+
+    def pendientes(self):
+        """Operaciones encoladas que todavía no empezaron."""
+        return self._cola.qsize()
+
+    @contextmanager
+    def en_pausa(self):
+        """
+        Suspende las escrituras mientras dura el bloque (p. ej. para compactar la base con VACUUM,
+        que la toma en exclusiva). Espera a que termine el lote en curso; lo que se encola
+        mientras tanto se escribe al salir del bloque.
+        """
+        with self._ejecutando:
+            yield
+
+    def detener(self, timeout=None):
+        """Termina de escribir lo encolado y detiene el hilo."""
+        if not self._detenido:
+            self._detenido = True
+            self._cola.put(None)
+        self._hilo.join(timeout)
+
+    # --- Hilo escritor ---
+
+    def _capturar(self, cambios):
+        if threading.current_thread() is self._hilo and self._cambios is not None:
+            self._cambios.extend(cambios)
+
+    def _trabajar(self):
+        try:
+            terminar = False
+            while not terminar:
+                operacion = self._cola.get()
+                if operacion is None:
+                    break
+                lote = [operacion]
+                limite = time.monotonic() + self.ventana
+                while len(lote) < self.lote_maximo:
+                    try:
+                        operacion = self._cola.get(timeout=max(0, limite - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if operacion is None:
+                        terminar = True
+                        break
+                    lote.append(operacion)
+                with self._ejecutando:
+                    self._ejecutar_lote(lote)
+        finally:
+            db.cerrar_conexion()
+
+    @medido()
+    def _ejecutar_lote(self, lote):
+        try:
+            if self.agrupar:
+                with db.transaccion(inmediata=True) as c:
+                    resultados = [self._ejecutar(funcion, args, c) for funcion, args, _ in lote]
+            else:
+                resultados = [self._ejecutar(funcion, args, None) for funcion, args, _ in lote]
+        except Exception as e:
+            # Falló el COMMIT: no quedó escrita ninguna operación del lote
+            for _, _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        self.lotes += 1
+        self.escrituras += len(lote)
+        for (_, _, futuro), (error, resultado, cambios) in zip(lote, resultados):
+            if error is not None:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result((resultado, cambios))
+
+    def _ejecutar(self, funcion, args, c):
+        """Ejecuta una operación (en su SAVEPOINT si hay transacción). Retorna (error, resultado, cambios)."""
+        self._cambios = []
+        if c is not None:
+            c.execute("SAVEPOINT operacion")
+        try:
+            resultado = funcion(*args)
+        except Exception as e:
+            if c is not None:
+                c.execute("ROLLBACK TO operacion")
+            return e, None, []
+        else:
+            return None, resultado, self._cambios
+        finally:
+            if c is not None:
+                c.execute("RELEASE operacion")
+            self._cambios = None
@@ -0,0 +1,231 @@
+"""
+Fotos periódicas del stock para saber qué había (y cuánto valía) en una fecha pasada.
+
+Una foto guarda la cantidad y los precios de cada producto en un momento, junto
+con el último movimiento y el último cambio de precio que ya incluye. El stock a
+una fecha se calcula desde la foto más cercana: hacia adelante, sumando los
+movimientos posteriores a la foto, o hacia atrás (desde una foto posterior o
+desde el stock actual), restando los movimientos posteriores a la fecha. Así el
+costo depende de la cantidad de productos y de los movimientos cercanos, no de
+todo el historial. Los productos eliminados se conservan en las fotos y en
+eliminados (con su stock al eliminarlos).
+
+Se toma una foto al abrir la aplicación si la última tiene más de INTERVALO_DIAS:
+    python cli.py foto
+    python cli.py valorizar --fecha 2025-06-30
+"""
+from datetime import date, datetime, timedelta
+
+import archivado
+from db import get_conn, transaccion
+
+INTERVALO_DIAS = 30  # antigüedad de la última foto a partir de la cual se toma otra
+_FIN = "9999-12-31"
+
+
+def crear_tablas(c):
+    """Crea las tablas de fotos (la usa la migración que las introduce)."""
+    c.execute('''CREATE TABLE IF NOT EXISTS fotos_stock (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha TEXT NOT NULL,
+        ultimo_movimiento INTEGER NOT NULL, -- id del último movimiento incluido
+        ultimo_precio INTEGER NOT NULL,     -- id del último cambio de historial_precios incluido
+        productos INTEGER NOT NULL
+    )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_fotos_stock_fecha ON fotos_stock(fecha)")
+    c.execute('''CREATE TABLE IF NOT EXISTS fotos_stock_productos (
+        foto_id INTEGER NOT NULL,
+        producto_id INTEGER NOT NULL,
+        nombre TEXT,
+        cantidad INTEGER,
+        costo_real REAL,
+        costo_comprador REAL,
+        PRIMARY KEY (foto_id, producto_id)
+    ) WITHOUT ROWID''')
+    # Para recorrer hacia atrás los cambios de precio posteriores a una fecha
+    c.execute("CREATE INDEX IF NOT EXISTS idx_historial_precios_fecha ON historial_precios(fecha)")
+
+
+def _ahora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _secuencia(c, tabla):
+    c.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (tabla,))
+    fila = c.fetchone()
+    return fila[0] if fila else 0
+
+
+def tomar_foto():
+    """
+    Guarda la cantidad y los precios actuales de todos los productos.
+    Retorna:
+        int: ID de la foto.
+    """
+    # BEGIN IMMEDIATE: ningún movimiento puede quedar a medias entre la foto y sus contadores
+    with transaccion(inmediata=True) as c:
+        c.execute("INSERT INTO fotos_stock (fecha, ultimo_movimiento, ultimo_precio, productos) "
+                  "VALUES (?, ?, ?, (SELECT COUNT(*) FROM productos))",
+                  (_ahora(), _secuencia(c, "movimientos"), _secuencia(c, "historial_precios")))
+        foto_id = c.lastrowid
+        c.execute("""
+            INSERT INTO fotos_stock_productos (foto_id, producto_id, nombre, cantidad, costo_real, costo_comprador)
+            SELECT ?, id, nombre, cantidad, costo_real, costo_comprador FROM productos
+        """, (foto_id,))
+    return foto_id
+
+
+def tomar_foto_si_corresponde(dias=INTERVALO_DIAS):
+    """
+    Toma una foto si no hay ninguna de los últimos dias días.
+    Retorna:
+        int: ID de la foto tomada, o None si no hacía falta.
+    """
+    desde = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d %H:%M:%S")
+    if get_conn().execute("SELECT 1 FROM fotos_stock WHERE fecha >= ? LIMIT 1", (desde,)).fetchone():
+        return None
+    return tomar_foto()
+
+
+def _variaciones(desde, hasta, despues_de_id=0, hasta_id=None):
+    """
+    Entradas (y stock inicial) menos salidas por producto de los movimientos en [desde, hasta),
+    incluidos los archivados.
+    """
+    variaciones = {}
+    for tramo_desde, tramo_hasta, anio in archivado.tramos(desde, hasta):
+        tabla = "movimientos" if anio is None else archivado.tabla_movimientos(anio)
+        sql = (f"SELECT producto_id, SUM(CASE WHEN tipo IN ('entrada', 'inicial') THEN cantidad ELSE -cantidad END) "
+               f"FROM {tabla} WHERE fecha >= ? AND fecha < ? AND id > ?")
+        params = [tramo_desde, tramo_hasta, despues_de_id]
+        if hasta_id is not None:
+            sql += " AND id <= ?"
+            params.append(hasta_id)
+        for producto_id, variacion in get_conn().execute(sql + " GROUP BY producto_id", params):
+            variaciones[producto_id] = variaciones.get(producto_id, 0) + variacion
+    return variaciones
+
+
+def _eliminados(desde, hasta):
+    """Productos eliminados en [desde, hasta) (hora local), con su stock y precios al eliminarlos."""
+    # fecha_eliminado se guarda en UTC (CURRENT_TIMESTAMP); los movimientos, en hora local
+    return {fila[0]: list(fila[1:]) for fila in get_conn().execute("""
+        SELECT producto_id, nombre, cantidad, costo_real, costo_comprador FROM eliminados
+        WHERE producto_id IS NOT NULL
+          AND datetime(fecha_eliminado, 'localtime') >= ? AND datetime(fecha_eliminado, 'localtime') < ?
+    """, (desde, hasta))}
+
+
+def _desde_foto_anterior(foto_id, fecha, ultimo_movimiento, ultimo_precio, limite):
+    """Stock a limite partiendo de una foto anterior y sumando lo que pasó después."""
+    conn = get_conn()
+    productos = {fila[0]: list(fila[1:]) for fila in conn.execute(
+        "SELECT producto_id, nombre, cantidad, costo_real, costo_comprador FROM fotos_stock_productos WHERE foto_id = ?",
+        (foto_id,))}
+    # Desde el comienzo del día de la foto: un movimiento puede tener fecha apenas anterior a la foto
+    for producto_id, variacion in _variaciones(fecha[:10], limite, despues_de_id=ultimo_movimiento).items():
+        productos.setdefault(producto_id, [None, 0, None, None])[1] += variacion
+    # El último precio anterior al límite de cada producto (el historial está en orden cronológico)
+    for producto_id, costo_real, costo_comprador in conn.execute(
+            "SELECT producto_id, costo_real, costo_comprador FROM historial_precios WHERE id > ? AND fecha < ? ORDER BY id",
+            (ultimo_precio, limite)):
+        if producto_id in productos:
+            productos[producto_id][2:] = [costo_real, costo_comprador]
+    for producto_id in _eliminados(fecha, limite):
+        productos.pop(producto_id, None)
+    # Nombres de los productos creados después de la foto (si ya no existen, de eliminados)
+    for sql in ("SELECT id, nombre, costo_real, costo_comprador FROM productos WHERE id IN ({})",
+                "SELECT producto_id, nombre, costo_real, costo_comprador FROM eliminados WHERE producto_id IN ({})"):
+        sin_nombre = [producto_id for producto_id, valores in productos.items() if valores[0] is None]
+        for inicio in range(0, len(sin_nombre), 500):
+            ids = sin_nombre[inicio:inicio + 500]
+            for producto_id, nombre, costo_real, costo_comprador in conn.execute(sql.format(",".join("?" * len(ids))), ids):
+                valores = productos[producto_id]
+                valores[0] = nombre
+                valores[2:] = [valores[2] if valores[2] is not None else costo_real,
+                               valores[3] if valores[3] is not None else costo_comprador]
+    return productos
+
+
+def _desde_foto_posterior(foto, limite):
+    """
+    Stock a limite partiendo de una foto posterior (o del stock actual si foto es None)
+    y restando lo que pasó entre limite y la foto.
+    """
+    conn = get_conn()
+    if foto is None:
+        fecha, ultimo_movimiento, ultimo_precio = _ahora(), None, None
+        productos = {fila[0]: list(fila[1:]) for fila in conn.execute(
+            "SELECT id, nombre, cantidad, costo_real, costo_comprador FROM productos")}
+    else:
+        foto_id, fecha, ultimo_movimiento, ultimo_precio = foto
+        productos = {fila[0]: list(fila[1:]) for fila in conn.execute(
+            "SELECT producto_id, nombre, cantidad, costo_real, costo_comprador FROM fotos_stock_productos WHERE foto_id = ?",
+            (foto_id,))}
+    # Los eliminados entre el límite y la foto existían en la fecha pedida
+    productos.update(_eliminados(limite, fecha))
+    hasta = (date.fromisoformat(fecha[:10]) + timedelta(days=1)).isoformat() if foto else _FIN
+    for producto_id, variacion in _variaciones(limite, hasta, hasta_id=ultimo_movimiento).items():
+        if producto_id in productos:
+            productos[producto_id][1] -= variacion
+    # El primer cambio de precio posterior al límite tiene el precio que regía en la fecha;
+    # si no había precio anterior, el producto se creó después
+    sql = ("SELECT producto_id, costo_real_anterior, costo_comprador_anterior FROM historial_precios "
+           "WHERE fecha >= ?")
+    params = [limite]
+    if ultimo_precio is not None:
+        sql += " AND id <= ?"
+        params.append(ultimo_precio)
+    anteriores = {}
+    for producto_id, costo_real, costo_comprador in conn.execute(sql + " ORDER BY id DESC", params):
+        anteriores[producto_id] = (costo_real, costo_comprador)
+    for producto_id, (costo_real, costo_comprador) in anteriores.items():
+        if producto_id not in productos:
+            continue
+        if costo_real is None and costo_comprador is None:
+            del productos[producto_id]
+        else:
+            productos[producto_id][2:] = [costo_real, costo_comprador]
+    return productos
+
+
+def stock_a_fecha(dia):
+    """
+    Stock de cada producto al terminar el día indicado, con los precios que regían.
+    Parte de la foto más cercana (anterior, posterior o el stock actual).
+    Parámetros:
+        dia (date | str): Día ('YYYY-MM-DD').
+    Retorna:
+        list: Tuplas (producto_id, nombre, cantidad, costo_real, costo_comprador) de los
+              productos con stock distinto de cero, ordenadas por nombre.
+    """
+    if isinstance(dia, str):
+        dia = date.fromisoformat(dia)
+    limite = (dia + timedelta(days=1)).isoformat()
+    conn = get_conn()
+    anterior = conn.execute("SELECT id, fecha, ultimo_movimiento, ultimo_precio FROM fotos_stock "
+                            "WHERE fecha < ? ORDER BY fecha DESC LIMIT 1", (limite,)).fetchone()
+    posterior = conn.execute("SELECT id, fecha, ultimo_movimiento, ultimo_precio FROM fotos_stock "
+                             "WHERE fecha >= ? ORDER BY fecha LIMIT 1", (limite,)).fetchone()
+    # Se elige la foto más cercana en el tiempo (menos movimientos para recorrer)
+    if anterior is not None:
+        atras = datetime.fromisoformat(limite) - datetime.fromisoformat(anterior[1])
+        adelante = datetime.fromisoformat(posterior[1] if posterior else _ahora()) - datetime.fromisoformat(limite)
+    if anterior is not None and atras <= adelante:
+        productos = _desde_foto_anterior(*anterior, limite)
+    else:
+        productos = _desde_foto_posterior(posterior, limite)
+    return sorted(((producto_id,) + tuple(valores) for producto_id, valores in productos.items() if valores[1]),
+                  key=lambda p: (p[1] or "").lower())
+
+
+def valorizar(dia):
+    """
+    Valor del stock al terminar el día indicado.
+    Retorna:
+        tuple: (unidades, valor al precio de compra, valor al precio de venta)
+    """
+    productos = stock_a_fecha(dia)
+    return (sum(p[2] for p in productos),
+            sum(p[2] * (p[3] or 0) for p in productos),
+            sum(p[2] * (p[4] or 0) for p in productos))
@@ -0,0 +1,161 @@
+"""
+Costo original en dólares de los productos e historial de cambios de precio.
+
+Los precios de la tabla productos están siempre en pesos. Para los productos en
+dólares se guarda además el costo en dólares (costos_dolares), así cuando cambia
+la cotización se recalculan todos sus precios con un único UPDATE (ver
+inventario.repreciar_dolares). Cada cambio de precio, por el camino que sea,
+queda en historial_precios con el precio anterior, el nuevo y la cotización usada.
+"""
+import sqlite3
+from datetime import datetime
+
+from db import get_conn
+from precios import MARGEN_DOLARES
+
+TOLERANCIA = 0.000001  # diferencias menores (redondeo de costo_usd) no cuentan como cambio de precio
+
+
+def crear_tablas(c):
+    """Crea las tablas de costos en dólares e historial (la usa la migración que las introduce)."""
+    c.execute('''CREATE TABLE IF NOT EXISTS costos_dolares (
+        producto_id INTEGER PRIMARY KEY,
+        costo_usd REAL NOT NULL
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS historial_precios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        producto_id INTEGER NOT NULL,
+        fecha TEXT NOT NULL,
+        motivo TEXT NOT NULL, -- 'alta', 'manual', 'importacion' o 'cotizacion'
+        costo_real_anterior REAL,
+        costo_comprador_anterior REAL,
+        costo_real REAL,
+        costo_comprador REAL,
+        cotizacion REAL
+    )''')
+    # El rowid va implícito al final: (producto_id) ordena cada producto por id (orden cronológico)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_historial_precios_producto ON historial_precios(producto_id)")
+
+
+def cargar_costos_existentes(c):
+    """
+    Completa costos_dolares para los productos en dólares que ya existían, con la
+    última cotización guardada (la que se usó para sus precios no quedó registrada).
+    Sin ninguna cotización no se completa nada y esos productos no se repreciarán
+    hasta que se les modifique el precio.
+    """
+    c.execute("""
+        INSERT OR IGNORE INTO costos_dolares (producto_id, costo_usd)
+        SELECT p.id, p.costo_real / u.valor
+        FROM productos p, (SELECT valor FROM cotizaciones ORDER BY id DESC LIMIT 1) u
+        WHERE p.en_dolares = 1 AND p.costo_real > 0 AND u.valor > 0
+    """)
+
+
+def _ahora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def guardar_costos(c, productos, usd_price):
+    """
+    Actualiza el costo en dólares de productos recién creados o modificados.
+    Parámetros:
+        productos (list): Tuplas (producto_id, en_dolares, costo_real en pesos).
+        usd_price (float): Cotización con la que se calcularon esos precios; si falta,
+            el costo en dólares de los productos en dólares queda desconocido.
+    """
+    c.executemany("INSERT OR REPLACE INTO costos_dolares (producto_id, costo_usd) VALUES (?, ?)",
+                  [(producto_id, costo_real / usd_price) for producto_id, en_dolares, costo_real in productos
+                   if en_dolares and usd_price and costo_real])
+    c.executemany("DELETE FROM costos_dolares WHERE producto_id = ?",
+                  [(producto_id,) for producto_id, en_dolares, costo_real in productos
+                   if not (en_dolares and usd_price and costo_real)])
+
+
+def registrar(c, cambios, motivo, cotizacion=None, fecha=None):
+    """
+    Agrega cambios de precio al historial (los que no cambian el precio se omiten).
+    Parámetros:
+        cambios (list): Tuplas (producto_id, antes, despues) con las filas del producto.
+        motivo (str): 'alta', 'manual', 'importacion' o 'cotizacion'.
+        cotizacion (float): Cotización usada, si el producto está en dólares.
+    """
+    fecha = fecha or _ahora()
+    filas = []
+    for producto_id, antes, despues in cambios:
+        anterior = (antes[2], antes[3]) if antes else (None, None)
+        if despues is None or (despues[2], despues[3]) == anterior:
+            continue
+        filas.append((producto_id, fecha, motivo) + anterior +
+                     (despues[2], despues[3], cotizacion if despues[5] else None))
+    c.executemany("""INSERT INTO historial_precios (producto_id, fecha, motivo, costo_real_anterior,
+                         costo_comprador_anterior, costo_real, costo_comprador, cotizacion)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", filas)
+
+
+def repreciar(c, usd_price, fecha=None):
+    """
+    Recalcula en bloque los precios en pesos de los productos en dólares con costo conocido.
+    Primero se anotan en el historial los precios nuevos (INSERT ... SELECT) y después
+    se copian a productos con un UPDATE ... FROM (o, antes de SQLite 3.33, con subconsultas),
+    sin traer filas a Python.
+    Retorna:
+        int: id del historial a partir del cual (exclusive) están los productos modificados.
+    """
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM historial_precios")
+    desde = c.fetchone()[0]
+    # Igual que precios.calcular_precios: compra = usd * cotización, venta = usd * margen * cotización
+    c.execute("""
+        INSERT INTO historial_precios (producto_id, fecha, motivo, costo_real_anterior,
+                                       costo_comprador_anterior, costo_real, costo_comprador, cotizacion)
+        SELECT p.id, ?, 'cotizacion', p.costo_real, p.costo_comprador,
+               d.costo_usd * ?, d.costo_usd * ? * ?, ?
+        FROM productos p JOIN costos_dolares d ON d.producto_id = p.id
+        WHERE p.en_dolares = 1
+          AND (abs(COALESCE(p.costo_real, 0) - d.costo_usd * ?) >= ?
+               OR abs(COALESCE(p.costo_comprador, 0) - d.costo_usd * ? * ?) >= ?)
+    """, (fecha or _ahora(), usd_price, MARGEN_DOLARES, usd_price, usd_price,
+          usd_price, TOLERANCIA, MARGEN_DOLARES, usd_price, TOLERANCIA))
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        c.execute("""
+            UPDATE productos SET costo_real = h.costo_real, costo_comprador = h.costo_comprador
+            FROM historial_precios h
+            WHERE h.id > ? AND h.producto_id = productos.id
+        """, (desde,))
+    else:
+        # Sin UPDATE ... FROM: una subconsulta por columna, cada una por el índice de producto_id
+        c.execute("""
+            UPDATE productos SET
+                costo_real = (SELECT h.costo_real FROM historial_precios h
+                              WHERE h.producto_id = productos.id AND h.id > ?),
+                costo_comprador = (SELECT h.costo_comprador FROM historial_precios h
+                                   WHERE h.producto_id = productos.id AND h.id > ?)
+            WHERE id IN (SELECT producto_id FROM historial_precios WHERE id > ?)
+        """, (desde, desde, desde))
+    return desde
+
+
+def get_costo_usd(producto_id):
+    """
+    Costo en dólares guardado del producto.
+    Retorna:
+        float: Costo en dólares, o None si no se conoce (o el producto está en pesos).
+    """
+    fila = get_conn().execute("SELECT costo_usd FROM costos_dolares WHERE producto_id = ?", (producto_id,)).fetchone()
+    return fila[0] if fila else None
+
+
+def get_historial(producto_id=None, limite=100):
+    """
+    Últimos cambios de precio, del más reciente al más viejo.
+    Retorna:
+        list: Tuplas (fecha, producto_id, motivo, costo_real_anterior, costo_comprador_anterior,
+              costo_real, costo_comprador, cotizacion).
+    """
+    sql = ("SELECT fecha, producto_id, motivo, costo_real_anterior, costo_comprador_anterior, "
+           "costo_real, costo_comprador, cotizacion FROM historial_precios")
+    params = []
+    if producto_id is not None:
+        sql += " WHERE producto_id = ?"
+        params.append(producto_id)
+    return get_conn().execute(sql + " ORDER BY id DESC LIMIT ?", params + [limite]).fetchall()
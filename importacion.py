@@ -0,0 +1,268 @@
+"""
+Importación masiva de productos y stock desde CSV o XLSX (listas de precios de proveedores).
+
+El archivo se lee de a tramos, sin cargarlo entero en memoria. Cada fila se valida
+con las mismas reglas que el alta manual y se aplica por nombre (sin distinguir
+mayúsculas, también las acentuadas: "JABÓN" es "Jabón"):
+    - si el producto no existe, se crea con la cantidad indicada;
+    - si ya existe, se actualizan sus precios y la cantidad se suma como entrada de stock.
+      Del producto existente solo cambian las columnas que trae el archivo: sin 'moneda',
+      el precio está en la moneda del producto; sin 'iva' o 'min_stock', quedan los suyos.
+Cada lote de filas se escribe en una sola transacción con executemany.
+
+Columnas reconocidas (el orden no importa, mayúsculas y acentos tampoco):
+    nombre, precio_compra (o costo), moneda ('Pesos'/'Dólar', o en_dolares 0/1),
+    iva (21 si falta), cantidad (0 si falta), min_stock (1 si falta)
+Los valores por defecto solo se usan para crear productos.
+"""
+import csv
+import os
+import sqlite3
+import unicodedata
+from datetime import datetime
+
+from db import transaccion
+from inventario import buscar_por_nombres
+from precios import calcular_precios, clave_nombre, validar_producto
+import historial_precios
+import resumenes
+
+TAMANIO_LOTE = 500
+
+# Nombre normalizado de la columna en el archivo -> campo
+ALIAS_COLUMNAS = {
+    "nombre": "nombre", "producto": "nombre", "descripcion": "nombre",
+    "precio_compra": "precio_compra", "precio de compra": "precio_compra", "costo": "precio_compra",
+    "costo_real": "precio_compra", "precio": "precio_compra",
+    "moneda": "moneda", "en_dolares": "moneda", "en dolares": "moneda",
+    "iva": "iva", "iva (%)": "iva",
+    "cantidad": "cantidad", "stock": "cantidad",
+    "min_stock": "min_stock", "stock minimo": "min_stock", "minimo": "min_stock",
+}
+
+
+class ResultadoImportacion:
+    """Resumen de una importación: filas creadas, actualizadas y errores por línea."""
+
+    def __init__(self):
+        self.creados = 0
+        self.actualizados = 0
+        self.errores = []   # (número de línea, mensaje)
+        self.cancelada = False
+        self.ids = []       # IDs de productos creados o modificados
+
+    def __str__(self):
+        texto = f"Creados: {self.creados}. Actualizados: {self.actualizados}. Con errores: {len(self.errores)}."
+        if self.cancelada:
+            texto += " (importación cancelada)"
+        return texto
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode()
+    return texto.strip().lower()
+
+
+def _leer_csv(path):
+    """Genera (número de línea, valores, fracción leída del archivo)."""
+    tamanio = os.path.getsize(path) or 1
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        for numero, valores in enumerate(csv.reader(f, dialecto), start=1):
+            yield numero, valores, f.buffer.tell() / tamanio
+
+
+def _leer_xlsx(path):
+    from openpyxl import load_workbook
+    libro = load_workbook(path, read_only=True, data_only=True)
+    try:
+        hoja = libro.active
+        total = hoja.max_row or 0
+        for numero, valores in enumerate(hoja.iter_rows(values_only=True), start=1):
+            yield numero, list(valores), (numero / total if total else 0)
+    finally:
+        libro.close()
+
+
+def leer_archivo(path):
+    """
+    Lee un CSV o XLSX fila por fila.
+    Genera:
+        tuple: (número de línea, dict campo -> valor, fracción leída)
+    """
+    lector = _leer_xlsx(path) if path.lower().endswith((".xlsx", ".xlsm")) else _leer_csv(path)
+    campos = None
+    for numero, valores, fraccion in lector:
+        if campos is None:
+            campos = [ALIAS_COLUMNAS.get(_normalizar(v)) for v in valores]
+            if "nombre" not in campos or "precio_compra" not in campos:
+                raise ValueError("El archivo debe tener al menos las columnas 'nombre' y 'precio_compra'.")
+            continue
+        if not any(v not in (None, "") for v in valores):
+            continue  # fila vacía
+        fila = {campo: valor for campo, valor in zip(campos, valores) if campo}
+        yield numero, fila, fraccion
+
+
+def _numero(valor, tipo, defecto, campo):
+    if valor is None or str(valor).strip() == "":
+        if defecto is None:
+            raise ValueError(f"Falta el campo '{campo}'")
+        return defecto
+    texto = str(valor).strip().replace("$", "")
+    if "," in texto and "." not in texto:
+        texto = texto.replace(",", ".")  # decimales con coma
+    try:
+        numero = float(texto)
+    except ValueError:
+        raise ValueError(f"'{valor}' no es un número válido en '{campo}'")
+    if tipo is int:
+        if numero != int(numero):
+            raise ValueError(f"'{valor}' debe ser un número entero en '{campo}'")
+        return int(numero)
+    return numero
+
+
+def validar_fila(fila):
+    """
+    Valida una fila del archivo con las reglas del alta manual. Las columnas que faltan
+    (o están vacías) toman el valor por defecto; ver campos_con_valor.
+    Retorna:
+        tuple: (nombre, costo en la moneda indicada, iva, en_dolares, cantidad, min_stock)
+    """
+    nombre = str(fila.get("nombre") or "").strip()
+    costo = _numero(fila.get("precio_compra"), float, None, "precio_compra")
+    iva = _numero(fila.get("iva"), float, 21.0, "iva")
+    cantidad = _numero(fila.get("cantidad"), int, 0, "cantidad")
+    min_stock = _numero(fila.get("min_stock"), int, 1, "min_stock")
+    validar_producto(nombre, costo, iva, cantidad, min_stock)
+    moneda = _normalizar(fila.get("moneda"))
+    en_dolares = 1 if moneda in ("dolar", "dolares", "usd", "u$s", "1", "si") else 0
+    return nombre, costo, iva, en_dolares, cantidad, min_stock
+
+
+# Campo del archivo de cada valor de validar_fila que puede faltar (None: siempre viene o se suma)
+_CAMPOS_OPCIONALES = (None, None, "iva", "moneda", None, "min_stock")
+
+
+def campos_con_valor(fila):
+    """Campos que la fila trae con valor (los demás no se modifican en un producto existente)."""
+    return {campo for campo, valor in fila.items() if valor is not None and str(valor).strip() != ""}
+
+
+def _aplicar_lote(lote, resultado, usd_price):
+    """
+    Crea o actualiza los productos del lote en una transacción.
+    lote: dict clave (ver precios.clave_nombre) -> (línea, datos de validar_fila, campos con valor en el archivo).
+    """
+    fecha_local = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaccion(inmediata=True) as c:
+        anteriores = buscar_por_nombres(c, [datos[0] for _, datos, _ in lote.values()])
+        # Filas con los precios en pesos: (línea, nombre, costo_real, costo_comprador, iva, en_dolares,
+        # cantidad, min_stock, producto existente o None)
+        filas = []
+        for clave, (linea, datos, campos) in lote.items():
+            nombre, costo, iva, en_dolares, cantidad, min_stock = datos
+            anterior = anteriores.get(clave)
+            if anterior is not None:
+                # Lo que el archivo no trae queda como estaba (también la moneda del precio)
+                iva = iva if "iva" in campos else anterior[4]
+                en_dolares = en_dolares if "moneda" in campos else anterior[5]
+                min_stock = min_stock if "min_stock" in campos else anterior[7]
+            try:
+                costo_real, costo_comprador = calcular_precios(costo, en_dolares, usd_price)
+            except ValueError as e:
+                resultado.errores.append((linea, str(e)))
+                continue
+            filas.append((linea, nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock, anterior))
+        cambios = [(costo_real, costo_comprador, iva, en_dolares, min_stock, cantidad, anterior[0])
+                   for _, _, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock, anterior in filas
+                   if anterior is not None]
+        # Los nuevos de a uno: un nombre rechazado por la base se informa en su línea y sigue el resto
+        creados = []
+        for linea, *producto, anterior in filas:
+            if anterior is not None:
+                continue
+            try:
+                c.execute("INSERT INTO productos (nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock) "
+                          "VALUES (?, ?, ?, ?, ?, ?, ?)", producto)
+            except sqlite3.IntegrityError as e:
+                resultado.errores.append((linea, f"No se pudo crear '{producto[0]}': {e}"))
+                continue
+            creados.append(c.lastrowid)
+        c.executemany("UPDATE productos SET costo_real=?, costo_comprador=?, iva=?, en_dolares=?, min_stock=?, "
+                      "cantidad = cantidad + ? WHERE id=?", cambios)
+        # La cantidad de un producto que ya existía entra como movimiento de stock
+        movimientos = [(producto_id, "entrada", cantidad, fecha_local, costo_real)
+                       for costo_real, _, _, _, _, cantidad, producto_id in cambios if cantidad > 0]
+        c.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) VALUES (?, ?, ?, ?, ?)",
+                      movimientos)
+        resumenes.acumular_lote(c, movimientos)
+        ids = creados + [cambio[-1] for cambio in cambios]
+        c.execute(f"SELECT * FROM productos WHERE id IN ({','.join('?' * len(ids))})", ids)
+        productos = c.fetchall()
+        # El stock inicial de los productos nuevos también entra como movimiento ('inicial':
+        # no es una compra, así que no va a los resúmenes)
+        nuevos = set(creados)
+        iniciales = [(p[0], "inicial", p[6], fecha_local, p[2] or 0) for p in productos if p[0] in nuevos and p[6]]
+        c.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) VALUES (?, ?, ?, ?, ?)",
+                      iniciales)
+        # Costo en dólares e historial de precios de lo creado o modificado
+        por_id = {p[0]: p for p in anteriores.values()}
+        historial_precios.guardar_costos(c, [(p[0], p[5], p[2]) for p in productos], usd_price)
+        historial_precios.registrar(c, [(p[0], por_id.get(p[0]), p) for p in productos], "importacion", usd_price)
+    resultado.creados += len(creados)
+    resultado.actualizados += len(cambios)
+    resultado.ids.extend(ids)
+
+
+def importar_productos(path, usd_price, progreso=None, cancelado=None, tamanio_lote=TAMANIO_LOTE):
+    """
+    Importa productos desde un CSV o XLSX.
+    Parámetros:
+        path (str): Archivo a importar.
+        usd_price (float): Cotización para convertir los precios en dólares.
+        progreso (callable): progreso(fracción, filas procesadas) después de cada lote.
+        cancelado (callable): Si devuelve True se deja de importar (los lotes ya escritos quedan).
+    Retorna:
+        ResultadoImportacion
+    """
+    resultado = ResultadoImportacion()
+    lote = {}
+    procesadas = 0
+    fraccion = 0
+    for numero, fila, fraccion in leer_archivo(path):
+        procesadas += 1
+        try:
+            datos = validar_fila(fila)
+        except ValueError as e:
+            resultado.errores.append((numero, str(e)))
+            continue
+        campos = campos_con_valor(fila)
+        clave = clave_nombre(datos[0])
+        if clave in lote:
+            # Nombre repetido en el archivo: vale lo último que trae cada columna y se suman las cantidades
+            _, previos, campos_previos = lote[clave]
+            datos = tuple(nuevo if campo is None or campo in campos else previo
+                          for campo, nuevo, previo in zip(_CAMPOS_OPCIONALES, datos, previos))
+            datos = datos[:4] + (previos[4] + datos[4],) + datos[5:]
+            campos |= campos_previos
+        lote[clave] = (numero, datos, campos)
+        if len(lote) >= tamanio_lote:
+            _aplicar_lote(lote, resultado, usd_price)
+            lote = {}
+            if progreso:
+                progreso(fraccion, procesadas)
+            if cancelado and cancelado():
+                resultado.cancelada = True
+                return resultado
+    if lote:
+        _aplicar_lote(lote, resultado, usd_price)
+        if progreso:
+            progreso(1.0, procesadas)
+    return resultado
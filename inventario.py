@@ -0,0 +1,646 @@
+"""
+Motor de stock: productos, ventas, entradas y movimientos sobre SQLite.
+
+No depende de la interfaz (ni tkinter, ni PIL, ni requests), así lo pueden usar
+tanto la aplicación de escritorio (main.py) como la línea de comandos (cli.py)
+y los benchmarks. Los errores se informan con excepciones; mostrarlos es
+tarea de quien llama.
+"""
+import sqlite3
+from collections import namedtuple
+from array import array
+from datetime import datetime, date
+
+from db import get_conn, transaccion
+from diagnostico import medido
+from migraciones import migrar
+from precios import clave_nombre
+import archivado
+import historial_precios
+import resumenes
+
+def init_db():
+    """Crea la base o la actualiza aplicando las migraciones pendientes."""
+    migrar()
+
+_observadores = []
+
+def al_cambiar_productos(callback):
+    """
+    Registra una función que se llama después de cada modificación de productos.
+    Recibe una lista de cambios (producto_id, antes, despues), donde antes/despues son
+    las tuplas del producto (None si el producto se creó o se eliminó).
+    """
+    _observadores.append(callback)
+
+def _notificar_cambios(cambios):
+    for callback in list(_observadores):
+        callback(cambios)
+
+def _registrar_movimiento(c, producto_id, tipo, cantidad, fecha, precio_unitario):
+    """Inserta un movimiento y lo suma a los resúmenes, en la transacción del cursor c."""
+    c.execute("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) VALUES (?, ?, ?, ?, ?)",
+              (producto_id, tipo, cantidad, fecha, precio_unitario))
+    resumenes.acumular(c, producto_id, tipo, cantidad, fecha, precio_unitario)
+
+def buscar_por_nombres(c, nombres):
+    """
+    Productos cuyo nombre tiene la misma clave (ver precios.clave_nombre) que alguno de nombres.
+    Parámetros:
+        c: Cursor de la transacción en curso.
+    Retorna:
+        dict: clave -> tupla del producto (si dos productos viejos comparten clave, el más viejo).
+    """
+    claves = {clave_nombre(nombre) for nombre in nombres}
+    # Por nombre y por clave: 'Straße' tiene la clave 'strasse', que NOCASE iguala a 'STRASSE'
+    buscados = sorted(claves | set(nombres))
+    c.execute(f"SELECT * FROM productos WHERE nombre COLLATE NOCASE IN ({','.join('?' * len(buscados))})", buscados)
+    filas = c.fetchall()
+    # NOCASE solo iguala mayúsculas ASCII: los nombres guardados con acentos, Ñ o ß se comparan por su clave
+    c.execute("SELECT * FROM productos WHERE nombre GLOB ?", ("*[^\x01-\x7f]*",))
+    filas += c.fetchall()
+    encontrados = {}
+    for p in sorted(filas):
+        clave = clave_nombre(p[1])
+        if clave in claves:
+            encontrados.setdefault(clave, p)
+    return encontrados
+
+def _leer_producto(c, producto_id):
+    c.execute("SELECT * FROM productos WHERE id=?", (producto_id,))
+    return c.fetchone()
+
+@medido()
+def add_producto(nombre, costo_real, costo_comprador, iva, en_dolares, usd_price, cantidad, min_stock):
+    """
+    Agrega un nuevo producto a la base de datos.
+    Parámetros:
+        nombre (str): Nombre del producto.
+        costo_real (float): Precio de compra.
+        costo_comprador (float): Precio de venta.
+        iva (float): Porcentaje de IVA.
+        en_dolares (int): 1 si el precio es en dólares, 0 si es en pesos.
+        usd_price (float): Cotización del dólar con la que se calcularon los precios
+            (se usa para guardar el costo original en dólares).
+        cantidad (int): Stock inicial.
+        min_stock (int): Stock mínimo recomendado.
+    Retorna:
+        int: ID del producto creado.
+    """
+    # El índice único (nombre COLLATE NOCASE) solo iguala mayúsculas ASCII: los nombres que
+    # difieren en una mayúscula acentuada se buscan antes, con el lock de escritura tomado
+    try:
+        with transaccion(inmediata=True) as c:
+            if buscar_por_nombres(c, [nombre]):
+                raise ValueError("Ya existe un producto con ese nombre.")
+            c.execute("INSERT INTO productos (nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock))
+            producto_id = c.lastrowid
+            despues = _leer_producto(c, producto_id)
+            # El stock inicial entra como movimiento, así el stock a una fecha pasada
+            # se puede reconstruir desde los movimientos (ver fotos_stock.py); es de tipo
+            # 'inicial' para que los resúmenes no lo cuenten como una compra
+            if cantidad:
+                _registrar_movimiento(c, producto_id, "inicial", cantidad,
+                                      datetime.now().strftime("%Y-%m-%d %H:%M:%S"), costo_real or 0)
+            historial_precios.guardar_costos(c, [(producto_id, en_dolares, costo_real)], usd_price)
+            historial_precios.registrar(c, [(producto_id, None, despues)], "alta", usd_price)
+    except sqlite3.IntegrityError:
+        raise ValueError("Ya existe un producto con ese nombre.")
+    _notificar_cambios([(producto_id, None, despues)])
+    return producto_id
+
+@medido()
+def get_productos():
+    """
+    Devuelve una lista de todos los productos en la base de datos.
+    Retorna:
+        list: Lista de tuplas con los datos de cada producto.
+    """
+    return get_conn().execute("SELECT * FROM productos").fetchall()
+
+@medido()
+def buscar_producto(texto):
+    """
+    Busca un producto por ID (si texto es un número) o por nombre exacto, sin distinguir mayúsculas.
+    Retorna:
+        tuple: El producto, o None si no existe.
+    """
+    texto = str(texto).strip()
+    conn = get_conn()
+    if texto.isdigit():
+        p = conn.execute("SELECT * FROM productos WHERE id=?", (int(texto),)).fetchone()
+        if p:
+            return p
+    return conn.execute("SELECT * FROM productos WHERE nombre = ? COLLATE NOCASE", (texto,)).fetchone()
+
+def _patron_like(texto):
+    return "%" + texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _hay_indice_busqueda(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'productos_busqueda'").fetchone() is not None
+
+@medido()
+def buscar_productos(texto, limite=20):
+    """
+    Búsqueda mientras se escribe: productos cuyo nombre contiene todas las palabras de texto.
+    Primero van el producto con ese ID (si texto es un número) y los nombres que empiezan
+    con texto (índice por nombre); después, los que lo contienen en cualquier parte
+    (índice de trigramas productos_busqueda). Nunca se lee más de limite filas por paso.
+    Retorna:
+        list: Hasta limite tuplas de productos.
+    """
+    texto = " ".join(str(texto).split())
+    conn = get_conn()
+    if not texto:
+        return conn.execute("SELECT * FROM productos ORDER BY nombre COLLATE NOCASE LIMIT ?", (limite,)).fetchall()
+    encontrados = {}
+    if texto.isdigit():
+        p = conn.execute("SELECT * FROM productos WHERE id=?", (int(texto),)).fetchone()
+        if p:
+            encontrados[p[0]] = p
+    # Nombres que empiezan con el texto: rango sobre el índice único por nombre (NOCASE)
+    for p in conn.execute("SELECT * FROM productos WHERE nombre >= ? COLLATE NOCASE AND nombre < ? COLLATE NOCASE "
+                          "ORDER BY nombre COLLATE NOCASE LIMIT ?", (texto, texto + "\U0010ffff", limite)):
+        encontrados.setdefault(p[0], p)
+    faltan = limite - len(encontrados)
+    if faltan <= 0:
+        return list(encontrados.values())[:limite]
+    # Nombres que contienen cada palabra en cualquier parte
+    palabras = texto.split()
+    largas = [palabra for palabra in palabras if len(palabra) >= 3]
+    cortas = [palabra for palabra in palabras if len(palabra) < 3]
+    filtro = "".join(" AND p.nombre LIKE ? ESCAPE '\\'" for _ in cortas)
+    params = [_patron_like(palabra) for palabra in cortas]
+    if largas and _hay_indice_busqueda(conn):
+        # Los trigramas necesitan al menos 3 letras; las palabras más cortas se filtran con LIKE
+        consulta = " AND ".join('"' + palabra.replace('"', '""') + '"' for palabra in largas)
+        sql = (f"SELECT p.* FROM productos_busqueda b JOIN productos p ON p.id = b.rowid "
+               f"WHERE productos_busqueda MATCH ?{filtro} LIMIT ?")
+        params = [consulta] + params
+    else:
+        filtro = "".join(" AND p.nombre LIKE ? ESCAPE '\\'" for _ in largas) + filtro
+        params = [_patron_like(palabra) for palabra in largas] + params
+        sql = f"SELECT * FROM productos p WHERE 1=1{filtro} LIMIT ?"
+    for p in conn.execute(sql, params + [faltan + len(encontrados)]):
+        encontrados.setdefault(p[0], p)
+        if len(encontrados) >= limite:
+            break
+    return list(encontrados.values())
+
+@medido()
+def get_ids_productos():
+    """
+    Devuelve los IDs de todos los productos, ordenados.
+    Es lo único que se carga completo para la tabla virtual (8 bytes por producto).
+    """
+    return array("q", (row[0] for row in get_conn().execute("SELECT id FROM productos ORDER BY id")))
+
+@medido()
+def get_pagina_productos(desde_id, limite):
+    """
+    Devuelve una página de productos usando paginación por clave (id >= desde_id).
+    Parámetros:
+        desde_id (int): Primer ID de la página.
+        limite (int): Cantidad máxima de filas.
+    Retorna:
+        list: Tuplas con el mismo formato que get_productos().
+    """
+    return get_conn().execute("SELECT * FROM productos WHERE id >= ? ORDER BY id LIMIT ?",
+                              (desde_id, limite)).fetchall()
+
+@medido()
+def get_costo_usd(producto_id):
+    """Costo en dólares de un producto en dólares, o None si no se conoce (ver historial_precios)."""
+    return historial_precios.get_costo_usd(producto_id)
+
+@medido()
+def get_productos_por_id(ids):
+    """Devuelve los productos con esos IDs (los que existan), en cualquier orden."""
+    return list(_leer_productos(get_conn().cursor(), ids).values()) if ids else []
+
+# Registro de producto: se indexa como la tupla de siempre (p[0]...p[7]) o por nombre de campo
+Producto = namedtuple("Producto", ["id", "nombre", "costo_real", "costo_comprador", "iva",
+                                   "en_dolares", "cantidad", "min_stock"])
+
+class CacheProductos:
+    """
+    Mapa de identidad de productos por ID (un único registro Producto por producto).
+    Las escrituras van siempre a SQLite por las funciones de este módulo; la caché
+    se actualiza con los cambios que ellas notifican (aplicar), así nunca queda
+    una versión vieja y no hace falta releer la tabla. Lo que no está en memoria
+    se lee por clave primaria la primera vez que se pide.
+    Parámetros:
+        leer (callable): leer(ids) -> filas; get_productos_por_id por defecto.
+    """
+    def __init__(self, leer=None):
+        self.leer = leer or get_productos_por_id
+        self._productos = {}
+
+    def __len__(self):
+        return len(self._productos)
+
+    def __contains__(self, producto_id):
+        return producto_id in self._productos
+
+    def get(self, producto_id):
+        """Producto con ese ID, o None si no existe."""
+        p = self._productos.get(producto_id)
+        if p is None:
+            p = self.obtener([producto_id]).get(producto_id)
+        return p
+
+    def obtener(self, ids):
+        """
+        Retorna:
+            dict: ID -> Producto, solo con los que existen. Lee de la base en una consulta los que falten.
+        """
+        encontrados = {i: self._productos[i] for i in ids if i in self._productos}
+        faltan = [i for i in ids if i not in encontrados]
+        if faltan:
+            for fila in self.leer(faltan):
+                encontrados[fila[0]] = self._productos[fila[0]] = Producto._make(fila)
+        return encontrados
+
+    def cargar(self, filas):
+        """Guarda filas recién leídas de la base (p. ej. una página de la tabla)."""
+        for fila in filas:
+            self._productos[fila[0]] = Producto._make(fila)
+
+    def aplicar(self, cambios):
+        """Aplica cambios (producto_id, antes, despues) como los que recibe al_cambiar_productos."""
+        for producto_id, _, despues in cambios:
+            if despues is None:
+                self._productos.pop(producto_id, None)
+            else:
+                self._productos[producto_id] = Producto._make(despues)
+
+    def invalidar(self, producto_id=None):
+        """Olvida un producto (o todos): se vuelve a leer la próxima vez que se pida."""
+        if producto_id is None:
+            self._productos.clear()
+        else:
+            self._productos.pop(producto_id, None)
+
+class StockInsuficiente(ValueError):
+    """
+    Una venta no se pudo registrar porque falta stock.
+    faltantes: lista de (producto_id, nombre, disponible, pedido); nombre es None si el producto no existe.
+    """
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        detalle = ", ".join(f"{nombre or f'ID {pid}'} (hay {disponible}, se piden {pedido})"
+                            for pid, nombre, disponible, pedido in faltantes)
+        super().__init__(f"Stock insuficiente: {detalle}")
+
+def _leer_productos(c, ids):
+    marcas = ",".join("?" * len(ids))
+    c.execute(f"SELECT * FROM productos WHERE id IN ({marcas})", list(ids))
+    return {p[0]: p for p in c.fetchall()}
+
+@medido()
+def registrar_venta(lineas):
+    """
+    Registra una venta de varios productos en una sola transacción.
+    O se descuentan todas las líneas o ninguna.
+    Parámetros:
+        lineas (list): Tuplas (producto_id, cantidad). Un producto repetido se suma.
+    Retorna:
+        float: Total de la venta (a precio de venta).
+    Lanza StockInsuficiente si alguna línea no tiene stock (o el producto no existe).
+    """
+    pedidos = {}
+    for producto_id, cantidad in lineas:
+        if cantidad <= 0:
+            raise ValueError("Cantidad inválida")
+        pedidos[producto_id] = pedidos.get(producto_id, 0) + cantidad
+    if not pedidos:
+        raise ValueError("La venta no tiene productos")
+    fecha_local = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaccion(inmediata=True) as c:
+        antes = _leer_productos(c, pedidos)
+        # El UPDATE condicional solo descuenta si alcanza; si alguna fila no se tocó, se deshace todo
+        c.executemany("UPDATE productos SET cantidad = cantidad - ? WHERE id = ? AND cantidad >= ?",
+                      [(cantidad, producto_id, cantidad) for producto_id, cantidad in pedidos.items()])
+        if c.rowcount != len(pedidos):
+            faltantes = [(producto_id, antes[producto_id][1] if producto_id in antes else None,
+                          antes[producto_id][6] if producto_id in antes else 0, cantidad)
+                         for producto_id, cantidad in pedidos.items()
+                         if producto_id not in antes or antes[producto_id][6] < cantidad]
+            raise StockInsuficiente(faltantes)
+        movimientos = [(producto_id, "salida", cantidad, fecha_local, antes[producto_id][3] or 0)
+                       for producto_id, cantidad in pedidos.items()]
+        c.executemany("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) VALUES (?, ?, ?, ?, ?)",
+                      movimientos)
+        resumenes.acumular_lote(c, movimientos)
+        despues = _leer_productos(c, pedidos)
+    _notificar_cambios([(producto_id, antes[producto_id], despues[producto_id]) for producto_id in pedidos])
+    return sum(cantidad * precio for _, _, cantidad, _, precio in movimientos)
+
+@medido()
+def descontar_stock(producto_id, cantidad):
+    """
+    Descuenta la cantidad indicada del producto dado.
+    Registra el movimiento como 'salida' en la tabla de movimientos.
+    Devuelve True si la operación fue exitosa, False si no hay suficiente stock.
+    """
+    try:
+        registrar_venta([(producto_id, cantidad)])
+    except StockInsuficiente:
+        return False
+    return True
+
+@medido()
+def ingresar_stock(producto_id, cantidad):
+    """
+    Suma la cantidad indicada al stock del producto.
+    Registra el movimiento como 'entrada' al precio de compra actual.
+    Devuelve True si el producto existe, False si no.
+    """
+    with transaccion() as c:
+        antes = _leer_producto(c, producto_id)
+        if not antes:
+            return False
+        c.execute("UPDATE productos SET cantidad = cantidad + ? WHERE id=?", (cantidad, producto_id))
+        # Registra movimiento
+        fecha_local = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        _registrar_movimiento(c, producto_id, "entrada", cantidad, fecha_local, antes[2] or 0)
+        despues = _leer_producto(c, producto_id)
+    _notificar_cambios([(producto_id, antes, despues)])
+    return True
+
+@medido()
+def modificar_precios(producto_id, costo_real, costo_comprador, usd_price=None):
+    """
+    Actualiza el precio de compra y de venta (en pesos) de un producto.
+    Parámetros:
+        producto_id (int): ID del producto.
+        costo_real (float): Nuevo precio de compra.
+        costo_comprador (float): Nuevo precio de venta.
+        usd_price (float): Cotización usada si el producto está en dólares. Sin ella
+            no se conoce su costo en dólares y repreciar_dolares() no lo modifica.
+    """
+    with transaccion() as c:
+        antes = _leer_producto(c, producto_id)
+        c.execute("UPDATE productos SET costo_real=?, costo_comprador=? WHERE id=?", (costo_real, costo_comprador, producto_id))
+        despues = _leer_producto(c, producto_id)
+        if antes:
+            historial_precios.guardar_costos(c, [(producto_id, despues[5], costo_real)], usd_price)
+            historial_precios.registrar(c, [(producto_id, antes, despues)], "manual", usd_price)
+    if antes:
+        _notificar_cambios([(producto_id, antes, despues)])
+
+@medido()
+def repreciar_dolares(usd_price):
+    """
+    Recalcula los precios en pesos de todos los productos en dólares con la cotización
+    usd_price, a partir de su costo en dólares, en una sola transacción (INSERT ... SELECT
+    al historial y un UPDATE de conjunto; ver historial_precios.repreciar).
+    Parámetros:
+        usd_price (float): Cotización del dólar.
+    Retorna:
+        int: Cantidad de productos cuyo precio cambió.
+    """
+    if not usd_price or usd_price <= 0:
+        raise ValueError("No hay cotización del dólar disponible. Intente actualizarla.")
+    with transaccion(inmediata=True) as c:
+        desde = historial_precios.repreciar(c, usd_price)
+        # CROSS JOIN: recorre solo las filas nuevas del historial y busca cada producto por clave
+        c.execute("SELECT h.costo_real_anterior, h.costo_comprador_anterior, p.* "
+                  "FROM historial_precios h CROSS JOIN productos p ON p.id = h.producto_id "
+                  "WHERE h.id > ?", (desde,))
+        # antes: la fila nueva con los precios anteriores que quedaron en el historial
+        cambios = [(fila[2], fila[2:4] + fila[:2] + fila[6:], fila[2:]) for fila in c.fetchall()]
+    if cambios:
+        _notificar_cambios(cambios)
+    return len(cambios)
+
+@medido()
+def eliminar_producto(producto_id, nombre):
+    """
+    Elimina un producto de la base de datos y lo registra en el historial de eliminados.
+    Parámetros:
+        producto_id (int): ID del producto a eliminar.
+        nombre (str): Nombre del producto.
+    """
+    with transaccion() as c:
+        antes = _leer_producto(c, producto_id)
+        # Guarda en historial, con el stock y los precios que tenía
+        if antes:
+            c.execute("INSERT INTO eliminados (nombre, producto_id, cantidad, costo_real, costo_comprador) "
+                      "VALUES (?, ?, ?, ?, ?)", (nombre, producto_id, antes[6], antes[2], antes[3]))
+        else:
+            c.execute("INSERT INTO eliminados (nombre) VALUES (?)", (nombre,))
+        # Elimina de productos
+        c.execute("DELETE FROM productos WHERE id=?", (producto_id,))
+        c.execute("DELETE FROM costos_dolares WHERE producto_id=?", (producto_id,))
+    if antes:
+        _notificar_cambios([(producto_id, antes, None)])
+
+def rango_mes(dia=None):
+    """Devuelve (desde, hasta) del mes de dia (hoy por defecto) como texto 'YYYY-MM-DD'; hasta es exclusivo."""
+    dia = dia or date.today()
+    desde = dia.replace(day=1)
+    hasta = desde.replace(year=desde.year + 1, month=1) if desde.month == 12 else desde.replace(month=desde.month + 1)
+    return desde.isoformat(), hasta.isoformat()
+
+def rango_anio(dia=None):
+    """Devuelve (desde, hasta) del año de dia (hoy por defecto); hasta es exclusivo."""
+    dia = dia or date.today()
+    return date(dia.year, 1, 1).isoformat(), date(dia.year + 1, 1, 1).isoformat()
+
+def _tramos_movimientos(desde, hasta):
+    """
+    Tramos de [desde, hasta) con la tabla de movimientos que los guarda (la principal o la
+    del archivo de su año, ver archivado.py), del más nuevo al más viejo. Cada archivo se
+    adjunta recién al llegar a su tramo, así un rango de muchos años no supera el límite
+    de bases adjuntas.
+    Retorna:
+        generator: Tuplas (desde, hasta, tabla).
+    """
+    for tramo_desde, tramo_hasta, anio in archivado.tramos(desde, hasta):
+        yield tramo_desde, tramo_hasta, "movimientos" if anio is None else archivado.tabla_movimientos(anio)
+
+def _filtro_movimientos(desde, hasta, producto_id=None, tipo=None):
+    sql = " WHERE m.fecha >= ? AND m.fecha < ?"
+    params = [desde, hasta]
+    if producto_id is not None:
+        sql += " AND m.producto_id = ?"
+        params.append(producto_id)
+    if tipo:
+        sql += " AND m.tipo = ?"
+        params.append(tipo)
+    return sql, params
+
+@medido()
+def get_pagina_movimientos(desde, hasta, producto_id=None, tipo=None, despues_de=None, limite=500):
+    """
+    Devuelve una página de movimientos en [desde, hasta), del más nuevo al más viejo,
+    usando paginación por clave sobre (fecha, id). Si el rango abarca años archivados,
+    la página sigue en el archivo del año cuando se terminan los del tramo anterior.
+    Parámetros:
+        producto_id (int): Solo movimientos de ese producto (opcional).
+        tipo (str): 'entrada', 'salida' o 'inicial' (opcional).
+        despues_de (tuple): (fecha, id) del último movimiento de la página anterior.
+        limite (int): Tamaño de la página.
+    Retorna:
+        list: Tuplas (id, nombre, tipo, cantidad, fecha, precio_unitario).
+    """
+    pagina = []
+    for tramo_desde, tramo_hasta, tabla in _tramos_movimientos(desde, hasta):
+        if despues_de is not None and tramo_desde > despues_de[0]:
+            continue  # tramo ya recorrido en páginas anteriores
+        filtro, params = _filtro_movimientos(tramo_desde, tramo_hasta, producto_id, tipo)
+        if despues_de is not None:
+            filtro += " AND (m.fecha < ? OR (m.fecha = ? AND m.id < ?))"
+            params += [despues_de[0], despues_de[0], despues_de[1]]
+        pagina += get_conn().execute(f"""
+            SELECT m.id, p.nombre, m.tipo, m.cantidad, m.fecha, m.precio_unitario
+            FROM {tabla} m
+            JOIN productos p ON m.producto_id = p.id
+            {filtro}
+            ORDER BY m.fecha DESC, m.id DESC
+            LIMIT ?
+        """, params + [limite - len(pagina)]).fetchall()
+        if len(pagina) >= limite:
+            break
+    return pagina
+
+@medido()
+def contar_movimientos(desde, hasta, producto_id=None, tipo=None):
+    """Cantidad de movimientos que devolvería get_pagina_movimientos con los mismos filtros."""
+    total = 0
+    for tramo_desde, tramo_hasta, tabla in _tramos_movimientos(desde, hasta):
+        filtro, params = _filtro_movimientos(tramo_desde, tramo_hasta, producto_id, tipo)
+        total += get_conn().execute(f"""
+            SELECT COUNT(*) FROM {tabla} m
+            JOIN productos p ON m.producto_id = p.id
+            {filtro}
+        """, params).fetchone()[0]
+    return total
+
+@medido()
+def calcular_iva_total():
+    """
+    Calcula el IVA total acumulado de todos los productos.
+    Retorna:
+        float: Suma total del IVA de todos los productos.
+    """
+    # costo_comprador * iva / 100 sumado en una sola consulta
+    return get_conn().execute("SELECT COALESCE(SUM(costo_comprador * iva / 100.0), 0) FROM productos").fetchone()[0]
+
+@medido()
+def contar_stock_bajo():
+    """Devuelve la cantidad de productos con stock por debajo del mínimo."""
+    return get_conn().execute("SELECT COUNT(*) FROM productos WHERE cantidad < min_stock").fetchone()[0]
+
+@medido()
+def get_stock_bajo():
+    """
+    Productos con stock por debajo del mínimo, ordenados por nombre.
+    Lee el índice parcial idx_productos_stock_bajo (solo tiene esos productos), así el
+    costo depende de cuántos productos están en falta y no del tamaño del catálogo.
+    Retorna:
+        list: Tuplas de productos, como get_productos().
+    """
+    # La condición tiene que ser la misma del índice parcial para que SQLite lo use
+    return get_conn().execute(
+        "SELECT * FROM productos WHERE cantidad < min_stock ORDER BY nombre COLLATE NOCASE").fetchall()
+
+def cantidad_a_pedir(p):
+    """Unidades que faltan para llegar al stock mínimo del producto (0 si no falta nada)."""
+    return max(p[7] - p[6], 0) if es_stock_bajo(p) else 0
+
+def filas_lista_pedido(productos):
+    """
+    Arma la lista de pedido a partir de productos con stock bajo (ver get_stock_bajo).
+    Retorna:
+        list: Filas (nombre, stock, mínimo, a pedir, precio de compra, subtotal).
+    """
+    filas = []
+    for p in productos:
+        pedir = cantidad_a_pedir(p)
+        filas.append((p[1], p[6], p[7], pedir, p[2] or 0, round(pedir * (p[2] or 0), 2)))
+    return filas
+
+COLUMNAS_LISTA_PEDIDO = ("Nombre", "Stock", "Mínimo", "A pedir", "Precio de Compra", "Subtotal")
+
+def iva_producto(p):
+    """IVA de un producto (costo_comprador * iva / 100); 0 si no hay producto o precio."""
+    if not p or not p[3] or not p[4]:
+        return 0
+    return p[3] * (p[4] / 100)
+
+def formatear_producto(p, usd_price):
+    """
+    Arma los valores de una fila de la tabla principal a partir de la tupla de get_productos().
+    Parámetros:
+        p (tuple): (id, nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock).
+        usd_price (float): Cotización usada para mostrar el monto en dólares.
+    Retorna:
+        tuple: Valores de las columnas de la tabla.
+    """
+    precio_compra = p[2]
+    precio_venta = p[3]
+    en_dolares = p[5]
+    if not precio_compra or not precio_venta:
+        precio_compra_str = "Se necesita actualización de precio"
+        precio_venta_str = "Se necesita actualización de precio"
+        en_dolares_str = "Sí" if en_dolares else "No"
+    elif en_dolares and not usd_price:
+        # Sin ninguna cotización conocida no se puede mostrar el monto en dólares
+        precio_compra_str = f"${precio_compra:.2f} (USD sin cotización)"
+        precio_venta_str = f"${precio_venta:.2f} (USD sin cotización)"
+        en_dolares_str = "Sí"
+    elif en_dolares:
+        precio_compra_dol = precio_compra / usd_price
+        precio_venta_dol = precio_venta / usd_price
+        precio_compra_str = f"${precio_compra:.2f} ({precio_compra_dol:.2f} USD)"
+        precio_venta_str = f"${precio_venta:.2f} ({precio_venta_dol:.2f} USD)"
+        en_dolares_str = "Sí"
+    else:
+        precio_compra_str = f"${precio_compra:.2f}"
+        precio_venta_str = f"${precio_venta:.2f}"
+        en_dolares_str = "No"
+    stock_str = str(p[6])
+    if es_stock_bajo(p):
+        stock_str = f"{p[6]} ⚠️ (MINIMO STOCK EN FALTA!!!)"
+    return (p[1], precio_compra_str, precio_venta_str, f"{p[4]}%", en_dolares_str, stock_str)
+
+def es_stock_bajo(p):
+    """Devuelve True si la cantidad del producto está por debajo de su stock mínimo."""
+    return p is not None and len(p) > 7 and p[7] is not None and p[6] < p[7]
+
+@medido()
+def obtener_precio_producto(producto_id):
+    row = get_conn().execute("SELECT costo_comprador FROM productos WHERE id=?", (producto_id,)).fetchone()
+    return row[0] if row else 0
+
+@medido()
+def obtener_precio_producto_tipo(producto_id, tipo):
+    """
+    Devuelve el precio unitario del producto según el tipo de movimiento.
+    Parámetros:
+        producto_id (int): ID del producto.
+        tipo (str): 'entrada' para precio de compra, 'salida' para precio de venta.
+    Retorna:
+        float: Precio unitario correspondiente.
+    """
+    conn = get_conn()
+    if tipo == "entrada":
+        row = conn.execute("SELECT costo_real FROM productos WHERE id=?", (producto_id,)).fetchone()
+    else:  # salida
+        row = conn.execute("SELECT costo_comprador FROM productos WHERE id=?", (producto_id,)).fetchone()
+    return row[0] if row else 0
+
+@medido()
+def obtener_precio_compra(producto_id):
+    """Devuelve el precio de compra (costo_real) del producto por su ID."""
+    row = get_conn().execute("SELECT costo_real FROM productos WHERE id=?", (producto_id,)).fetchone()
+    return row[0] if row else None
+
+@medido()
+def obtener_precio_venta(producto_id):
+    """Devuelve el precio de venta (costo_comprador) del producto por su ID."""
+    row = get_conn().execute("SELECT costo_comprador FROM productos WHERE id=?", (producto_id,)).fetchone()
+    return row[0] if row else None
@@ -1,183 +1,128 @@
+import time
+_INICIO = time.perf_counter()  # para medir el tiempo de arranque
+
+import sys
+import diagnostico
+if "--medir-arranque" in sys.argv:
+    diagnostico.medir_importaciones()
+
+# requests, PIL, reportlab, shutil, tempfile, subprocess y el cliente HTTP se importan
+# recién cuando se usan: no hacen falta para mostrar la ventana
 import tkinter as tk
-from tkinter import ttk, messagebox
-import sqlite3
-import requests
+from tkinter import ttk
+from tkinter import messagebox as _messagebox
 import tkinter.font as tkFont
-from PIL import Image, ImageTk
 import threading
-import time
-import sys
-import shutil
-import tempfile
-import subprocess
+import queue
 import os
-from datetime import datetime
+import sqlite3
+from array import array
+from bisect import bisect_left
+from datetime import date, timedelta
+from functools import lru_cache
+import db
+import inventario
+from inventario import (
+    init_db, al_cambiar_productos, add_producto, get_ids_productos, get_pagina_productos, buscar_productos,
+    get_productos_por_id, get_costo_usd, CacheProductos, registrar_venta, ingresar_stock, modificar_precios,
+    repreciar_dolares, eliminar_producto, rango_mes, rango_anio, get_pagina_movimientos,
+    contar_movimientos, calcular_iva_total, get_stock_bajo, iva_producto, formatear_producto,
+    es_stock_bajo, cantidad_a_pedir, filas_lista_pedido, COLUMNAS_LISTA_PEDIDO,
+)
+from cotizacion import CacheCotizacion, consultar_bluelytics
+from resumenes import totales_periodo
+from precios import calcular_precios, validar_producto
+from importacion import importar_productos
+from escritor import EscritorLotes
+import reporte_pdf
+
+# Los diálogos esperan al usuario: ese tiempo no se cuenta en los tiempos de diagnóstico
+messagebox = diagnostico.SinMedir(_messagebox)
 
 __version__ = "1.1.2"  # Cambia esto en cada release
 
 URL_VERSION = "https://raw.githubusercontent.com/Fabrischulz/Control-Stock/main/version.txt"
 URL_EXE = "https://github.com/Fabrischulz/Control-Stock/releases/latest/download/StockFarm.exe"
 
-DB_NAME = "stock.db"
+# Tiempos máximos de espera de red (segundos)
+TIMEOUT_USD = 5
+TIMEOUT_VERSION = 5
+TIMEOUT_DESCARGA = 30
 
-def get_usd_price():
+def get_usd_price(timeout=TIMEOUT_USD):
+    """Consulta la cotización directamente a Bluelytics (sin caché). Devuelve 0 si falla."""
     try:
-        # Consulta a la API pública de Bluelytics
-        response = requests.get("https://api.bluelytics.com.ar/v2/latest")
-        data = response.json()
-        # Usar el valor de venta oficial (Banco Nación)
-        return data["oficial"]["value_sell"]
+        return consultar_bluelytics(timeout)
     except Exception:
         return 0
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS productos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nombre TEXT,
-        costo_real REAL,
-        costo_comprador REAL,
-        iva REAL,
-        en_dolares INTEGER,
-        cantidad INTEGER DEFAULT 0,
-        min_stock INTEGER DEFAULT 1
-    )''')
-    # Tabla para historial de eliminados
-    c.execute('''CREATE TABLE IF NOT EXISTS eliminados (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nombre TEXT,
-        fecha_eliminado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-    try:
-        c.execute("ALTER TABLE productos ADD COLUMN min_stock INTEGER DEFAULT 1")
-    except sqlite3.OperationalError:
-        pass
-    c.execute('''CREATE TABLE IF NOT EXISTS movimientos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        producto_id INTEGER,
-        tipo TEXT, -- 'entrada' o 'salida'
-        cantidad INTEGER,
-        fecha TEXT,
-        precio_unitario REAL,
-        FOREIGN KEY(producto_id) REFERENCES productos(id)
-    )''')
-    conn.commit()
-    conn.close()
-
-def add_producto(nombre, costo_real, costo_comprador, iva, en_dolares, usd_price, cantidad, min_stock):
+# Funciones de datos que en modo caja se piden al servidor en vez de a la base local
+FUNCIONES_REMOTAS = (
+    "al_cambiar_productos", "add_producto", "get_ids_productos", "get_pagina_productos", "buscar_productos",
+    "get_productos_por_id", "get_costo_usd", "registrar_venta", "ingresar_stock", "modificar_precios",
+    "repreciar_dolares", "eliminar_producto",
+    "get_pagina_movimientos", "contar_movimientos", "calcular_iva_total", "get_stock_bajo",
+    "totales_periodo",
+)
+cliente = None  # ClienteStock en modo caja (--servidor URL)
+
+def usar_servidor(url):
     """
-    Agrega un nuevo producto a la base de datos.
-    Parámetros:
-        nombre (str): Nombre del producto.
-        costo_real (float): Precio de compra.
-        costo_comprador (float): Precio de venta.
-        iva (float): Porcentaje de IVA.
-        en_dolares (int): 1 si el precio es en dólares, 0 si es en pesos.
-        usd_price (float): Cotización del dólar al momento.
-        cantidad (int): Stock inicial.
-        min_stock (int): Stock mínimo recomendado.
+    Pasa la aplicación a modo caja: los productos, ventas y movimientos se leen y
+    escriben en el servidor (ver servidor.py) en vez de en la base local.
+    La base local solo guarda la cotización del dólar.
     """
-    productos_existentes = [p[1].lower() for p in get_productos()]
-    if nombre.lower() in productos_existentes:
-        raise ValueError("Ya existe un producto con ese nombre.")
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO productos (nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock) VALUES (?, ?, ?, ?, ?, ?, ?)",
-              (nombre, costo_real, costo_comprador, iva, en_dolares, cantidad, min_stock))
-    conn.commit()
-    conn.close()
+    global cliente, inventario
+    from cliente import ClienteStock
+    cliente = ClienteStock(url)
+    for nombre in FUNCIONES_REMOTAS:
+        funcion = getattr(cliente, nombre)
+        globals()[nombre] = funcion if nombre == "al_cambiar_productos" else diagnostico.medido(f"cliente.{nombre}")(funcion)
+    inventario = cliente
+    return cliente
 
 def get_productos():
     """
     Devuelve una lista de todos los productos en la base de datos.
-    Retorna:
-        list: Lista de tuplas con los datos de cada producto.
+    Si la base no se puede leer, lo informa con un mensaje y devuelve una lista vacía.
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute("SELECT * FROM productos")
-        productos = c.fetchall()
-        conn.close()
-        return productos
+        return inventario.get_productos()
     except Exception as e:
         messagebox.showerror("Error de base de datos", f"No se pudo acceder a la base de datos:\n{e}")
         return []
 
-def descontar_stock(producto_id, cantidad):
-    """
-    Descuenta la cantidad indicada del producto dado.
-    Registra el movimiento como 'salida' en la tabla de movimientos.
-    Devuelve True si la operación fue exitosa, False si no hay suficiente stock.
-    """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT cantidad FROM productos WHERE id=?", (producto_id,))
-    actual = c.fetchone()
-    if actual and actual[0] >= cantidad:
-        c.execute("UPDATE productos SET cantidad = cantidad - ? WHERE id=?", (cantidad, producto_id))
-        # Registra movimiento de salida con fecha y hora local
-        fecha_local = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) VALUES (?, 'salida', ?, ?, ?)",
-                  (producto_id, cantidad, fecha_local, obtener_precio_producto_tipo(producto_id, "salida")))
-        conn.commit()
-        conn.close()
-        return True
-    conn.close()
-    return False
-
-def eliminar_producto(producto_id, nombre):
-    """
-    Elimina un producto de la base de datos y lo registra en el historial de eliminados.
-    Parámetros:
-        producto_id (int): ID del producto a eliminar.
-        nombre (str): Nombre del producto.
-    """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Guarda en historial
-    c.execute("INSERT INTO eliminados (nombre) VALUES (?)", (nombre,))
-    # Elimina de productos
-    c.execute("DELETE FROM productos WHERE id=?", (producto_id,))
-    conn.commit()
-    conn.close()
-
-def calcular_iva_total():
-    """
-    Calcula el IVA total acumulado de todos los productos.
-    Retorna:
-        float: Suma total del IVA de todos los productos.
-    """
-    productos = get_productos()
-    total_iva = 0
-    for p in productos:
-        # p[3] es costo_comprador, p[4] es iva
-        total_iva += p[3] * (p[4] / 100)
-    return total_iva
-
-def obtener_version_remota():
+def obtener_version_remota(timeout=TIMEOUT_VERSION):
+    """Devuelve la versión publicada, o None si no se pudo consultar (sin internet)."""
     try:
-        resp = requests.get(URL_VERSION, timeout=5)
+        import requests
+        resp = requests.get(URL_VERSION, timeout=timeout)
         if resp.status_code == 200:
             return resp.text.strip()
-    except Exception as e:
-        messagebox.showwarning("Sin conexión", "No se pudo chequear la actualización automática (sin internet).")
+    except Exception:
+        pass
     return None
 
-def descargar_y_reemplazar():
-    try:
-        exe_actual = sys.executable
-        temp_dir = tempfile.mkdtemp()
-        exe_nuevo = os.path.join(temp_dir, "StockFarm_nuevo.exe")
-        # Descargar el nuevo exe
-        resp = requests.get(URL_EXE, stream=True, timeout=30)
-        with open(exe_nuevo, "wb") as f:
-            shutil.copyfileobj(resp.raw, f)
-        # Crear un script .bat para reemplazar el exe después de cerrar la app
-        bat_path = os.path.join(temp_dir, "update.bat")
-        with open(bat_path, "w") as bat:
-            bat.write(f"""
+def descargar_actualizacion():
+    """Descarga el nuevo ejecutable a una carpeta temporal y devuelve su ruta."""
+    import requests
+    import shutil
+    import tempfile
+    temp_dir = tempfile.mkdtemp()
+    exe_nuevo = os.path.join(temp_dir, "StockFarm_nuevo.exe")
+    resp = requests.get(URL_EXE, stream=True, timeout=TIMEOUT_DESCARGA)
+    with open(exe_nuevo, "wb") as f:
+        shutil.copyfileobj(resp.raw, f)
+    return exe_nuevo
+
+def instalar_actualizacion(exe_nuevo):
+    """Reemplaza el exe actual por exe_nuevo cuando la app se cierra, la reinicia y sale."""
+    exe_actual = sys.executable
+    temp_dir = os.path.dirname(exe_nuevo)
+    # Crear un script .bat para reemplazar el exe después de cerrar la app
+    bat_path = os.path.join(temp_dir, "update.bat")
+    with open(bat_path, "w") as bat:
+        bat.write(f"""
 @echo off
 ping 127.0.0.1 -n 2 > nul
 :loop
@@ -189,67 +134,446 @@ if not errorlevel 1 (
 move /Y "{exe_nuevo}" "{exe_actual}"
 start "" "{exe_actual}"
 """)
-        # Ejecutar el .bat y salir
-        subprocess.Popen(['cmd', '/c', 'start', '', bat_path], shell=True)
-        sys.exit()
-    except Exception as e:
-        messagebox.showerror("Falló la actualización", str(e))
-
-def chequear_actualizacion():
-    version_remota = obtener_version_remota()
-    if version_remota and version_remota != __version__:
-        descargar_y_reemplazar()
-
-def obtener_precio_producto(producto_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT costo_comprador FROM productos WHERE id=?", (producto_id,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else 0
-
-def obtener_precio_producto_tipo(producto_id, tipo):
+    # Ejecutar el .bat y salir
+    import subprocess
+    subprocess.Popen(['cmd', '/c', 'start', '', bat_path], shell=True)
+    sys.exit()
+
+def en_segundo_plano(root, tarea, al_terminar=None, intervalo_ms=50):
     """
-    Devuelve el precio unitario del producto según el tipo de movimiento.
-    Parámetros:
-        producto_id (int): ID del producto.
-        tipo (str): 'entrada' para precio de compra, 'salida' para precio de venta.
-    Retorna:
-        float: Precio unitario correspondiente.
+    Ejecuta tarea() en un hilo aparte y entrega el resultado en el hilo de Tk.
+    al_terminar(resultado, error) se llama desde root.after, así puede tocar la interfaz.
+    """
+    resultado = queue.Queue(maxsize=1)
+
+    def trabajar():
+        try:
+            resultado.put((tarea(), None))
+        except Exception as e:
+            resultado.put((None, e))
+        finally:
+            db.cerrar_conexion()  # la conexión de este hilo no se vuelve a usar
+
+    def revisar():
+        try:
+            valor, error = resultado.get_nowait()
+        except queue.Empty:
+            root.after(intervalo_ms, revisar)
+            return
+        if al_terminar:
+            al_terminar(valor, error)
+
+    threading.Thread(target=trabajar, daemon=True).start()
+    root.after(intervalo_ms, revisar)
+
+def mensaje_error_escritura(error):
+    """Texto para mostrar el error de una escritura (ver StockApp.escribir)."""
+    if isinstance(error, ValueError):  # incluye StockInsuficiente
+        return str(error)  # datos inválidos: el mensaje ya es para el usuario
+    if isinstance(error, sqlite3.OperationalError):
+        return f"No se pudo guardar en la base de datos (¿está ocupada o el disco lleno?):\n{error}"
+    return f"No se pudo guardar: {error}"
+
+def chequear_actualizacion(root):
+    """
+    Chequea si hay una versión nueva y la instala, sin bloquear la interfaz:
+    la consulta y la descarga corren en segundo plano con tiempo máximo de espera.
+    """
+    def al_obtener_version(version_remota, error):
+        if version_remota is None:
+            messagebox.showwarning("Sin conexión", "No se pudo chequear la actualización automática (sin internet).")
+        elif version_remota != __version__:
+            en_segundo_plano(root, descargar_actualizacion, al_descargar)
+
+    def al_descargar(exe_nuevo, error):
+        if error:
+            messagebox.showerror("Falló la actualización", str(error))
+            return
+        try:
+            instalar_actualizacion(exe_nuevo)
+        except Exception as e:
+            messagebox.showerror("Falló la actualización", str(e))
+
+    en_segundo_plano(root, obtener_version_remota, al_obtener_version)
+
+class AnchoColumnas:
+    """
+    Ajusta el ancho de las columnas de un Treeview al contenido.
+    Usa una sola fuente, memoriza las mediciones de texto (LRU) y calcula los anchos
+    con los valores que ya tiene Python, sin leerlos de vuelta desde Tk.
+    Los anchos solo crecen a medida que se agregan filas; reiniciar() los vuelve al encabezado.
+    """
+    MARGEN = 12
+    MEDICIONES_CACHEADAS = 8192
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.columnas = tuple(tree["columns"])
+        self.fuente = tkFont.nametofont("TkDefaultFont")
+        self.medir = lru_cache(maxsize=self.MEDICIONES_CACHEADAS)(self.fuente.measure)
+        self.anchos = [0] * len(self.columnas)
+
+    def reiniciar(self):
+        """Vuelve los anchos al del título de cada columna."""
+        self.anchos = [self.medir(col) + self.MARGEN for col in self.columnas]
+        for col, ancho in zip(self.columnas, self.anchos):
+            self.tree.column(col, width=ancho)
+
+    def ensanchar(self, filas):
+        """Ensancha las columnas que no alcanzan para los valores de las filas dadas."""
+        nuevos = list(self.anchos)
+        for valores in filas:
+            for i, valor in enumerate(valores):
+                ancho = self.medir(str(valor)) + self.MARGEN
+                if ancho > nuevos[i]:
+                    nuevos[i] = ancho
+        for i, col in enumerate(self.columnas):
+            if nuevos[i] != self.anchos[i]:
+                self.tree.column(col, width=nuevos[i])
+        self.anchos = nuevos
+
+class TablaVirtual:
+    """
+    Treeview con desplazamiento virtual: en Tk solo existen los items de las filas visibles.
+    Las filas se leen de SQLite por páginas (paginación por clave) a medida que se desplaza,
+    guardando en memoria un pequeño buffer alrededor de la zona visible.
+    El iid de cada item es el ID del producto; si se pasa cache (CacheProductos),
+    cada página leída se guarda también ahí.
+    """
+    BUFFER = 30
+
+    def __init__(self, parent, columns, formatear, altura=10, cache=None):
+        self.formatear = formatear
+        self.cache = cache
+        self.scroll = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+        self.scroll.pack(side="right", fill="y")
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", height=altura)
+        self.anchos = AnchoColumnas(self.tree)
+        self.visibles = altura
+        self.ids = array("q")
+        self.offset = 0
+        self._buffer_inicio = 0
+        self._buffer = []
+        self._seleccion = set()
+
+        for secuencia in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(secuencia, self._on_rueda)
+        self.tree.bind("<Up>", lambda e: self._mover_foco(-1))
+        self.tree.bind("<Down>", lambda e: self._mover_foco(1))
+        self.tree.bind("<Prior>", lambda e: self.desplazar_a(self.offset - self.visibles) or "break")
+        self.tree.bind("<Next>", lambda e: self.desplazar_a(self.offset + self.visibles) or "break")
+
+    def recargar(self):
+        """Vuelve a leer los IDs y repinta la zona visible (mantiene la posición)."""
+        self.ids = get_ids_productos()
+        self._buffer = []
+        self.desplazar_a(self.offset)
+
+    def total(self):
+        return len(self.ids)
+
+    def desplazar_a(self, offset):
+        """Muestra las filas a partir de la posición offset."""
+        maximo = max(0, len(self.ids) - self.visibles)
+        self.offset = max(0, min(offset, maximo))
+        self._pintar(self._filas(self.offset, self.visibles))
+        self._actualizar_scroll()
+
+    def actualizar(self, cambios):
+        """
+        Aplica cambios puntuales (producto_id, antes, despues) sin releer la tabla:
+        actualiza, inserta o quita solo los items afectados.
+        """
+        repintar = False
+        fin_buffer = self._buffer_inicio + len(self._buffer)
+        for producto_id, antes, despues in cambios:
+            pos = bisect_left(self.ids, producto_id)
+            existe = pos < len(self.ids) and self.ids[pos] == producto_id
+            if despues is None:
+                if not existe:
+                    continue
+                del self.ids[pos]
+                if pos < self._buffer_inicio:
+                    self._buffer_inicio -= 1
+                elif pos < fin_buffer:
+                    del self._buffer[pos - self._buffer_inicio]
+                repintar = repintar or pos < self.offset + self.visibles
+            elif not existe:
+                self.ids.insert(pos, producto_id)
+                if pos < self._buffer_inicio:
+                    self._buffer_inicio += 1
+                elif pos <= fin_buffer and self._buffer:
+                    self._buffer.insert(pos - self._buffer_inicio, despues)
+                repintar = repintar or pos < self.offset + self.visibles
+            else:
+                if self._buffer_inicio <= pos < fin_buffer:
+                    self._buffer[pos - self._buffer_inicio] = despues
+                iid = str(producto_id)
+                if self.tree.exists(iid):
+                    valores = self.formatear(despues)
+                    self.tree.item(iid, values=valores)
+                    self.anchos.ensanchar([valores])
+            fin_buffer = self._buffer_inicio + len(self._buffer)
+        if repintar:
+            self.desplazar_a(self.offset)
+        else:
+            self._actualizar_scroll()
+
+    def _actualizar_scroll(self):
+        if self.ids:
+            self.scroll.set(self.offset / len(self.ids),
+                            min(1.0, (self.offset + self.visibles) / len(self.ids)))
+        else:
+            self.scroll.set(0, 1)
+
+    def repintar(self):
+        """Vuelve a formatear las filas visibles (sin leer la base)."""
+        self.desplazar_a(self.offset)
+
+    def filas_visibles(self):
+        """Tuplas de productos que están pintadas en la tabla."""
+        return self._filas(self.offset, self.visibles)
+
+    def seleccion(self):
+        """IDs de productos seleccionados, incluso si quedaron fuera de la zona visible."""
+        self._actualizar_seleccion()
+        return [int(iid) for iid in self._seleccion]
+
+    def _filas(self, offset, cantidad):
+        fin = min(offset + cantidad, len(self.ids))
+        desde = offset - self._buffer_inicio
+        if 0 <= desde and fin - self._buffer_inicio <= len(self._buffer):
+            return self._buffer[desde:fin - self._buffer_inicio]
+        if offset >= len(self.ids):
+            return []
+        # Página nueva: zona visible más BUFFER filas antes y después
+        inicio = max(0, offset - self.BUFFER)
+        self._buffer = get_pagina_productos(self.ids[inicio], cantidad + 2 * self.BUFFER)
+        self._buffer_inicio = inicio
+        if self.cache is not None:
+            self.cache.cargar(self._buffer)
+        return self._buffer[offset - inicio:fin - inicio]
+
+    def _actualizar_seleccion(self):
+        pintados = set(self.tree.get_children())
+        self._seleccion = (self._seleccion - pintados) | set(self.tree.selection())
+
+    def _pintar(self, filas):
+        self._actualizar_seleccion()
+        foco = self.tree.focus()
+        self.tree.delete(*self.tree.get_children())
+        pintadas = []
+        for p in filas:
+            valores = self.formatear(p)
+            pintadas.append(valores)
+            self.tree.insert("", "end", iid=str(p[0]), values=valores)
+        self.anchos.ensanchar(pintadas)
+        seleccionados = [str(p[0]) for p in filas if str(p[0]) in self._seleccion]
+        if seleccionados:
+            self.tree.selection_set(seleccionados)
+        if foco and self.tree.exists(foco):
+            self.tree.focus(foco)
+
+    def _on_scrollbar(self, accion, cantidad, unidad=None):
+        if accion == "moveto":
+            self.desplazar_a(int(float(cantidad) * len(self.ids)))
+        elif accion == "scroll":
+            paso = int(cantidad) * (self.visibles if unidad == "pages" else 1)
+            self.desplazar_a(self.offset + paso)
+
+    def _on_rueda(self, event):
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.desplazar_a(self.offset - 3)
+        else:
+            self.desplazar_a(self.offset + 3)
+        return "break"
+
+    def _mover_foco(self, paso):
+        hijos = self.tree.get_children()
+        if not hijos:
+            return "break"
+        foco = self.tree.focus()
+        pos = hijos.index(foco) + paso if foco in hijos else 0
+        if pos < 0 or pos >= len(hijos):
+            # Al llegar al borde se desplaza la ventana una fila
+            self.desplazar_a(self.offset + paso)
+            hijos = self.tree.get_children()
+            pos = 0 if paso < 0 else len(hijos) - 1
+        if hijos:
+            self._seleccion = set()
+            self.tree.focus(hijos[pos])
+            self.tree.selection_set(hijos[pos])
+            self.tree.see(hijos[pos])
+        return "break"
+
+class SelectorProducto:
+    """
+    Buscador de productos mientras se escribe (reemplaza al Combobox con todos los productos).
+    Cada tecla reprograma la búsqueda (espera ESPERA_MS sin escribir) y se muestran solo los
+    primeros RESULTADOS productos que coinciden (ver inventario.buscar_productos).
+    Flechas para moverse en la lista, Enter para elegir.
+    """
+    ESPERA_MS = 150
+    RESULTADOS = 20
+
+    def __init__(self, parent, al_elegir=None, altura=6, ancho=40):
+        self.al_elegir = al_elegir
+        self.frame = ttk.Frame(parent)
+        self.texto = tk.StringVar()
+        self.entry = ttk.Entry(self.frame, textvariable=self.texto, width=ancho)
+        self.entry.pack(fill="x")
+        self.lista = tk.Listbox(self.frame, height=altura, width=ancho, exportselection=False)
+        self.lista.pack(fill="both", expand=True)
+        self.resultados = []
+        self._pendiente = None
+
+        self.entry.bind("<KeyRelease>", self._al_escribir)
+        self.entry.bind("<Down>", lambda e: self._mover(1))
+        self.entry.bind("<Up>", lambda e: self._mover(-1))
+        self.entry.bind("<Return>", self._elegir)
+        self.lista.bind("<Return>", self._elegir)
+        self.lista.bind("<Double-Button-1>", self._elegir)
+        self.buscar()
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def focus_set(self):
+        self.entry.focus_set()
+
+    def _al_escribir(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        if self._pendiente is not None:
+            self.frame.after_cancel(self._pendiente)
+        self._pendiente = self.frame.after(self.ESPERA_MS, self.buscar)
+
+    def buscar(self):
+        self._pendiente = None
+        try:
+            self.resultados = buscar_productos(self.texto.get(), self.RESULTADOS)
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo buscar el producto:\n{e}", parent=self.frame)
+            return
+        self.lista.delete(0, "end")
+        for p in self.resultados:
+            self.lista.insert("end", f"{p[1]} (Stock: {p[6]})")
+        if self.resultados:
+            self.lista.selection_set(0)
+
+    def _mover(self, paso):
+        if not self.resultados:
+            return "break"
+        actual = self.lista.curselection()
+        pos = max(0, min(len(self.resultados) - 1, (actual[0] + paso) if actual else 0))
+        self.lista.selection_clear(0, "end")
+        self.lista.selection_set(pos)
+        self.lista.see(pos)
+        return "break"
+
+    def _elegir(self, event=None):
+        if self._pendiente is not None:
+            # Enter antes de que termine la espera: se busca ya
+            self.frame.after_cancel(self._pendiente)
+            self.buscar()
+        if self.producto is not None and self.al_elegir:
+            self.al_elegir(self.producto)
+        return "break"
+
+    @property
+    def producto(self):
+        """Tupla del producto elegido en la lista (None si no hay)."""
+        seleccion = self.lista.curselection()
+        return self.resultados[seleccion[0]] if seleccion else None
+
+    def limpiar(self):
+        self.texto.set("")
+        self.buscar()
+        self.entry.focus_set()
+
+class PanelStockBajo:
+    """
+    Panel lateral con los productos por debajo del stock mínimo, ordenados por nombre.
+    Se carga con get_stock_bajo() y después se actualiza con los cambios de productos:
+    solo entran, salen o se repintan los productos modificados, así el costo depende de
+    los productos en falta y no del tamaño del catálogo.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    if tipo == "entrada":
-        c.execute("SELECT costo_real FROM productos WHERE id=?", (producto_id,))
-    else:  # salida
-        c.execute("SELECT costo_comprador FROM productos WHERE id=?", (producto_id,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else 0
-
-def obtener_precio_compra(producto_id):
-    """Devuelve el precio de compra (costo_real) del producto por su ID."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT costo_real FROM productos WHERE id=?", (producto_id,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else None
-
-def obtener_precio_venta(producto_id):
-    """Devuelve el precio de venta (costo_comprador) del producto por su ID."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT costo_comprador FROM productos WHERE id=?", (producto_id,))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else None
+    COLUMNAS = ("Producto", "Stock", "Mínimo", "A pedir")
+
+    def __init__(self, parent, al_exportar, altura=12):
+        self.frame = ttk.LabelFrame(parent, text="Stock bajo")
+        ttk.Button(self.frame, text="Exportar lista de pedido", command=al_exportar).pack(side="bottom", pady=3)
+        scroll = ttk.Scrollbar(self.frame, orient="vertical")
+        scroll.pack(side="right", fill="y")
+        self.tree = ttk.Treeview(self.frame, columns=self.COLUMNAS, show="headings", height=altura,
+                                 yscrollcommand=scroll.set)
+        scroll.config(command=self.tree.yview)
+        for col, ancho in zip(self.COLUMNAS, (160, 50, 60, 60)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=ancho, anchor="w" if col == "Producto" else "center")
+        self.tree.pack(fill="both", expand=True)
+        self.claves = []     # (nombre en minúscula, id) en el orden del panel
+        self.productos = {}  # id -> tupla del producto
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def __len__(self):
+        return len(self.productos)
+
+    @staticmethod
+    def _clave(p):
+        return ((p[1] or "").lower(), p[0])
+
+    @staticmethod
+    def _valores(p):
+        return (p[1], p[6], p[7], cantidad_a_pedir(p))
+
+    def cargar(self, productos):
+        """Reemplaza todo el contenido del panel."""
+        self.tree.delete(*self.tree.get_children())
+        self.productos = {p[0]: p for p in productos}
+        self.claves = sorted(self._clave(p) for p in productos)
+        for _, producto_id in self.claves:
+            self.tree.insert("", "end", iid=str(producto_id), values=self._valores(self.productos[producto_id]))
+
+    def aplicar(self, cambios):
+        """Aplica cambios (producto_id, antes, despues) de productos."""
+        for producto_id, antes, despues in cambios:
+            anterior = self.productos.get(producto_id)
+            bajo = es_stock_bajo(despues)
+            if anterior is not None and bajo and self._clave(anterior) == self._clave(despues):
+                # Sigue en falta con el mismo nombre: se repinta en su lugar
+                self.productos[producto_id] = despues
+                self.tree.item(str(producto_id), values=self._valores(despues))
+                continue
+            if anterior is not None:
+                del self.claves[bisect_left(self.claves, self._clave(anterior))]
+                del self.productos[producto_id]
+                self.tree.delete(str(producto_id))
+            if bajo:
+                clave = self._clave(despues)
+                pos = bisect_left(self.claves, clave)
+                self.claves.insert(pos, clave)
+                self.productos[producto_id] = despues
+                self.tree.insert("", pos, iid=str(producto_id), values=self._valores(despues))
+
+    def lista(self):
+        """Productos del panel, en el orden en que se muestran."""
+        return [self.productos[producto_id] for _, producto_id in self.claves]
 
 class StockApp:
+    INTERVALO_USD_MS = 60 * 1000  # cada cuánto se revisa si la cotización venció
+    INTERVALO_SINCRONIZACION_MS = 1000  # modo caja: cada cuánto se piden los cambios de las otras cajas
+    INTERVALO_REVISAR_SINCRONIZACION_MS = 100  # cada cuánto la interfaz aplica los cambios recibidos
+    INTERVALO_ESCRITURA_MS = 10  # cada cuánto se revisa si se confirmó una escritura encolada
+
     def __init__(self, root):
         self.root = root
         self.root.title("Control de Stock")
-        self.usd_price = get_usd_price()
+        # Última cotización conocida (guardada en la base); la nueva llega en segundo plano
+        self.cotizacion = CacheCotizacion()
+        self.usd_price = self.cotizacion.valor()
 
         # Paleta marina
         self.bg_main = "#e0f7fa"      # celeste claro
@@ -261,8 +585,28 @@ class StockApp:
         self.fg_main = "#01579b"      # azul oscuro
         self.fg_button = "#004d40"    # verde agua oscuro
 
+        self.total_iva = 0
+        self.stock_bajo = 0
+        # Productos por ID: la selección de la tabla se resuelve sin releer el catálogo
+        self.productos = CacheProductos(leer=get_productos_por_id)
+
         self.setup_ui()
+        # Ventana oculta de diagnóstico de rendimiento
+        self.root.bind("<Control-Shift-D>", lambda e: self.abrir_diagnostico())
+        if cliente is not None:
+            self.root.title(f"Control de Stock - caja ({cliente.url})")
+            cliente.sincronizar()  # toma la versión actual del servidor antes de leer la tabla
         self.refresh_table()
+        # Las escrituras van a un hilo aparte (commit agrupado); sus cambios vuelven por escribir()
+        self.escritor = EscritorLotes(al_cambiar_productos, agrupar=cliente is None)
+        if cliente is not None:
+            self.sincronizar_periodico()
+        else:
+            # Foto periódica del stock para consultas a fecha (ver fotos_stock.py)
+            import fotos_stock
+            en_segundo_plano(self.root, fotos_stock.tomar_foto_si_corresponde)
+        self.actualizar_usd(forzar=False)
+        self.root.after(self.INTERVALO_USD_MS, self.refrescar_usd_periodico)
 
     def setup_ui(self):
         # No cambies el fondo general ni de los frames
@@ -289,16 +633,18 @@ class StockApp:
         frame = ttk.Frame(self.root)
         frame.pack(padx=10, pady=10, fill="both", expand=True)
 
-        # Scrollbar vertical para la tabla
-        tree_scroll = ttk.Scrollbar(frame, orient="vertical")
-        tree_scroll.pack(side="right", fill="y")
+        # Panel lateral de stock bajo (se empaqueta primero para que ocupe todo el alto a la derecha)
+        self.panel_stock_bajo = PanelStockBajo(frame, self.exportar_lista_pedido)
+        self.panel_stock_bajo.pack(side="right", fill="y", padx=(10, 0))
 
-        self.tree = ttk.Treeview(
+        # Tabla virtual con su scrollbar: solo se crean los items visibles
+        self.tabla = TablaVirtual(
             frame,
             columns=("Nombre", "Precio de Compra", "Precio de Venta", "IVA (%)", "En Dólares", "Cantidad"),
-            show="headings",
-            yscrollcommand=tree_scroll.set
+            formatear=lambda p: formatear_producto(p, self.usd_price),
+            cache=self.productos,
         )
+        self.tree = self.tabla.tree
         for col in self.tree["columns"]:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=120, anchor="center", stretch=tk.YES)
@@ -307,11 +653,15 @@ class StockApp:
         # IVA total y dólar (sin fondo personalizado)
         self.iva_label = ttk.Label(frame, text="IVA acumulado: $0.00", font=('Arial', 11, 'bold'))
         self.iva_label.pack(pady=5, fill="x")
-        self.usd_label = ttk.Label(frame, text=f"Precio del dólar: ${self.usd_price:.2f}", font=('Arial', 11, 'bold'))
+        self.stock_bajo_label = ttk.Label(frame, text="Productos con stock bajo: 0", font=('Arial', 11, 'bold'))
+        self.stock_bajo_label.pack(pady=5, fill="x")
+        self.usd_label = ttk.Label(frame, text=self.texto_usd(), font=('Arial', 11, 'bold'))
         self.usd_label.pack(pady=5, fill="x")
 
-        actualizar_usd_btn = ttk.Button(frame, text="Actualizar dólar", command=self.actualizar_usd, style="Mar.TButton")
-        actualizar_usd_btn.pack(pady=2)
+        self.actualizar_usd_btn = ttk.Button(frame, text="Actualizar dólar", command=self.actualizar_usd, style="Mar.TButton")
+        self.actualizar_usd_btn.pack(pady=2)
+        repreciar_btn = ttk.Button(frame, text="Repreciar productos en dólares", command=self.repreciar_dolares, style="Mar.TButton")
+        repreciar_btn.pack(pady=2)
 
         # Agrupa los botones de a 3
         botones1 = ttk.Frame(frame)
@@ -340,63 +690,160 @@ class StockApp:
         botones3.pack(pady=5)
         mod_precio_compra_btn = ttk.Button(botones3, text="Modificar precio de compra", command=self.modificar_precio_compra, style="Mar.TButton")
         mod_precio_compra_btn.pack(side="left", padx=2)
+        importar_btn = ttk.Button(botones3, text="Importar productos (CSV/XLSX)", command=self.importar_productos, style="Mar.TButton")
+        importar_btn.pack(side="left", padx=2)
+        archivar_btn = ttk.Button(botones3, text="Archivar años cerrados", command=self.archivar_movimientos, style="Mar.TButton")
+        archivar_btn.pack(side="left", padx=2)
         # Elimina el botón de modificar precio de venta
         # mod_precio_venta_btn = ttk.Button(botones3, text="Modificar precio de venta", command=self.modificar_precio_venta, style="Mar.TButton")
         # mod_precio_venta_btn.pack(side="left", padx=2)
 
-    def actualizar_usd(self):
-        self.usd_price = get_usd_price()
-        self.usd_label.config(text=f"Precio del dólar: ${self.usd_price:.2f}")
-        self.refresh_table()
+    def texto_usd(self, sin_conexion=False):
+        if not self.usd_price:
+            return "Precio del dólar: sin cotización (sin conexión)" if sin_conexion else "Precio del dólar: consultando..."
+        texto = f"Precio del dólar: ${self.usd_price:.2f}"
+        if sin_conexion:
+            texto += f" (sin conexión, última: {self.cotizacion.fecha})"
+        return texto
 
+    def actualizar_usd(self, forzar=True):
+        """
+        Pide la cotización en segundo plano y actualiza la tabla cuando llega.
+        Si falla, se sigue usando la última cotización guardada.
+        """
+        self.actualizar_usd_btn.state(["disabled"])
+
+        def al_recibir(usd_price, error):
+            self.actualizar_usd_btn.state(["!disabled"])
+            if error is None:
+                self.usd_price = usd_price
+            self.usd_label.config(text=self.texto_usd(sin_conexion=error is not None))
+            # Solo cambia cómo se muestran los precios: se repintan las filas visibles
+            self.tabla.repintar()
+
+        futuro = self.cotizacion.actualizar(forzar=forzar)
+        en_segundo_plano(self.root, futuro.result, al_recibir)
+
+    @diagnostico.medido()
+    def repreciar_dolares(self):
+        """
+        Recalcula los precios en pesos de todos los productos en dólares con la cotización
+        actual, a partir de su costo original en dólares (queda en el historial de precios).
+        """
+        if not self.usd_price:
+            messagebox.showerror("Error", "No hay cotización del dólar disponible. Intente actualizarla.")
+            return
+        if not messagebox.askyesno("Confirmar", "¿Recalcular los precios de todos los productos en dólares "
+                                                f"con el dólar a ${self.usd_price:.2f}?"):
+            return
+        def al_terminar(cantidad, error):
+            if error is not None:
+                messagebox.showerror("Error", f"No se pudieron actualizar los precios:\n{mensaje_error_escritura(error)}")
+            else:
+                messagebox.showinfo("Precios actualizados", f"Se actualizaron los precios de {cantidad} productos.")
+
+        self.escribir(repreciar_dolares, self.usd_price, al_terminar=al_terminar)
+
+    def refrescar_usd_periodico(self):
+        if self.cotizacion.vencida():
+            self.actualizar_usd(forzar=False)
+        self.root.after(self.INTERVALO_USD_MS, self.refrescar_usd_periodico)
+
+    def sincronizar_periodico(self):
+        """
+        Modo caja: aplica a la tabla las ventas y cambios hechos en las otras cajas.
+        Los pide siempre el mismo hilo, que reusa su conexión con el servidor.
+        """
+        recibidos = queue.Queue()
+
+        def trabajar():
+            while True:
+                time.sleep(self.INTERVALO_SINCRONIZACION_MS / 1000)
+                try:
+                    recibidos.put((cliente.sincronizar(), None))
+                except Exception as e:
+                    recibidos.put((None, e))
+
+        def revisar():
+            while True:
+                try:
+                    cambios, error = recibidos.get_nowait()
+                except queue.Empty:
+                    break
+                if error is not None:
+                    self.root.title(f"Control de Stock - caja (sin conexión con {cliente.url})")
+                    continue
+                self.root.title(f"Control de Stock - caja ({cliente.url})")
+                if cambios is None:
+                    self.refresh_table()
+                elif cambios:
+                    self.aplicar_cambios(cambios)
+            self.root.after(self.INTERVALO_REVISAR_SINCRONIZACION_MS, revisar)
+
+        threading.Thread(target=trabajar, name="sincronizacion", daemon=True).start()
+        revisar()
+
+    @diagnostico.medido()
     def refresh_table(self):
         """
-        Refresca la tabla principal mostrando todos los productos con sus datos.
+        Refresca la tabla principal (solo se pintan las filas visibles) y los totales.
         Si el producto está en dólares, muestra el monto en dólares entre paréntesis.
         Si el precio es NULL o 0, muestra 'Se necesita actualización de precio'.
         """
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        productos = get_productos()
-        for p in productos:
-            producto_id = p[0]
-            precio_compra = obtener_precio_compra(producto_id)
-            precio_venta = obtener_precio_venta(producto_id)
-            en_dolares = p[5]
-            usd_price = self.usd_price if self.usd_price else 1
-
-            if not precio_compra or not precio_venta:
-                precio_compra_str = "Se necesita actualización de precio"
-                precio_venta_str = "Se necesita actualización de precio"
-                en_dolares_str = "Sí" if en_dolares else "No"
-            else:
-                if (en_dolares):
-                    precio_compra_dol = precio_compra / usd_price
-                    precio_venta_dol = precio_venta / usd_price
-                    precio_compra_str = f"${precio_compra:.2f} ({precio_compra_dol:.2f} USD)"
-                    precio_venta_str = f"${precio_venta:.2f} ({precio_venta_dol:.2f} USD)"
-                    en_dolares_str = "Sí"
-                else:
-                    precio_compra_str = f"${precio_compra:.2f}"
-                    precio_venta_str = f"${precio_venta:.2f}"
-                    en_dolares_str = "No"
-            stock_str = str(p[6])
-            if len(p) > 7 and p[6] < p[7]:
-                stock_str = f"{p[6]} ⚠️ (MINIMO STOCK EN FALTA!!!)"
-            values = (p[1], precio_compra_str, precio_venta_str, f"{p[4]}%", en_dolares_str, stock_str)
-            self.tree.insert("", "end", values=values)
-        self.iva_label.config(text=f"IVA acumulado: ${calcular_iva_total():.2f}")
-        self.usd_label.config(text=f"Precio del dólar: ${self.usd_price:.2f}")
-
-        # Ajusta el ancho de las columnas al contenido
-        self.tree.update()
-        for col in self.tree["columns"]:
-            self.tree.column(col, width=tkFont.Font().measure(col))
-            for item in self.tree.get_children():
-                cell_value = self.tree.set(item, col)
-                width = tkFont.Font().measure(cell_value)
-                if self.tree.column(col, 'width') < width:
-                    self.tree.column(col, width=width)
+        # Solo se leen de la base las filas visibles; el IVA sale de un único SUM.
+        # El ancho de las columnas se recalcula con las filas pintadas.
+        self.tabla.anchos.reiniciar()
+        self.productos.invalidar()
+        self.tabla.recargar()
+        self.total_iva = calcular_iva_total()
+        # Solo se leen los productos en falta (índice parcial, ver inventario.get_stock_bajo)
+        bajo_stock = get_stock_bajo()
+        self.panel_stock_bajo.cargar(bajo_stock)
+        self.stock_bajo = len(bajo_stock)
+        self.actualizar_totales()
+
+    @diagnostico.medido()
+    def aplicar_cambios(self, cambios):
+        """
+        Actualiza la tabla y los totales a partir de los productos modificados,
+        sin recorrer el catálogo completo (costo proporcional a los cambios).
+        """
+        for producto_id, antes, despues in cambios:
+            self.total_iva += iva_producto(despues) - iva_producto(antes)
+            self.stock_bajo += es_stock_bajo(despues) - es_stock_bajo(antes)
+        self.productos.aplicar(cambios)
+        self.tabla.actualizar(cambios)
+        self.panel_stock_bajo.aplicar(cambios)
+        self.actualizar_totales()
+
+    def escribir(self, funcion, *args, al_terminar=None):
+        """
+        Encola funcion(*args) en el hilo escritor sin bloquear la interfaz. Cuando se
+        confirma, aplica a la tabla los productos modificados y llama a
+        al_terminar(resultado, error) en el hilo de Tk. Sin al_terminar, un error se
+        informa con un mensaje.
+        """
+        futuro = self.escritor.enviar(funcion, *args)
+
+        def revisar():
+            if not futuro.done():
+                self.root.after(self.INTERVALO_ESCRITURA_MS, revisar)
+                return
+            resultado, error = None, futuro.exception()
+            if error is None:
+                resultado, cambios = futuro.result()
+                if cambios:
+                    self.aplicar_cambios(cambios)
+            if al_terminar is not None:
+                al_terminar(resultado, error)
+            elif error is not None:
+                messagebox.showerror("Error", mensaje_error_escritura(error))
+
+        self.root.after(self.INTERVALO_ESCRITURA_MS, revisar)
+
+    def actualizar_totales(self):
+        self.iva_label.config(text=f"IVA acumulado: ${self.total_iva:.2f}")
+        self.stock_bajo_label.config(text=f"Productos con stock bajo: {self.stock_bajo}")
 
     def open_add_window(self):
         win = tk.Toplevel(self.root)
@@ -439,13 +886,8 @@ class StockApp:
         def actualizar_precio_venta(*args):
             try:
                 costo_real = float(costo_real_entry.get())
-                moneda = moneda_var.get()
-                usd_price = self.usd_price
-                if (moneda == "Dólar"):
-                    precio_compra_pesos = costo_real * usd_price
-                    precio_venta = precio_compra_pesos * 1.5  # compra + 50%
-                else:
-                    precio_venta = costo_real * 1.8  # compra + 80%
+                en_dolares = 1 if moneda_var.get() == "Dólar" else 0
+                _, precio_venta = calcular_precios(costo_real, en_dolares, self.usd_price)
                 precio_venta_var.set(f"${precio_venta:.2f}")
             except Exception:
                 precio_venta_var.set("$0.00")
@@ -453,196 +895,237 @@ class StockApp:
         costo_real_entry.bind("<KeyRelease>", actualizar_precio_venta)
         moneda_combo.bind("<<ComboboxSelected>>", actualizar_precio_venta)
 
+        @diagnostico.medido()
         def agregar():
             try:
                 nombre = nombre_entry.get().strip()
                 if not nombre:
                     raise ValueError("El nombre no puede estar vacío")
                 costo_real = float(costo_real_entry.get())
-                if costo_real <= 0:
-                    raise ValueError("El precio de compra debe ser mayor a 0")
                 iva = float(iva_entry.get())
-                if iva < 0:
-                    raise ValueError("El IVA no puede ser negativo")
                 cantidad = int(cantidad_entry.get())
-                if cantidad < 0:
-                    raise ValueError("La cantidad no puede ser negativa")
                 min_stock = int(min_stock_entry.get())
-                if min_stock < 0:
-                    raise ValueError("El stock mínimo no puede ser negativo")
-                moneda = moneda_var.get()
+                validar_producto(nombre, costo_real, iva, cantidad, min_stock)
                 usd_price = self.usd_price
-                if moneda == "Dólar":
-                    en_dolares = 1
-                    costo_real_db = costo_real * usd_price
-                    costo_comprador = costo_real * 1.5 * usd_price
-                else:
-                    en_dolares = 0
-                    costo_real_db = costo_real
-                    costo_comprador = costo_real * 1.8
-                add_producto(nombre, costo_real_db, costo_comprador, iva, en_dolares, usd_price, cantidad, min_stock)
-                win.destroy()
-                self.refresh_table()
+                en_dolares = 1 if moneda_var.get() == "Dólar" else 0
+                costo_real_db, costo_comprador = calcular_precios(costo_real, en_dolares, usd_price)
             except ValueError as ve:
                 messagebox.showerror("Error", str(ve))
-            except Exception as e:
+                return
+            except Exception:
                 messagebox.showerror("Error", "Ingrese solo números en los campos numéricos.")
+                return
+
+            def al_terminar(producto_id, error):
+                if error is not None:
+                    agregar_btn.state(["!disabled"])
+                    messagebox.showerror("Error", mensaje_error_escritura(error), parent=win)
+                else:
+                    win.destroy()
+
+            agregar_btn.state(["disabled"])  # hasta que se confirme, para no cargarlo dos veces
+            self.escribir(add_producto, nombre, costo_real_db, costo_comprador, iva, en_dolares, usd_price,
+                          cantidad, min_stock, al_terminar=al_terminar)
 
-        ttk.Button(win, text="Agregar", command=agregar).grid(row=7, columnspan=2, pady=5)
+        agregar_btn = ttk.Button(win, text="Agregar", command=agregar)
+        agregar_btn.grid(row=7, columnspan=2, pady=5)
         ttk.Button(win, text="Volver", command=win.destroy).grid(row=8, columnspan=2, pady=5)
 
     def open_compra_window(self):
+        """
+        Carrito de venta: se cargan varias líneas y se confirman juntas.
+        La venta se registra en una sola transacción (todas las líneas o ninguna).
+        """
         win = tk.Toplevel(self.root)
         win.title("Registrar Compra")
 
-        ttk.Label(win, text="Seleccione producto:").grid(row=0, column=0)
-        productos = get_productos()
-        nombres = [f"{p[1]} (Stock: {p[6]})" for p in productos]
-        producto_var = tk.StringVar()
-        producto_combo = ttk.Combobox(win, values=nombres, state="readonly", textvariable=producto_var)
-        producto_combo.grid(row=0, column=1)
+        ttk.Label(win, text="Buscar producto:").grid(row=0, column=0, sticky="n")
+        # Enter en el buscador pasa a la cantidad; Enter en la cantidad agrega la línea
+        selector = SelectorProducto(win, al_elegir=lambda p: cantidad_entry.focus_set())
+        selector.grid(row=0, column=1)
 
         ttk.Label(win, text="Cantidad a comprar:").grid(row=1, column=0)
         cantidad_entry = ttk.Entry(win)
         cantidad_entry.insert(0, "1")
         cantidad_entry.grid(row=1, column=1)
+        cantidad_entry.bind("<Return>", lambda e: agregar_linea())
 
-        def registrar():
+        carrito = ttk.Treeview(win, columns=("Producto", "Cantidad", "Precio", "Subtotal"), show="headings", height=8)
+        for col in carrito["columns"]:
+            carrito.heading(col, text=col)
+            carrito.column(col, width=110, anchor="center")
+        carrito.grid(row=3, column=0, columnspan=2, padx=5, pady=5)
+        total_var = tk.StringVar(value="Total: $0.00")
+        ttk.Label(win, textvariable=total_var, font=('Arial', 11, 'bold')).grid(row=4, columnspan=2)
+
+        lineas = {}  # iid del carrito -> (producto_id, cantidad, precio)
+
+        def actualizar_total():
+            total = sum(cantidad * precio for _, cantidad, precio in lineas.values())
+            total_var.set(f"Total: ${total:.2f}")
+
+        def agregar_linea():
             try:
-                idx = producto_combo.current()
-                if idx == -1:
+                p = selector.producto
+                if p is None:
                     raise ValueError("Seleccione un producto")
-                producto_id = productos[idx][0]
                 cantidad = int(cantidad_entry.get())
                 if cantidad <= 0:
                     raise ValueError("Cantidad inválida")
-                if descontar_stock(producto_id, cantidad):
-                    messagebox.showinfo("Éxito", "Compra registrada y stock actualizado.")
-                    win.destroy()
-                    self.refresh_table()
-                else:
-                    messagebox.showerror("Error", "Stock insuficiente.")
+                precio = p[3] or 0
+                iid = carrito.insert("", "end", values=(p[1], cantidad, f"${precio:.2f}", f"${cantidad * precio:.2f}"))
+                lineas[iid] = (p[0], cantidad, precio)
+                actualizar_total()
+                cantidad_entry.delete(0, "end")
+                cantidad_entry.insert(0, "1")
+                selector.limpiar()
             except Exception as e:
-                messagebox.showerror("Error", f"Datos inválidos: {e}")
+                messagebox.showerror("Error", f"Datos inválidos: {e}", parent=win)
 
-        ttk.Button(win, text="Registrar", command=registrar).grid(row=2, columnspan=2, pady=5)
+        def quitar_linea():
+            for iid in carrito.selection():
+                carrito.delete(iid)
+                lineas.pop(iid, None)
+            actualizar_total()
+
+        @diagnostico.medido()
+        def registrar():
+            if not lineas:
+                agregar_linea()  # venta de un solo producto sin pasar por el carrito
+                if not lineas:
+                    return
+
+            def al_terminar(total, error):
+                if error is not None:
+                    registrar_btn.state(["!disabled"])
+                    messagebox.showerror("Error", mensaje_error_escritura(error), parent=win)
+                    return
+                messagebox.showinfo("Éxito", f"Compra registrada y stock actualizado.\nTotal: ${total:.2f}")
+                win.destroy()
+
+            registrar_btn.state(["disabled"])  # hasta que se confirme, para no registrarla dos veces
+            self.escribir(registrar_venta, [(producto_id, cantidad) for producto_id, cantidad, _ in lineas.values()],
+                          al_terminar=al_terminar)
+
+        ttk.Button(win, text="Agregar al carrito", command=agregar_linea).grid(row=2, column=0, pady=5)
+        ttk.Button(win, text="Quitar línea", command=quitar_linea).grid(row=2, column=1, pady=5)
+        registrar_btn = ttk.Button(win, text="Registrar", command=registrar)
+        registrar_btn.grid(row=5, columnspan=2, pady=5)
+        ttk.Button(win, text="Volver", command=win.destroy).grid(row=6, columnspan=2, pady=5)
 
     def open_agregar_stock_window(self):
         win = tk.Toplevel(self.root)
         win.title("Agregar Stock")
 
-        ttk.Label(win, text="Seleccione producto:").grid(row=0, column=0)
-        productos = get_productos()
-        nombres = [f"{p[1]} (Stock: {p[6]})" for p in productos]
-        producto_var = tk.StringVar()
-        producto_combo = ttk.Combobox(win, values=nombres, state="readonly", textvariable=producto_var)
-        producto_combo.grid(row=0, column=1)
+        ttk.Label(win, text="Buscar producto:").grid(row=0, column=0, sticky="n")
+        selector = SelectorProducto(win, al_elegir=lambda p: cantidad_entry.focus_set())
+        selector.grid(row=0, column=1)
 
         ttk.Label(win, text="Cantidad a agregar:").grid(row=1, column=0)
         cantidad_entry = ttk.Entry(win)
         cantidad_entry.insert(0, "1")
         cantidad_entry.grid(row=1, column=1)
+        cantidad_entry.bind("<Return>", lambda e: agregar_stock())
 
-        def obtener_precio_producto(producto_id):
-            conn = sqlite3.connect(DB_NAME)
-            c = conn.cursor()
-            c.execute("SELECT costo_comprador FROM productos WHERE id=?", (producto_id,))
-            precio = c.fetchone()
-            conn.close()
-            return precio[0] if precio else 0
-
+        @diagnostico.medido()
         def agregar_stock():
             try:
-                idx = producto_combo.current()
-                if idx == -1:
+                p = selector.producto
+                if p is None:
                     raise ValueError("Seleccione un producto")
-                producto_id = productos[idx][0]
+                producto_id = p[0]
                 cantidad = int(cantidad_entry.get())
                 if cantidad <= 0:
                     raise ValueError("Cantidad inválida")
-                conn = sqlite3.connect(DB_NAME)
-                c = conn.cursor()
-                c.execute("UPDATE productos SET cantidad = cantidad + ? WHERE id=?", (cantidad, producto_id))
-                # Registra movimiento
-                fecha_local = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                c.execute("INSERT INTO movimientos (producto_id, tipo, cantidad, fecha, precio_unitario) VALUES (?, 'entrada', ?, ?, ?)",
-                          (producto_id, cantidad, fecha_local, obtener_precio_producto_tipo(producto_id, "entrada")))
-                conn.commit()
-                conn.close()
-                messagebox.showinfo("Éxito", "Stock actualizado.")
-                win.destroy()
-                self.refresh_table()
             except Exception as e:
                 messagebox.showerror("Error", f"Datos inválidos: {e}")
+                return
+
+            def al_terminar(encontrado, error):
+                agregar_btn.state(["!disabled"])
+                if error is not None:
+                    messagebox.showerror("Error", mensaje_error_escritura(error), parent=win)
+                elif not encontrado:
+                    messagebox.showerror("Error", "No se encontró el producto", parent=win)
+                else:
+                    messagebox.showinfo("Éxito", "Stock actualizado.")
+                    win.destroy()
 
-        ttk.Button(win, text="Agregar", command=agregar_stock).grid(row=2, columnspan=2, pady=5)
+            agregar_btn.state(["disabled"])
+            self.escribir(ingresar_stock, producto_id, cantidad, al_terminar=al_terminar)
+
+        agregar_btn = ttk.Button(win, text="Agregar", command=agregar_stock)
+        agregar_btn.grid(row=2, columnspan=2, pady=5)
         ttk.Button(win, text="Volver", command=win.destroy).grid(row=3, columnspan=2, pady=5)
 
-    def eliminar_cliente(self):
+    def producto_seleccionado(self, accion):
+        """
+        Producto seleccionado en la tabla (el iid es su ID), leído del mapa de productos.
+        Si no hay selección o el producto ya no existe, lo informa y retorna None.
+        """
         selected = self.tree.selection()
         if not selected:
-            messagebox.showerror("Error", "Seleccione un producto para eliminar.")
-            return
-        item = self.tree.item(selected[0])
-        nombre = item["values"][0]
-        productos = get_productos()
-        # Busca el producto por nombre y cantidad para obtener el id
-        for p in productos:
-            if p[1] == nombre:
-                producto_id = p[0]
-                break
-        else:
+            messagebox.showerror("Error", f"Seleccione un producto para {accion}.")
+            return None
+        p = self.productos.get(int(selected[0]))
+        if p is None:
             messagebox.showerror("Error", "No se encontró el producto.")
+        return p
+
+    @diagnostico.medido()
+    def eliminar_cliente(self):
+        p = self.producto_seleccionado("eliminar")
+        if p is None:
             return
+        producto_id, nombre = p.id, p.nombre
         if messagebox.askyesno("Confirmar", f"¿Eliminar '{nombre}'?"):
-            eliminar_producto(producto_id, nombre)
-            self.refresh_table()
-            messagebox.showinfo("Eliminado", f"'{nombre}' fue eliminado y registrado en historial.")
+            def al_terminar(_, error):
+                if error is not None:
+                    messagebox.showerror("Error", mensaje_error_escritura(error))
+                else:
+                    messagebox.showinfo("Eliminado", f"'{nombre}' fue eliminado y registrado en historial.")
+
+            self.escribir(eliminar_producto, producto_id, nombre, al_terminar=al_terminar)
 
+    @diagnostico.medido()
     def eliminar_producto(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showerror("Error", "Seleccione un producto para eliminar.")
-            return
-        item = self.tree.item(selected[0])
-        nombre = item["values"][0]
-        productos = get_productos()
-        # Busca el producto por nombre y cantidad para obtener el id
-        for p in productos:
-            if p[1] == nombre:
-                producto_id = p[0]
-                break
-        else:
-            messagebox.showerror("Error", "No se encontró el producto.")
+        p = self.producto_seleccionado("eliminar")
+        if p is None:
             return
+        producto_id, nombre = p.id, p.nombre
         if messagebox.askyesno("Confirmar", f"¿Eliminar '{nombre}'?"):
-            eliminar_producto(producto_id, nombre)
-            self.refresh_table()
-            messagebox.showinfo("Eliminado", f"'{nombre}' fue eliminado y registrado en historial.")
+            def al_terminar(_, error):
+                if error is not None:
+                    messagebox.showerror("Error", mensaje_error_escritura(error))
+                else:
+                    messagebox.showinfo("Eliminado", f"'{nombre}' fue eliminado y registrado en historial.")
+
+            self.escribir(eliminar_producto, producto_id, nombre, al_terminar=al_terminar)
 
     def modificar_precio_compra(self):
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showerror("Error", "Seleccione un producto para modificar.")
-            return
-        item = self.tree.item(selected[0])
-        nombre = item["values"][0]
-        productos = get_productos()
-        for p in productos:
-            if p[1] == nombre:
-                producto_id = p[0]
-                precio_actual = p[2]
-                en_dolares = p[5]
-                usd_price = self.usd_price
-                break
-        else:
-            messagebox.showerror("Error", "No se encontró el producto.")
+        p = self.producto_seleccionado("modificar")
+        if p is None:
             return
+        producto_id, nombre = p.id, p.nombre
+        en_dolares = p.en_dolares
+        usd_price = self.usd_price
+        # Los productos en dólares se cargan en dólares: costo_real está en pesos
+        precio_actual = p.costo_real
+        if en_dolares:
+            try:
+                costo_usd = get_costo_usd(producto_id)
+            except Exception:
+                costo_usd = None
+            if costo_usd is not None:
+                precio_actual = costo_usd
+            elif usd_price:
+                precio_actual = p.costo_real / usd_price
 
         win = tk.Toplevel(self.root)
         win.title("Modificar precio de compra")
         ttk.Label(win, text=f"Producto: {nombre}").grid(row=0, column=0, columnspan=2)
-        ttk.Label(win, text="Nuevo precio de compra:").grid(row=1, column=0)
+        etiqueta = "Nuevo precio de compra (USD):" if en_dolares else "Nuevo precio de compra:"
+        ttk.Label(win, text=etiqueta).grid(row=1, column=0)
         precio_entry = ttk.Entry(win)
         precio_entry.insert(0, f"{precio_actual:.2f}")
         precio_entry.grid(row=1, column=1)
@@ -656,11 +1139,7 @@ class StockApp:
         def actualizar_precio_venta(*args):
             try:
                 nuevo_precio = float(precio_entry.get())
-                if en_dolares:
-                    precio_venta = nuevo_precio * 1.5  # margen en dólares
-                    precio_venta_pesos = precio_venta * usd_price
-                else:
-                    precio_venta_pesos = nuevo_precio * 1.8
+                _, precio_venta_pesos = calcular_precios(nuevo_precio, en_dolares, usd_price)
                 precio_venta_var.set(f"${precio_venta_pesos:.2f}")
             except Exception:
                 precio_venta_var.set("$0.00")
@@ -668,169 +1147,502 @@ class StockApp:
         precio_entry.bind("<KeyRelease>", actualizar_precio_venta)
         actualizar_precio_venta()
 
+        @diagnostico.medido()
         def guardar():
             try:
                 nuevo_precio = float(precio_entry.get())
-                if en_dolares:
-                    nuevo_precio_venta = nuevo_precio * 1.5  # margen en dólares
-                    nuevo_precio_pesos = nuevo_precio * usd_price  # precio de compra en pesos
-                    nuevo_precio_venta_pesos = nuevo_precio_venta * usd_price  # precio de venta en pesos
-                else:
-                    nuevo_precio_pesos = nuevo_precio
-                    nuevo_precio_venta_pesos = nuevo_precio * 1.8
-                conn = sqlite3.connect(DB_NAME)
-                c = conn.cursor()
-                c.execute("UPDATE productos SET costo_real=?, costo_comprador=? WHERE id=?", (nuevo_precio_pesos, nuevo_precio_venta_pesos, producto_id))
-                conn.commit()
-                conn.close()
-                win.destroy()
-                self.refresh_table()
-                messagebox.showinfo("Éxito", "Precio de compra y venta modificados.")
+                nuevo_precio_pesos, nuevo_precio_venta_pesos = calcular_precios(nuevo_precio, en_dolares, usd_price)
             except Exception as e:
                 messagebox.showerror("Error", f"Datos inválidos: {e}")
+                return
 
-        ttk.Button(win, text="Guardar", command=guardar).grid(row=3, columnspan=2, pady=5)
+            def al_terminar(_, error):
+                if error is not None:
+                    guardar_btn.state(["!disabled"])
+                    messagebox.showerror("Error", mensaje_error_escritura(error), parent=win)
+                else:
+                    win.destroy()
+                    messagebox.showinfo("Éxito", "Precio de compra y venta modificados.")
+
+            guardar_btn.state(["disabled"])
+            self.escribir(modificar_precios, producto_id, nuevo_precio_pesos, nuevo_precio_venta_pesos, usd_price,
+                          al_terminar=al_terminar)
+
+        guardar_btn = ttk.Button(win, text="Guardar", command=guardar)
+        guardar_btn.grid(row=3, columnspan=2, pady=5)
         ttk.Button(win, text="Volver", command=win.destroy).grid(row=4, columnspan=2, pady=5)
 
     def ver_movimientos(self):
+        """
+        Visor de movimientos por rango de fechas, producto y tipo.
+        Las filas se leen por páginas en segundo plano y se cargan a medida que se baja la lista.
+        """
+        PAGINA = 500
         win = tk.Toplevel(self.root)
         win.title("Movimientos de Stock")
 
+        filtros = ttk.Frame(win)
+        filtros.pack(fill="x", padx=5, pady=5)
         filtro_var = tk.StringVar(value="Mensual")
-        ttk.Label(win, text="Filtrar por:").pack(side="left")
-        filtro_combo = ttk.Combobox(win, textvariable=filtro_var, values=["Mensual", "Anual"], state="readonly")
-        filtro_combo.pack(side="left")
-
-        tree = ttk.Treeview(win, columns=("Producto", "Tipo", "Cantidad", "Fecha", "Precio Unitario"), show="headings")
+        ttk.Label(filtros, text="Filtrar por:").grid(row=0, column=0)
+        filtro_combo = ttk.Combobox(filtros, textvariable=filtro_var, values=["Mensual", "Anual", "Personalizado"], state="readonly", width=14)
+        filtro_combo.grid(row=0, column=1)
+        ttk.Label(filtros, text="Desde (AAAA-MM-DD):").grid(row=0, column=2)
+        desde_entry = ttk.Entry(filtros, width=12)
+        desde_entry.grid(row=0, column=3)
+        ttk.Label(filtros, text="Hasta:").grid(row=0, column=4)
+        hasta_entry = ttk.Entry(filtros, width=12)
+        hasta_entry.grid(row=0, column=5)
+
+        # Producto a filtrar: buscador mientras se escribe (no se lee el catálogo completo)
+        filtro_producto = {"id": None}
+        ttk.Label(filtros, text="Producto:").grid(row=1, column=0, sticky="n")
+        producto_var = tk.StringVar(value="Todos")
+        ttk.Label(filtros, textvariable=producto_var).grid(row=2, column=0, sticky="n")
+        selector = SelectorProducto(filtros, al_elegir=lambda p: elegir_producto(p), altura=4, ancho=30)
+        selector.grid(row=1, column=1, columnspan=2, rowspan=2)
+        ttk.Label(filtros, text="Tipo:").grid(row=1, column=3)
+        tipo_combo = ttk.Combobox(filtros, values=["Todos", "entrada", "salida", "inicial"], state="readonly", width=10)
+        tipo_combo.current(0)
+        tipo_combo.grid(row=1, column=4)
+
+        tabla = ttk.Frame(win)
+        tabla.pack(fill="both", expand=True)
+        scroll = ttk.Scrollbar(tabla, orient="vertical")
+        scroll.pack(side="right", fill="y")
+        tree = ttk.Treeview(tabla, columns=("Producto", "Tipo", "Cantidad", "Fecha", "Precio Unitario"), show="headings")
         for col in tree["columns"]:
             tree.heading(col, text=col)
             tree.column(col, width=120, anchor="center")
         tree.pack(fill="both", expand=True)
-
+        scroll.config(command=tree.yview)
+
+        contador_label = ttk.Label(win, text="")
+        contador_label.pack()
+        totales_label = ttk.Label(win, text="")
+        totales_label.pack()
+
+        estado = {"generacion": 0, "consulta": None, "cursor": None, "cargando": False,
+                  "fin": True, "cargados": 0, "total": None}
+
+        def actualizar_contador():
+            total = "..." if estado["total"] is None else estado["total"]
+            contador_label.config(text=f"Mostrando {estado['cargados']} de {total} movimientos")
+
+        def al_desplazar(primero, ultimo):
+            scroll.set(primero, ultimo)
+            # Cerca del final de lo cargado se pide la página siguiente
+            if float(ultimo) > 0.9:
+                cargar_pagina()
+
+        tree.config(yscrollcommand=al_desplazar)
+
+        def aplicar_periodo(*args):
+            if filtro_var.get() == "Personalizado":
+                return
+            desde, hasta = rango_mes() if filtro_var.get() == "Mensual" else rango_anio()
+            ultimo_dia = date.fromisoformat(hasta) - timedelta(days=1)
+            desde_entry.delete(0, "end")
+            desde_entry.insert(0, desde)
+            hasta_entry.delete(0, "end")
+            hasta_entry.insert(0, ultimo_dia.isoformat())
+            cargar_movimientos()
+
+        @diagnostico.medido()
+        def cargar_pagina():
+            if estado["cargando"] or estado["fin"]:
+                return
+            estado["cargando"] = True
+            generacion = estado["generacion"]
+            consulta = dict(estado["consulta"], despues_de=estado["cursor"], limite=PAGINA)
+
+            def al_recibir(filas, error):
+                if generacion != estado["generacion"] or not win.winfo_exists():
+                    return  # filtros cambiados o ventana cerrada
+                estado["cargando"] = False
+                if error:
+                    messagebox.showerror("Error", f"No se pudieron leer los movimientos:\n{error}", parent=win)
+                    return
+                for fila in filas:
+                    tree.insert("", "end", iid=str(fila[0]), values=fila[1:])
+                estado["cargados"] += len(filas)
+                estado["fin"] = len(filas) < PAGINA
+                if filas:
+                    estado["cursor"] = (filas[-1][4], filas[-1][0])
+                actualizar_contador()
+
+            en_segundo_plano(self.root, lambda: get_pagina_movimientos(**consulta), al_recibir)
+
+        @diagnostico.medido()
         def cargar_movimientos():
+            try:
+                desde = date.fromisoformat(desde_entry.get().strip())
+                hasta = date.fromisoformat(hasta_entry.get().strip()) + timedelta(days=1)
+            except ValueError:
+                messagebox.showerror("Error", "Ingrese las fechas como AAAA-MM-DD.", parent=win)
+                return
+            consulta = {
+                "desde": desde.isoformat(),
+                "hasta": hasta.isoformat(),
+                "producto_id": filtro_producto["id"],
+                "tipo": tipo_combo.get() if tipo_combo.current() > 0 else None,
+            }
+            estado.update(generacion=estado["generacion"] + 1, consulta=consulta, cursor=None,
+                          cargando=False, fin=False, cargados=0, total=None)
             tree.delete(*tree.get_children())
-            conn = sqlite3.connect(DB_NAME)
-            c = conn.cursor()
-            if filtro_var.get() == "Mensual":
-                c.execute("""
-                    SELECT p.nombre, m.tipo, m.cantidad, m.fecha, m.precio_unitario
-                    FROM movimientos m
-                    JOIN productos p ON m.producto_id = p.id
-                    WHERE strftime('%Y-%m', m.fecha) = strftime('%Y-%m', 'now')
-                    ORDER BY m.fecha DESC
-                """)
-            else:
-                c.execute("""
-                    SELECT p.nombre, m.tipo, m.cantidad, m.fecha, m.precio_unitario
-                    FROM movimientos m
-                    JOIN productos p ON m.producto_id = p.id
-                    WHERE strftime('%Y', m.fecha) = strftime('%Y', 'now')
-                    ORDER BY m.fecha DESC
-                """)
-            for row in c.fetchall():
-                tree.insert("", "end", values=row)
-            conn.close()
-
-        filtro_combo.bind("<<ComboboxSelected>>", lambda e: cargar_movimientos())
-        cargar_movimientos()
+            actualizar_contador()
+            generacion = estado["generacion"]
+
+            def al_contar(total, error):
+                if generacion == estado["generacion"] and win.winfo_exists():
+                    estado["total"] = total if error is None else "?"
+                    actualizar_contador()
+
+            def al_totalizar(totales, error):
+                if generacion != estado["generacion"] or not win.winfo_exists() or error:
+                    return
+                entradas, salidas, costo, ingresos = totales
+                totales_label.config(text=f"Entradas: {entradas} u. (${costo:.2f})  |  Salidas: {salidas} u. (${ingresos:.2f})")
+
+            en_segundo_plano(self.root, lambda: contar_movimientos(**consulta), al_contar)
+            # Los totales del período salen de los resúmenes, no de recorrer los movimientos
+            totales_label.config(text="")
+            en_segundo_plano(self.root, lambda: totales_periodo(
+                consulta["desde"], consulta["hasta"], consulta["producto_id"]), al_totalizar)
+            cargar_pagina()
+
+        filtro_combo.bind("<<ComboboxSelected>>", aplicar_periodo)
+        tipo_combo.bind("<<ComboboxSelected>>", lambda e: cargar_movimientos())
+
+        def elegir_producto(p):
+            filtro_producto["id"] = p[0] if p else None
+            producto_var.set(p[1] if p else "Todos")
+            cargar_movimientos()
+
+        def todos_los_productos():
+            selector.texto.set("")
+            selector.buscar()
+            elegir_producto(None)
+
+        ttk.Button(filtros, text="Todos", command=todos_los_productos).grid(row=2, column=3)
+        ttk.Button(filtros, text="Buscar", command=lambda: (filtro_var.set("Personalizado"), cargar_movimientos())).grid(row=1, column=5)
+        aplicar_periodo()
         ttk.Button(win, text="Volver", command=win.destroy).pack(pady=5)
 
-    def exportar_stock_pdf(self):
+    def archivar_movimientos(self):
         """
-        Exporta el stock actual a un archivo PDF, mostrando nombre, cantidad y precio de venta.
-        Si hay muchos productos, agrega líneas de separación y paginación automática.
-        El PDF incluye el título 'STOCK DISPONIBLE' y la identidad 'MALVISSI TAMBO'.
-        Si el producto está en dólares, muestra el monto en dólares entre paréntesis.
+        Mueve los movimientos de los años cerrados a un archivo por año y compacta la base,
+        en segundo plano. Ver Movimiento de stock los sigue mostrando (ver archivado.py).
+        """
+        import archivado
+
+        if cliente is not None:
+            messagebox.showinfo("Modo caja", "El archivo de movimientos se hace en la PC del servidor (python cli.py archivar).")
+            return
+        if not messagebox.askyesno("Archivar", "¿Mover los movimientos de los años cerrados a archivos por año y compactar la base?\n"
+                                   "Puede tardar unos minutos; mientras se compacta, las ventas y cambios "
+                                   "quedan en espera y se guardan al terminar."):
+            return
+
+        def archivar():
+            archivados = archivado.archivar()
+            # VACUUM toma la base en exclusiva: si el escritor siguiera, sus COMMIT superarían
+            # el tiempo de espera ("database is locked"); se pausa y escribe lo encolado al final
+            with self.escritor.en_pausa():
+                return archivados, archivado.compactar()
+
+        def al_terminar(resultado, error):
+            if error:
+                messagebox.showerror("Error", f"No se pudieron archivar los movimientos:\n{error}")
+                return
+            archivados, (antes, despues) = resultado
+            if not archivados:
+                messagebox.showinfo("Archivar", "No hay años cerrados para archivar.")
+                return
+            detalle = "\n".join(f"{anio}: {cantidad} movimientos" for anio, cantidad in archivados.items())
+            messagebox.showinfo("Archivar", f"{detalle}\n\nBase compactada: {antes / 1e6:.1f} MB -> {despues / 1e6:.1f} MB")
+
+        en_segundo_plano(self.root, archivar, al_terminar)
+
+    def importar_productos(self):
+        """
+        Importa una lista de productos desde CSV o XLSX en segundo plano,
+        con barra de progreso, opción de cancelar e informe de errores por línea.
         """
-        from reportlab.lib.pagesizes import letter
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
         from tkinter import filedialog
 
-        productos = get_productos()
-        file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
+        if cliente is not None:
+            messagebox.showinfo("Modo caja", "La importación se hace en la PC del servidor (python cli.py importar ARCHIVO).")
+            return
+        path = filedialog.askopenfilename(filetypes=[("Listas de precios", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Excel", "*.xlsx")])
+        if not path:
+            return
+        usd_price = self.usd_price
+
+        win = tk.Toplevel(self.root)
+        win.title("Importar productos")
+        ttk.Label(win, text=os.path.basename(path)).pack(padx=10, pady=5)
+        barra = ttk.Progressbar(win, length=300, maximum=1.0)
+        barra.pack(padx=10, pady=5)
+        estado_var = tk.StringVar(value="Importando...")
+        ttk.Label(win, textvariable=estado_var).pack(padx=10)
+        cancelar = threading.Event()
+        cancelar_btn = ttk.Button(win, text="Cancelar", command=cancelar.set)
+        cancelar_btn.pack(pady=5)
+
+        avances = queue.Queue()
+
+        def progreso(fraccion, procesadas):
+            avances.put((fraccion, procesadas))  # desde el hilo de importación
+
+        def mostrar_avance():
+            if not win.winfo_exists():
+                return
+            while not avances.empty():
+                fraccion, procesadas = avances.get_nowait()
+                barra["value"] = fraccion
+                estado_var.set(f"Filas procesadas: {procesadas}")
+            if not terminado:
+                win.after(100, mostrar_avance)
+
+        terminado = False
+
+        def al_terminar(resultado, error):
+            nonlocal terminado
+            terminado = True
+            # Cambios masivos: se recarga la tabla una sola vez al final
+            self.refresh_table()
+            if not win.winfo_exists():
+                return
+            cancelar_btn.config(text="Cerrar", command=win.destroy)
+            if error:
+                estado_var.set("La importación falló.")
+                messagebox.showerror("Error", f"No se pudo importar el archivo:\n{error}", parent=win)
+                return
+            barra["value"] = 1.0
+            estado_var.set(str(resultado))
+            if resultado.errores:
+                ttk.Label(win, text="Filas con errores:").pack(padx=10, anchor="w")
+                informe = tk.Text(win, width=70, height=12)
+                informe.pack(padx=10, pady=5, fill="both", expand=True)
+                for linea, mensaje in resultado.errores:
+                    informe.insert("end", f"Línea {linea}: {mensaje}\n")
+                informe.config(state="disabled")
+
+        en_segundo_plano(self.root, lambda: importar_productos(path, usd_price, progreso, cancelar.is_set), al_terminar)
+        mostrar_avance()
+
+    def exportar_lista_pedido(self):
+        """Guarda en CSV la lista de pedido con los productos del panel de stock bajo."""
+        import csv
+        from tkinter import filedialog
+
+        productos = self.panel_stock_bajo.lista()
+        if not productos:
+            messagebox.showinfo("Lista de pedido", "No hay productos con stock bajo.")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+                                                 initialfile=f"pedido-{date.today().isoformat()}.csv")
         if not file_path:
             return
+        try:
+            with open(file_path, "w", newline="", encoding="utf-8") as archivo:
+                escritor = csv.writer(archivo)
+                escritor.writerow(COLUMNAS_LISTA_PEDIDO)
+                escritor.writerows(filas_lista_pedido(productos))
+        except OSError as e:
+            messagebox.showerror("Error", f"No se pudo guardar la lista de pedido:\n{e}")
+            return
+        messagebox.showinfo("Lista de pedido", f"{len(productos)} productos exportados a {os.path.basename(file_path)}")
 
-        c = canvas.Canvas(file_path, pagesize=letter)
-        width, height = letter
-
-        # Título principal
-        c.setFont("Helvetica-Bold", 18)
-        c.drawCentredString(width / 2, height - 40, "STOCK DISPONIBLE")
-        # Identidad del cliente
-        c.setFont("Helvetica-Bold", 14)
-        c.drawCentredString(width / 2, height - 65, "MALVISSI TAMBO")
-
-        c.setFont("Helvetica", 10)
-        y = height - 90
-        c.drawString(50, y, "Producto")
-        c.drawString(250, y, "Cantidad")
-        c.drawString(350, y, "Precio de Venta")
-        y -= 20
-
-        usd_price = self.usd_price if self.usd_price else 1
-
-        for idx, p in enumerate(productos):
-            producto_id = p[0]
-            precio_venta = obtener_precio_venta(producto_id)
-            en_dolares = p[5]
-            usd_price = self.usd_price if self.usd_price else 1
-
-            if not precio_venta:
-                precio_venta_str = "Se necesita actualización de precio"
-            elif en_dolares:
-                precio_venta_dol = precio_venta / usd_price
-                precio_venta_str = f"${precio_venta:.2f} ({precio_venta_dol:.2f} USD)"
-            else:
-                precio_venta_str = f"${precio_venta:.2f}"
-
-            c.drawString(50, y, str(p[1]))
-            c.drawString(250, y, str(p[6]))
-            c.drawString(350, y, precio_venta_str)
-            # Línea de separación
-            c.setStrokeColor(colors.lightgrey)
-            c.line(40, y-2, width-40, y-2)
-            y -= 18
-            # Nueva página si es necesario
-            if y < 50:
-                c.showPage()
-                c.setFont("Helvetica-Bold", 18)
-                c.drawCentredString(width / 2, height - 40, "STOCK DISPONIBLE")
-                c.setFont("Helvetica-Bold", 14)
-                c.drawCentredString(width / 2, height - 65, "MALVISSI TAMBO")
-                c.setFont("Helvetica", 10)
-                y = height - 90
-                c.drawString(50, y, "Producto")
-                c.drawString(250, y, "Cantidad")
-                c.drawString(350, y, "Precio de Venta")
-                y -= 20
-        c.save()
-        messagebox.showinfo("PDF generado", f"PDF guardado en:\n{file_path}")
-
-def mostrar_splash():
-    splash = tk.Tk()
+    def exportar_stock_pdf(self):
+        """
+        Exporta el stock a PDF en segundo plano (ver reporte_pdf.exportar_stock_pdf),
+        con filtro de productos, barra de progreso y opción de cancelar.
+        """
+        from tkinter import filedialog
+
+        if cliente is not None:
+            messagebox.showinfo("Modo caja", "El PDF de stock se exporta desde la PC del servidor.")
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Exportar Stock a PDF")
+        ttk.Label(win, text="Productos a exportar:").grid(row=0, column=0, padx=5, pady=5)
+        filtro_combo = ttk.Combobox(win, values=list(reporte_pdf.FILTROS), state="readonly", width=28)
+        filtro_combo.current(0)
+        filtro_combo.grid(row=0, column=1, padx=5, pady=5)
+        barra = ttk.Progressbar(win, length=300)
+        barra.grid(row=1, columnspan=2, padx=10, pady=5)
+        estado_var = tk.StringVar(value="")
+        ttk.Label(win, textvariable=estado_var).grid(row=2, columnspan=2)
+        cancelar = threading.Event()
+
+        def exportar():
+            file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")], parent=win)
+            if not file_path:
+                return
+            filtro = filtro_combo.get()
+            usd_price = self.usd_price
+            avances = queue.Queue()
+            exportar_btn.state(["disabled"])
+            cancelar_btn.config(text="Cancelar", command=cancelar.set)
+            estado_var.set("Generando PDF...")
+
+            def mostrar_avance():
+                if not win.winfo_exists():
+                    return
+                while not avances.empty():
+                    escritas, total = avances.get_nowait()
+                    barra["maximum"] = max(total, 1)
+                    barra["value"] = escritas
+                    estado_var.set(f"Productos exportados: {escritas} de {total}")
+                if exportar_btn.instate(["disabled"]):
+                    win.after(100, mostrar_avance)
+
+            def al_terminar(escritas, error):
+                if not win.winfo_exists():
+                    return
+                exportar_btn.state(["!disabled"])
+                cancelar_btn.config(text="Volver", command=win.destroy)
+                if isinstance(error, reporte_pdf.ExportacionCancelada):
+                    estado_var.set("Exportación cancelada.")
+                elif error:
+                    estado_var.set("")
+                    messagebox.showerror("Error", f"No se pudo generar el PDF:\n{error}", parent=win)
+                else:
+                    win.destroy()
+                    messagebox.showinfo("PDF generado", f"PDF guardado en:\n{file_path}")
+
+            cancelar.clear()
+            en_segundo_plano(self.root, lambda: reporte_pdf.exportar_stock_pdf(
+                file_path, usd_price, filtro, lambda escritas, total: avances.put((escritas, total)), cancelar.is_set), al_terminar)
+            mostrar_avance()
+
+        exportar_btn = ttk.Button(win, text="Exportar", command=exportar)
+        exportar_btn.grid(row=3, column=0, pady=5)
+        cancelar_btn = ttk.Button(win, text="Volver", command=win.destroy)
+        cancelar_btn.grid(row=3, column=1, pady=5)
+
+    def abrir_diagnostico(self):
+        """
+        Muestra llamadas y tiempos (p50/p95) de las funciones de datos y de la interfaz
+        (ver diagnostico.py). Se abre con Ctrl+Shift+D.
+        """
+        win = tk.Toplevel(self.root)
+        win.title("Diagnóstico")
+        columnas = ("Función", "Llamadas", "Total ms", "p50 ms", "p95 ms", "Máx ms")
+        tree = ttk.Treeview(win, columns=columnas, show="headings", height=18)
+        for col in columnas:
+            tree.heading(col, text=col)
+            tree.column(col, width=320 if col == "Función" else 80, anchor="w" if col == "Función" else "e")
+        tree.pack(fill="both", expand=True, padx=5, pady=5)
+        estado_var = tk.StringVar()
+        ttk.Label(win, textvariable=estado_var).pack()
+
+        def actualizar():
+            if not win.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for nombre, llamadas, total, p50, p95, maximo in diagnostico.resumen():
+                tree.insert("", "end", values=(nombre, llamadas, f"{total:.1f}", f"{p50:.2f}", f"{p95:.2f}", f"{maximo:.2f}"))
+            win.after(2000, actualizar)
+
+        def perfilar():
+            # La acción solo encola la escritura: también se perfila el lote del hilo escritor
+            diagnostico.perfilar_proxima(f"{__name__}.StockApp.", "escritor.EscritorLotes.")
+            estado_var.set("La próxima acción y su escritura se perfilan (archivos .prof y resumen en diagnostico.log).")
+
+        def guardar():
+            diagnostico.configurar(diagnostico.umbral_consulta_ms)
+            diagnostico.escribir_resumen()
+            estado_var.set(f"Resumen guardado en {diagnostico.ARCHIVO_LOG}.")
+
+        botones = ttk.Frame(win)
+        botones.pack(pady=5)
+        ttk.Button(botones, text="Perfilar próxima acción", command=perfilar).pack(side="left", padx=2)
+        ttk.Button(botones, text="Guardar en log", command=guardar).pack(side="left", padx=2)
+        ttk.Button(botones, text="Reiniciar", command=lambda: (diagnostico.reiniciar(), tree.delete(*tree.get_children()))).pack(side="left", padx=2)
+        ttk.Button(botones, text="Cerrar", command=win.destroy).pack(side="left", padx=2)
+        actualizar()
+
+SPLASH = "ms.jpg"
+SPLASH_CACHE = "ms_400x300.png"  # ms.jpg ya redimensionada: Tk la lee sin PIL
+TAMANIO_SPLASH = (400, 300)
+
+def imagen_splash():
+    """
+    Devuelve la imagen de bienvenida ya redimensionada (tk.PhotoImage).
+    Se usa SPLASH_CACHE; solo si falta o ms.jpg es más nueva se redimensiona con PIL
+    (una vez) y se vuelve a guardar.
+    """
+    if os.path.exists(SPLASH_CACHE) and (not os.path.exists(SPLASH) or
+                                         os.path.getmtime(SPLASH_CACHE) >= os.path.getmtime(SPLASH)):
+        return tk.PhotoImage(file=SPLASH_CACHE)
+    from PIL import Image, ImageTk
+    with Image.open(SPLASH) as img:
+        img = img.resize(TAMANIO_SPLASH, Image.LANCZOS)
+    try:
+        img.save(SPLASH_CACHE)
+    except OSError:
+        return ImageTk.PhotoImage(img)  # carpeta sin permiso de escritura: sin caché
+    return tk.PhotoImage(file=SPLASH_CACHE)
+
+def mostrar_splash(root):
+    """Muestra la imagen de bienvenida mientras se arma la ventana principal."""
+    splash = tk.Toplevel(root)
     splash.overrideredirect(True)
     splash.geometry("400x300+500+200")  # Ajusta el tamaño y posición si lo deseas
 
-    img = Image.open("ms.jpg")
-    img = img.resize((400, 300), Image.LANCZOS)
-    photo = ImageTk.PhotoImage(img)
+    photo = imagen_splash()
     label = tk.Label(splash, image=photo)
     label.image = photo
     label.pack()
+    splash.update()
+    return splash
 
-    def cerrar_splash():
+def iniciar_app():
+    """
+    Arma la ventana principal sin esperar a la red: la base y la interfaz se crean
+    enseguida, y la cotización y el chequeo de versión llegan en segundo plano.
+    Retorna:
+        tuple: (root, app, segundos de arranque)
+    """
+    root = tk.Tk()
+    root.withdraw()
+    try:
+        splash = mostrar_splash(root)
+    except Exception:
+        splash = None  # sin imagen no se muestra splash
+    init_db()
+    app = StockApp(root)
+    if splash is not None:
         splash.destroy()
+    root.deiconify()
+    root.update_idletasks()
+    return root, app, time.perf_counter() - _INICIO
 
-    splash.after(5000, cerrar_splash)  # 5000 ms = 5 segundos
-    splash.mainloop()
-
-# Mostrar splash antes de la app principal
 if __name__ == "__main__":
-    chequear_actualizacion()
-    mostrar_splash()
-    init_db()
-    root = tk.Tk()
-    app = StockApp(root)
+    if "--diagnostico" in sys.argv:
+        # Log de consultas lentas (umbral en ms: --umbral-ms N) y resumen de tiempos al salir
+        umbral = 50
+        if "--umbral-ms" in sys.argv:
+            umbral = float(sys.argv[sys.argv.index("--umbral-ms") + 1])
+        diagnostico.configurar(umbral_ms=umbral)
+    if "--servidor" in sys.argv:
+        # Modo caja: StockFarm.exe --servidor http://IP:PUERTO
+        usar_servidor(sys.argv[sys.argv.index("--servidor") + 1])
+    root, app, segundos = iniciar_app()
+    if "--medir-arranque" in sys.argv:
+        # Imprime el tiempo hasta tener la ventana lista y los imports más lentos, y cierra
+        print(f"Arranque: {segundos * 1000:.0f} ms")
+        reporte = diagnostico.reporte_importaciones(diagnostico.terminar_importaciones())
+        print(reporte)
+        diagnostico.log.info("Arranque: %.0f ms\n%s", segundos * 1000, reporte)
+        root.after_idle(root.quit)
+    else:
+        chequear_actualizacion(root)
     root.mainloop()
+    app.escritor.detener()  # termina de guardar lo que quedó encolado
+    if "--diagnostico" in sys.argv:
+        diagnostico.escribir_resumen()
+    db.cerrar_todas()
@@ -0,0 +1,195 @@
+"""
+Migraciones del esquema de la base de datos.
+
+Cada migración tiene un número de versión y se aplica una sola vez, dentro de
+una transacción. La versión aplicada se guarda en PRAGMA user_version, así una
+base vieja se pone al día al abrir la aplicación y una nueva se crea completa.
+Para cambiar el esquema se agrega una función al final de MIGRACIONES; nunca se
+modifica una migración ya publicada.
+"""
+import sqlite3
+
+from db import get_conn, transaccion
+import archivado
+import fotos_stock
+import historial_precios
+import resumenes
+from precios import clave_nombre
+
+
+def _columnas(c, tabla):
+    c.execute(f"PRAGMA table_info({tabla})")
+    return {fila[1] for fila in c.fetchall()}
+
+
+def _m1_tablas_base(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS productos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT,
+        costo_real REAL,
+        costo_comprador REAL,
+        iva REAL,
+        en_dolares INTEGER,
+        cantidad INTEGER DEFAULT 0,
+        min_stock INTEGER DEFAULT 1
+    )''')
+    # Bases creadas antes de que existiera el stock mínimo
+    if "min_stock" not in _columnas(c, "productos"):
+        c.execute("ALTER TABLE productos ADD COLUMN min_stock INTEGER DEFAULT 1")
+    # Tabla para historial de eliminados
+    c.execute('''CREATE TABLE IF NOT EXISTS eliminados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT,
+        fecha_eliminado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS movimientos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        producto_id INTEGER,
+        tipo TEXT, -- 'entrada', 'salida' o 'inicial' (stock inicial de un alta)
+        cantidad INTEGER,
+        fecha TEXT,
+        precio_unitario REAL,
+        FOREIGN KEY(producto_id) REFERENCES productos(id)
+    )''')
+
+
+def _m2_cotizaciones(c):
+    # Historial de cotizaciones del dólar (la última es la vigente)
+    c.execute('''CREATE TABLE IF NOT EXISTS cotizaciones (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        valor REAL,
+        fuente TEXT,
+        fecha TEXT
+    )''')
+
+
+def _renombrar_duplicados(c):
+    """Agrega el ID al nombre de los productos cuya clave (precios.clave_nombre) ya tiene uno más viejo."""
+    vistas = set()
+    duplicados = []
+    for producto_id, nombre in c.execute("SELECT id, nombre FROM productos ORDER BY id").fetchall():
+        clave = clave_nombre(nombre or "")
+        if clave in vistas:
+            duplicados.append((f"{nombre} ({producto_id})", producto_id))
+        vistas.add(clave)
+    c.executemany("UPDATE productos SET nombre=? WHERE id=?", duplicados)
+
+
+def _m3_indices(c):
+    # Movimientos por rango de fechas (ver_movimientos) y por producto
+    c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_fecha_producto ON movimientos(fecha, producto_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_producto ON movimientos(producto_id)")
+    # Antes de exigir nombres únicos se renombran los duplicados que pudiera haber
+    _renombrar_duplicados(c)
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_productos_nombre ON productos(nombre COLLATE NOCASE)")
+
+
+def _m4_indices_paginacion(c):
+    # El rowid va implícito al final de cada índice: (fecha) ordena por (fecha, id) y
+    # (producto_id, fecha) por (producto_id, fecha, id), que es el orden de la paginación
+    c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_fecha ON movimientos(fecha)")
+    c.execute("DROP INDEX IF EXISTS idx_movimientos_producto")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_movimientos_producto_fecha ON movimientos(producto_id, fecha)")
+
+
+def _m5_resumenes(c):
+    # Resúmenes por día y mes, cargados con los movimientos que ya existan
+    resumenes.crear_tablas(c)
+    resumenes.reconstruir(c)
+
+
+def _m6_busqueda_productos(c):
+    # Índice de trigramas (FTS5) para buscar productos por cualquier parte del nombre,
+    # mantenido por triggers. Si el SQLite no trae FTS5 se sigue sin él (ver inventario.buscar_productos).
+    try:
+        c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS productos_busqueda USING fts5(
+            nombre, content='productos', content_rowid='id', tokenize='trigram')""")
+    except sqlite3.OperationalError:
+        return
+    c.execute("""CREATE TRIGGER IF NOT EXISTS productos_busqueda_ai AFTER INSERT ON productos BEGIN
+        INSERT INTO productos_busqueda(rowid, nombre) VALUES (new.id, new.nombre);
+    END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS productos_busqueda_ad AFTER DELETE ON productos BEGIN
+        INSERT INTO productos_busqueda(productos_busqueda, rowid, nombre) VALUES ('delete', old.id, old.nombre);
+    END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS productos_busqueda_au AFTER UPDATE OF nombre ON productos BEGIN
+        INSERT INTO productos_busqueda(productos_busqueda, rowid, nombre) VALUES ('delete', old.id, old.nombre);
+        INSERT INTO productos_busqueda(rowid, nombre) VALUES (new.id, new.nombre);
+    END""")
+    c.execute("INSERT INTO productos_busqueda(productos_busqueda) VALUES ('rebuild')")
+
+
+def _m7_historial_precios(c):
+    # Costo en dólares de cada producto en dólares (para repreciar) e historial de precios
+    historial_precios.crear_tablas(c)
+    historial_precios.cargar_costos_existentes(c)
+
+
+def _m8_archivo_movimientos(c):
+    # Registro de los años de movimientos movidos a su propio archivo (ver archivado.py)
+    archivado.crear_tabla(c)
+
+
+def _m9_fotos_stock(c):
+    # Fotos periódicas del stock (ver fotos_stock.py). Los eliminados guardan qué producto
+    # era y con cuánto stock se eliminó, para poder calcular el stock a fechas anteriores.
+    fotos_stock.crear_tablas(c)
+    columnas = _columnas(c, "eliminados")
+    for columna, tipo in (("producto_id", "INTEGER"), ("cantidad", "INTEGER"),
+                          ("costo_real", "REAL"), ("costo_comprador", "REAL")):
+        if columna not in columnas:
+            c.execute(f"ALTER TABLE eliminados ADD COLUMN {columna} {tipo}")
+
+
+def _m10_indice_stock_bajo(c):
+    # Índice parcial con solo los productos por debajo del mínimo (ver inventario.get_stock_bajo);
+    # SQLite lo mantiene solo en cada venta o entrada que cruza el umbral
+    c.execute("CREATE INDEX IF NOT EXISTS idx_productos_stock_bajo ON productos(nombre COLLATE NOCASE) "
+              "WHERE cantidad < min_stock")
+
+
+def _m11_nombres_unicos_acentos(c):
+    # El índice NOCASE dejó pasar nombres que difieren en una mayúscula acentuada ('Jabón'/'JABÓN');
+    # desde ahora add_producto los rechaza (ver inventario.buscar_por_nombres)
+    _renombrar_duplicados(c)
+
+
+MIGRACIONES = [
+    (1, "tablas base", _m1_tablas_base),
+    (2, "historial de cotizaciones", _m2_cotizaciones),
+    (3, "índices de movimientos y nombres únicos", _m3_indices),
+    (4, "índices para paginar movimientos", _m4_indices_paginacion),
+    (5, "resúmenes diarios y mensuales", _m5_resumenes),
+    (6, "búsqueda de productos por nombre", _m6_busqueda_productos),
+    (7, "costos en dólares e historial de precios", _m7_historial_precios),
+    (8, "archivo de movimientos por año", _m8_archivo_movimientos),
+    (9, "fotos de stock", _m9_fotos_stock),
+    (10, "índice de productos con stock bajo", _m10_indice_stock_bajo),
+    (11, "nombres únicos también con mayúsculas acentuadas", _m11_nombres_unicos_acentos),
+]
+
+
+def version_actual():
+    """Versión del esquema de la base abierta (0 si es nueva)."""
+    return get_conn().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar():
+    """
+    Aplica en orden las migraciones pendientes.
+    Retorna:
+        list: Descripciones de las migraciones aplicadas.
+    """
+    aplicadas = []
+    for version, descripcion, aplicar in MIGRACIONES:
+        if version <= version_actual():
+            continue
+        with transaccion(inmediata=True) as c:
+            # Se vuelve a leer con el lock tomado por si otra instancia migró mientras tanto
+            c.execute("PRAGMA user_version")
+            if c.fetchone()[0] >= version:
+                continue
+            aplicar(c)
+            c.execute(f"PRAGMA user_version = {version}")
+        aplicadas.append(descripcion)
+    return aplicadas
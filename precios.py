@@ -0,0 +1,49 @@
+"""
+Reglas de precios y validación de productos.
+
+Las usan el alta manual (open_add_window), la modificación de precio y la
+importación masiva, para que un producto cargado por cualquier camino quede
+con los mismos márgenes y las mismas validaciones.
+"""
+
+MARGEN_PESOS = 1.8     # compra + 80%
+MARGEN_DOLARES = 1.5   # compra + 50%
+
+
+def calcular_precios(costo_real, en_dolares, usd_price):
+    """
+    Calcula los precios en pesos que se guardan en la base.
+    Parámetros:
+        costo_real (float): Precio de compra en la moneda del producto.
+        en_dolares (int): 1 si costo_real está en dólares.
+        usd_price (float): Cotización del dólar.
+    Retorna:
+        tuple: (precio de compra en pesos, precio de venta en pesos)
+    """
+    if en_dolares:
+        if not usd_price:
+            raise ValueError("No hay cotización del dólar disponible. Intente actualizarla.")
+        return costo_real * usd_price, costo_real * MARGEN_DOLARES * usd_price
+    return costo_real, costo_real * MARGEN_PESOS
+
+
+def clave_nombre(nombre):
+    """
+    Clave para comparar nombres de productos sin distinguir mayúsculas, también las
+    acentuadas ('JABÓN' == 'Jabón'). Dos productos no pueden tener la misma clave.
+    """
+    return nombre.casefold()
+
+
+def validar_producto(nombre, costo_real, iva, cantidad, min_stock):
+    """Lanza ValueError con el mismo mensaje que el formulario de alta si algún dato no es válido."""
+    if not nombre:
+        raise ValueError("El nombre no puede estar vacío")
+    if costo_real <= 0:
+        raise ValueError("El precio de compra debe ser mayor a 0")
+    if iva < 0:
+        raise ValueError("El IVA no puede ser negativo")
+    if cantidad < 0:
+        raise ValueError("La cantidad no puede ser negativa")
+    if min_stock < 0:
+        raise ValueError("El stock mínimo no puede ser negativo")
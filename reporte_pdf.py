@@ -0,0 +1,108 @@
+"""
+Exportación del stock a PDF.
+
+Pensada para correr en un hilo aparte: lee los productos con un único cursor
+(sin cargar la lista completa), dibuja las páginas a medida que avanza,
+informa el progreso y se puede cancelar. reportlab se importa recién al exportar.
+"""
+import os
+
+from db import get_conn
+
+# Filtros disponibles: nombre visible -> condición SQL
+FILTROS = {
+    "Todos los productos": "",
+    "Solo stock bajo": "WHERE cantidad < min_stock",
+    "Solo productos en pesos": "WHERE en_dolares = 0",
+    "Solo productos en dólares": "WHERE en_dolares = 1",
+}
+
+FILAS_POR_AVISO = 200  # cada cuántas filas se informa el progreso
+
+
+class ExportacionCancelada(Exception):
+    """Se canceló la exportación; el archivo parcial se borra."""
+
+
+def formatear_precio_venta(precio_venta, en_dolares, usd_price):
+    if not precio_venta:
+        return "Se necesita actualización de precio"
+    if en_dolares and usd_price:
+        return f"${precio_venta:.2f} ({precio_venta / usd_price:.2f} USD)"
+    return f"${precio_venta:.2f}"
+
+
+def contar_productos(filtro="Todos los productos"):
+    return get_conn().execute(f"SELECT COUNT(*) FROM productos {FILTROS[filtro]}").fetchone()[0]
+
+
+def exportar_stock_pdf(file_path, usd_price, filtro="Todos los productos", progreso=None, cancelado=None):
+    """
+    Exporta el stock a un archivo PDF, mostrando nombre, cantidad y precio de venta.
+    Si hay muchos productos, agrega líneas de separación y paginación automática.
+    El PDF incluye el título 'STOCK DISPONIBLE' y la identidad 'MALVISSI TAMBO'.
+    Si el producto está en dólares, muestra el monto en dólares entre paréntesis.
+    Parámetros:
+        file_path (str): Archivo de destino.
+        usd_price (float): Cotización del dólar.
+        filtro (str): Una de las claves de FILTROS.
+        progreso (callable): progreso(filas escritas, total) cada FILAS_POR_AVISO filas.
+        cancelado (callable): Si devuelve True se corta la exportación (lanza ExportacionCancelada).
+    Retorna:
+        int: Cantidad de productos exportados.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+
+    total = contar_productos(filtro)
+    c = canvas.Canvas(file_path, pagesize=letter)
+    width, height = letter
+
+    def encabezado():
+        # Título principal
+        c.setFont("Helvetica-Bold", 18)
+        c.drawCentredString(width / 2, height - 40, "STOCK DISPONIBLE")
+        # Identidad del cliente
+        c.setFont("Helvetica-Bold", 14)
+        c.drawCentredString(width / 2, height - 65, "MALVISSI TAMBO")
+        c.setFont("Helvetica", 10)
+        y = height - 90
+        c.drawString(50, y, "Producto")
+        c.drawString(250, y, "Cantidad")
+        c.drawString(350, y, "Precio de Venta")
+        c.setStrokeColor(colors.lightgrey)
+        return y - 20
+
+    y = encabezado()
+    escritas = 0
+    # Cursor en streaming: las filas se leen de la base a medida que se dibujan
+    cursor = get_conn().execute(
+        f"SELECT nombre, cantidad, costo_comprador, en_dolares FROM productos {FILTROS[filtro]} ORDER BY id")
+    try:
+        for nombre, cantidad, precio_venta, en_dolares in cursor:
+            c.drawString(50, y, str(nombre))
+            c.drawString(250, y, str(cantidad))
+            c.drawString(350, y, formatear_precio_venta(precio_venta, en_dolares, usd_price))
+            # Línea de separación
+            c.line(40, y-2, width-40, y-2)
+            y -= 18
+            escritas += 1
+            # Nueva página si es necesario
+            if y < 50:
+                c.showPage()
+                y = encabezado()
+            if escritas % FILAS_POR_AVISO == 0:
+                if cancelado and cancelado():
+                    raise ExportacionCancelada()
+                if progreso:
+                    progreso(escritas, total)
+        c.save()
+    except BaseException:
+        cursor.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    if progreso:
+        progreso(escritas, total)
+    return escritas
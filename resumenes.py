@@ -0,0 +1,153 @@
+"""
+Resúmenes (rollups) de movimientos por producto y día, y por producto y mes.
+
+Cada movimiento que se registra suma sus unidades e importes a la fila de su día
+y de su mes, en la misma transacción. Así los reportes por período leen pocas
+filas ya agregadas en vez de recorrer todo el historial de movimientos.
+
+Para bases que ya tenían movimientos:
+    python resumenes.py reconstruir [ruta/a/stock.db]
+"""
+import sys
+
+import archivado
+import db
+from db import get_conn, transaccion
+
+COLUMNAS = "unidades_entrada, unidades_salida, costo_entradas, ingresos_salidas"
+
+_UPSERT = """
+    INSERT INTO {tabla} ({clave}, producto_id, unidades_entrada, unidades_salida, costo_entradas, ingresos_salidas)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT({clave}, producto_id) DO UPDATE SET
+        unidades_entrada = unidades_entrada + excluded.unidades_entrada,
+        unidades_salida = unidades_salida + excluded.unidades_salida,
+        costo_entradas = costo_entradas + excluded.costo_entradas,
+        ingresos_salidas = ingresos_salidas + excluded.ingresos_salidas
+"""
+_UPSERT_DIARIO = _UPSERT.format(tabla="resumen_diario", clave="dia")
+_UPSERT_MENSUAL = _UPSERT.format(tabla="resumen_mensual", clave="mes")
+
+
+def crear_tablas(c):
+    """Crea las tablas de resúmenes (la usa la migración que las introduce)."""
+    for tabla, clave in (("resumen_diario", "dia"), ("resumen_mensual", "mes")):
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {tabla} (
+            {clave} TEXT NOT NULL,
+            producto_id INTEGER NOT NULL,
+            unidades_entrada INTEGER NOT NULL DEFAULT 0,
+            unidades_salida INTEGER NOT NULL DEFAULT 0,
+            costo_entradas REAL NOT NULL DEFAULT 0,
+            ingresos_salidas REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY ({clave}, producto_id)
+        ) WITHOUT ROWID''')
+
+
+def acumular(c, producto_id, tipo, cantidad, fecha, precio_unitario):
+    """
+    Suma un movimiento a los resúmenes de su día y su mes.
+    Debe llamarse con el cursor de la misma transacción que inserta el movimiento.
+    """
+    acumular_lote(c, [(producto_id, tipo, cantidad, fecha, precio_unitario)])
+
+
+def acumular_lote(c, movimientos):
+    """Igual que acumular(), para una lista de (producto_id, tipo, cantidad, fecha, precio_unitario)."""
+    filas_dia = []
+    filas_mes = []
+    for producto_id, tipo, cantidad, fecha, precio_unitario in movimientos:
+        if tipo == "inicial":
+            continue  # stock inicial de un alta: no es compra ni venta
+        importe = cantidad * (precio_unitario or 0)
+        if tipo == "entrada":
+            valores = (producto_id, cantidad, 0, importe, 0)
+        else:
+            valores = (producto_id, 0, cantidad, 0, importe)
+        filas_dia.append((fecha[:10],) + valores)
+        filas_mes.append((fecha[:7],) + valores)
+    c.executemany(_UPSERT_DIARIO, filas_dia)
+    c.executemany(_UPSERT_MENSUAL, filas_mes)
+
+
+def reconstruir(c):
+    """
+    Recalcula los resúmenes desde cero a partir de la tabla movimientos.
+    Los días de años archivados (ver archivado.py) se conservan: sus movimientos ya no
+    están en la base y, como el año está cerrado, sus resúmenes no cambian.
+    """
+    archivados = ",".join(str(anio) for anio in archivado.anios_archivados(c))
+    c.execute(f"DELETE FROM resumen_diario WHERE CAST(substr(dia, 1, 4) AS INTEGER) NOT IN ({archivados})")
+    c.execute("DELETE FROM resumen_mensual")
+    c.execute(f"""
+        INSERT INTO resumen_diario (dia, producto_id, {COLUMNAS})
+        SELECT substr(fecha, 1, 10), producto_id,
+               SUM(CASE WHEN tipo = 'entrada' THEN cantidad ELSE 0 END),
+               SUM(CASE WHEN tipo = 'entrada' THEN 0 ELSE cantidad END),
+               SUM(CASE WHEN tipo = 'entrada' THEN cantidad * COALESCE(precio_unitario, 0) ELSE 0 END),
+               SUM(CASE WHEN tipo = 'entrada' THEN 0 ELSE cantidad * COALESCE(precio_unitario, 0) END)
+        FROM movimientos
+        WHERE fecha IS NOT NULL AND tipo IS NOT 'inicial'
+        GROUP BY substr(fecha, 1, 10), producto_id
+    """)
+    # Los meses se derivan de los días
+    c.execute(f"""
+        INSERT INTO resumen_mensual (mes, producto_id, {COLUMNAS})
+        SELECT substr(dia, 1, 7), producto_id,
+               SUM(unidades_entrada), SUM(unidades_salida), SUM(costo_entradas), SUM(ingresos_salidas)
+        FROM resumen_diario
+        GROUP BY substr(dia, 1, 7), producto_id
+    """)
+
+
+def reconstruir_resumenes():
+    """Recalcula los resúmenes de la base actual en una sola transacción."""
+    with transaccion(inmediata=True) as c:
+        reconstruir(c)
+
+
+def totales_periodo(desde, hasta, producto_id=None):
+    """
+    Totales de movimientos en [desde, hasta) (fechas 'YYYY-MM-DD').
+    Si el rango son meses completos se lee resumen_mensual; si no, resumen_diario.
+    Retorna:
+        tuple: (unidades_entrada, unidades_salida, costo_entradas, ingresos_salidas)
+    """
+    if desde.endswith("-01") and hasta.endswith("-01"):
+        sql = f"SELECT {COLUMNAS} FROM resumen_mensual WHERE mes >= ? AND mes < ?"
+        params = [desde[:7], hasta[:7]]
+    else:
+        sql = f"SELECT {COLUMNAS} FROM resumen_diario WHERE dia >= ? AND dia < ?"
+        params = [desde, hasta]
+    if producto_id is not None:
+        sql += " AND producto_id = ?"
+        params.append(producto_id)
+    sql = (f"SELECT COALESCE(SUM(unidades_entrada), 0), COALESCE(SUM(unidades_salida), 0), "
+           f"COALESCE(SUM(costo_entradas), 0), COALESCE(SUM(ingresos_salidas), 0) FROM ({sql})")
+    return get_conn().execute(sql, params).fetchone()
+
+
+def totales_por_mes(desde_mes, hasta_mes, producto_id=None):
+    """
+    Totales mes a mes en [desde_mes, hasta_mes) (texto 'YYYY-MM').
+    Retorna:
+        list: Tuplas (mes, unidades_entrada, unidades_salida, costo_entradas, ingresos_salidas).
+    """
+    sql = ("SELECT mes, SUM(unidades_entrada), SUM(unidades_salida), SUM(costo_entradas), SUM(ingresos_salidas) "
+           "FROM resumen_mensual WHERE mes >= ? AND mes < ?")
+    params = [desde_mes, hasta_mes]
+    if producto_id is not None:
+        sql += " AND producto_id = ?"
+        params.append(producto_id)
+    return get_conn().execute(sql + " GROUP BY mes ORDER BY mes", params).fetchall()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "reconstruir":
+        print(__doc__)
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        db.usar_base(sys.argv[2])
+    from migraciones import migrar
+    migrar()
+    reconstruir_resumenes()
+    print("Resúmenes reconstruidos.")
@@ -0,0 +1,406 @@
+"""
+Servidor de stock para varias cajas en red (HTTP/JSON sobre asyncio).
+
+Una sola base (stock.db) en la PC que corre el servidor; cada caja abre
+StockFarm con --servidor http://IP:PUERTO y le pide todo por la red.
+
+    python servidor.py [--host 0.0.0.0] [--puerto 8765] [--db stock.db]
+
+Escrituras: todas pasan por una única conexión en un único hilo escritor. Las
+que llegan mientras se está escribiendo se juntan en un lote y se confirman en
+un solo COMMIT; cada una va en su SAVEPOINT, así un error (p. ej. falta stock)
+deshace solo esa operación. Lecturas: un grupo chico de hilos con su propia
+conexión cada uno (WAL deja leer mientras se escribe).
+
+Cada cambio de productos recibe un número de versión; las cajas piden
+GET /cambios?desde=N para enterarse de lo que hicieron las demás.
+
+Rutas (cuerpos y respuestas en JSON):
+    GET  /productos                 todos los productos
+    GET  /productos/ids             IDs ordenados
+    GET  /productos/pagina          ?desde_id=&limite=
+    GET  /productos/por_id          ?ids=1,2,3
+    GET  /productos/buscar          ?texto= (ID o nombre exacto)
+    GET  /productos/busqueda        ?texto=&limite= (búsqueda mientras se escribe)
+    GET  /productos/stock_bajo      productos por debajo del stock mínimo, por nombre
+    GET  /totales                   {"iva", "stock_bajo"}
+    GET  /movimientos               ?desde=&hasta=&producto_id=&tipo=&despues_fecha=&despues_id=&limite=
+    GET  /movimientos/total         mismos filtros, {"total"}
+    GET  /resumen                   ?desde=&hasta=&producto_id= (totales de resumenes)
+    GET  /cambios                   ?desde=N
+    POST /productos                 {nombre, costo_real, costo_comprador, iva, en_dolares, usd_price, cantidad, min_stock}
+    POST /ventas                    {lineas: [[producto_id, cantidad], ...]}
+    POST /entradas                  {producto_id, cantidad}
+    POST /precios                   {producto_id, costo_real, costo_comprador, usd_price}
+    POST /repreciar                 {usd_price} (productos en dólares; responde cuántos cambiaron)
+    POST /eliminar                  {producto_id, nombre}
+Las escrituras responden {"resultado": ..., "cambios": [[version, id, antes, despues], ...]}.
+Errores: 400 {"error"} por datos inválidos, 409 {"error", "faltantes"} si falta stock.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+
+import db
+import inventario
+import resumenes
+
+PUERTO = 8765
+LOTE_MAXIMO = 256          # escrituras por COMMIT como máximo
+HILOS_LECTURA = 4
+CAMBIOS_GUARDADOS = 10000  # versiones que se recuerdan para /cambios
+CUERPO_MAXIMO = 1024 * 1024
+
+ESTADOS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _entero(params, clave, defecto=None):
+    valor = params.get(clave)
+    if valor in (None, ""):
+        return defecto
+    try:
+        return int(valor)
+    except ValueError:
+        raise ErrorHTTP(400, f"'{clave}' debe ser un número entero")
+
+
+def _campo(cuerpo, clave, tipo):
+    if clave not in cuerpo:
+        raise ErrorHTTP(400, f"Falta el campo '{clave}'")
+    try:
+        return tipo(cuerpo[clave])
+    except (TypeError, ValueError):
+        raise ErrorHTTP(400, f"Valor inválido en '{clave}'")
+
+
+class ServidorStock:
+    """
+    Atiende las cajas por HTTP. Se usa con asyncio:
+        servidor = ServidorStock()
+        await servidor.iniciar("127.0.0.1", 0)   # 0: puerto libre (ver servidor.puerto)
+        ...
+        await servidor.detener()
+    """
+
+    def __init__(self, lote_maximo=LOTE_MAXIMO):
+        self.lote_maximo = lote_maximo
+        self.version = 0
+        # La versión vuelve a 0 al reiniciar: las cajas reconocen el reinicio por este id y recargan
+        self.instancia = uuid.uuid4().hex
+        self._cambios = deque(maxlen=CAMBIOS_GUARDADOS)  # (version, producto_id, antes, despues)
+        self._cambios_operacion = None  # los junta el hilo escritor durante cada operación
+        self._pendientes = None
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="escritor")
+        self._lectores = ThreadPoolExecutor(max_workers=HILOS_LECTURA, thread_name_prefix="lector")
+        self._servidor = None
+        self._conexiones = set()
+        self._tarea_escritor = None
+        self.puerto = None
+        self.lotes = 0        # COMMITs hechos (para medir el agrupamiento)
+        self.escrituras = 0
+        inventario.al_cambiar_productos(self._al_cambiar)
+        self._rutas = {
+            ("GET", "/productos"): self._productos,
+            ("GET", "/productos/ids"): self._ids,
+            ("GET", "/productos/pagina"): self._pagina,
+            ("GET", "/productos/por_id"): self._por_id,
+            ("GET", "/productos/buscar"): self._buscar,
+            ("GET", "/productos/busqueda"): self._busqueda,
+            ("GET", "/productos/stock_bajo"): self._stock_bajo,
+            ("GET", "/productos/costo_usd"): self._costo_usd,
+            ("GET", "/totales"): self._totales,
+            ("GET", "/movimientos"): self._movimientos,
+            ("GET", "/movimientos/total"): self._total_movimientos,
+            ("GET", "/resumen"): self._resumen,
+            ("GET", "/cambios"): self._cambios_desde,
+            ("POST", "/productos"): self._agregar,
+            ("POST", "/ventas"): self._vender,
+            ("POST", "/entradas"): self._ingresar,
+            ("POST", "/precios"): self._precios,
+            ("POST", "/repreciar"): self._repreciar,
+            ("POST", "/eliminar"): self._eliminar,
+        }
+
+    async def iniciar(self, host="0.0.0.0", puerto=PUERTO):
+        # La base se migra en el hilo escritor, que es el único que escribe
+        await asyncio.get_running_loop().run_in_executor(self._escritor, inventario.init_db)
+        self._pendientes = asyncio.Queue()
+        self._tarea_escritor = asyncio.create_task(self._escribir_lotes())
+        self._servidor = await asyncio.start_server(self._atender, host, puerto)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        self._servidor.close()
+        for writer in list(self._conexiones):
+            writer.close()
+        await self._servidor.wait_closed()
+        self._tarea_escritor.cancel()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._escritor, db.cerrar_conexion)
+        self._escritor.shutdown()
+        for _ in range(HILOS_LECTURA):
+            self._lectores.submit(db.cerrar_conexion)
+        self._lectores.shutdown()
+        inventario._observadores.remove(self._al_cambiar)
+
+    # --- HTTP ---
+
+    async def _atender(self, reader, writer):
+        """Atiende una conexión (keep-alive: varias peticiones por conexión)."""
+        self._conexiones.add(writer)
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                try:
+                    metodo, destino, _ = linea.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    break
+                cabeceras = {}
+                while True:
+                    cabecera = await reader.readline()
+                    if cabecera in (b"\r\n", b"\n", b""):
+                        break
+                    clave, _, valor = cabecera.decode("latin-1").partition(":")
+                    cabeceras[clave.strip().lower()] = valor.strip()
+                largo = int(cabeceras.get("content-length") or 0)
+                if largo > CUERPO_MAXIMO:
+                    estado, respuesta = 413, {"error": "Pedido demasiado grande"}
+                else:
+                    cuerpo = await reader.readexactly(largo) if largo else b""
+                    estado, respuesta = await self._despachar(metodo, destino, cuerpo)
+                datos = json.dumps(respuesta, ensure_ascii=False).encode("utf-8")
+                cerrar = cabeceras.get("connection", "").lower() == "close" or largo > CUERPO_MAXIMO
+                writer.write(f"HTTP/1.1 {estado} {ESTADOS[estado]}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(datos)}\r\n"
+                             f"Connection: {'close' if cerrar else 'keep-alive'}\r\n\r\n".encode("latin-1") + datos)
+                await writer.drain()
+                if cerrar:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._conexiones.discard(writer)
+            writer.close()
+
+    async def _despachar(self, metodo, destino, cuerpo):
+        partes = urlsplit(destino)
+        manejador = self._rutas.get((metodo, partes.path.rstrip("/") or "/"))
+        if manejador is None:
+            if any(ruta == partes.path for _, ruta in self._rutas):
+                return 405, {"error": "Método no permitido"}
+            return 404, {"error": "Ruta inexistente"}
+        try:
+            datos = json.loads(cuerpo) if cuerpo else {}
+            return 200, await manejador(dict(parse_qsl(partes.query)), datos)
+        except inventario.StockInsuficiente as e:
+            return 409, {"error": str(e), "faltantes": e.faltantes}
+        except ErrorHTTP as e:
+            return e.estado, {"error": str(e)}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _leer(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._lectores, funcion, *args)
+
+    # --- Escrituras agrupadas ---
+
+    def _al_cambiar(self, cambios):
+        if self._cambios_operacion is not None:
+            self._cambios_operacion.extend(cambios)
+
+    async def _escribir(self, funcion, *args):
+        """Encola una escritura y espera a que su lote se confirme."""
+        futuro = asyncio.get_running_loop().create_future()
+        await self._pendientes.put((funcion, args, futuro))
+        return await futuro
+
+    async def _escribir_lotes(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._pendientes.get()]
+            while len(lote) < self.lote_maximo and not self._pendientes.empty():
+                lote.append(self._pendientes.get_nowait())
+            try:
+                resultados = await loop.run_in_executor(
+                    self._escritor, self._ejecutar_lote, [(funcion, args) for funcion, args, _ in lote])
+            except Exception as e:
+                # Falló el COMMIT: no quedó escrita ninguna operación del lote
+                for _, _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            self.lotes += 1
+            self.escrituras += len(lote)
+            for (_, _, futuro), (error, resultado, cambios) in zip(lote, resultados):
+                if futuro.done():
+                    continue  # el cliente se desconectó
+                if error is not None:
+                    futuro.set_exception(error)
+                    continue
+                versionados = []
+                for producto_id, antes, despues in cambios:
+                    self.version += 1
+                    self._cambios.append((self.version, producto_id, antes, despues))
+                    versionados.append((self.version, producto_id, antes, despues))
+                futuro.set_result({"resultado": resultado, "cambios": versionados})
+
+    def _ejecutar_lote(self, operaciones):
+        """
+        Corre en el hilo escritor. Ejecuta las operaciones en una transacción, cada una en su SAVEPOINT.
+        Retorna:
+            list: (error, resultado, cambios) por operación.
+        """
+        resultados = []
+        with db.transaccion(inmediata=True) as c:
+            for funcion, args in operaciones:
+                self._cambios_operacion = []
+                c.execute("SAVEPOINT operacion")
+                try:
+                    resultado = funcion(*args)
+                except Exception as e:
+                    c.execute("ROLLBACK TO operacion")
+                    resultados.append((e, None, []))
+                else:
+                    resultados.append((None, resultado, self._cambios_operacion))
+                finally:
+                    c.execute("RELEASE operacion")
+                    self._cambios_operacion = None
+        return resultados
+
+    # --- Rutas ---
+
+    async def _productos(self, params, cuerpo):
+        return await self._leer(inventario.get_productos)
+
+    async def _ids(self, params, cuerpo):
+        return list(await self._leer(inventario.get_ids_productos))
+
+    async def _pagina(self, params, cuerpo):
+        return await self._leer(inventario.get_pagina_productos,
+                                _entero(params, "desde_id", 0), _entero(params, "limite", 100))
+
+    async def _por_id(self, params, cuerpo):
+        try:
+            ids = [int(i) for i in params.get("ids", "").split(",") if i]
+        except ValueError:
+            raise ErrorHTTP(400, "'ids' debe ser una lista de números separados por comas")
+        return await self._leer(inventario.get_productos_por_id, ids)
+
+    async def _buscar(self, params, cuerpo):
+        return await self._leer(inventario.buscar_producto, params.get("texto", ""))
+
+    async def _busqueda(self, params, cuerpo):
+        return await self._leer(inventario.buscar_productos, params.get("texto", ""), _entero(params, "limite", 20))
+
+    async def _stock_bajo(self, params, cuerpo):
+        return await self._leer(inventario.get_stock_bajo)
+
+    async def _costo_usd(self, params, cuerpo):
+        return await self._leer(inventario.get_costo_usd, _entero(params, "producto_id"))
+
+    async def _totales(self, params, cuerpo):
+        def totales():
+            return {"iva": inventario.calcular_iva_total(), "stock_bajo": inventario.contar_stock_bajo()}
+        return await self._leer(totales)
+
+    def _filtros_movimientos(self, params):
+        if not params.get("desde") or not params.get("hasta"):
+            raise ErrorHTTP(400, "Faltan 'desde' y 'hasta'")
+        return params["desde"], params["hasta"], _entero(params, "producto_id"), params.get("tipo") or None
+
+    async def _movimientos(self, params, cuerpo):
+        despues_de = None
+        if params.get("despues_fecha"):
+            despues_de = (params["despues_fecha"], _entero(params, "despues_id", 0))
+        return await self._leer(inventario.get_pagina_movimientos, *self._filtros_movimientos(params),
+                                despues_de, _entero(params, "limite", 500))
+
+    async def _total_movimientos(self, params, cuerpo):
+        return {"total": await self._leer(inventario.contar_movimientos, *self._filtros_movimientos(params))}
+
+    async def _resumen(self, params, cuerpo):
+        desde, hasta, producto_id, _ = self._filtros_movimientos(params)
+        return await self._leer(resumenes.totales_periodo, desde, hasta, producto_id)
+
+    async def _cambios_desde(self, params, cuerpo):
+        """Cambios posteriores a la versión 'desde'; recargar=True si ya no se recuerdan todos."""
+        desde = _entero(params, "desde", self.version)
+        # desde > version: la caja sincronizó con este servidor antes de que se reiniciara
+        recargar = desde > self.version or (bool(self._cambios) and desde < self._cambios[0][0] - 1)
+        cambios = [] if recargar else [c for c in self._cambios if c[0] > desde]
+        return {"version": self.version, "instancia": self.instancia, "recargar": recargar, "cambios": cambios}
+
+    async def _agregar(self, params, cuerpo):
+        return await self._escribir(
+            inventario.add_producto, _campo(cuerpo, "nombre", str), _campo(cuerpo, "costo_real", float),
+            _campo(cuerpo, "costo_comprador", float), _campo(cuerpo, "iva", float),
+            _campo(cuerpo, "en_dolares", int), cuerpo.get("usd_price") or 0,
+            _campo(cuerpo, "cantidad", int), _campo(cuerpo, "min_stock", int))
+
+    async def _vender(self, params, cuerpo):
+        lineas = cuerpo.get("lineas")
+        if not isinstance(lineas, list):
+            raise ErrorHTTP(400, "Falta el campo 'lineas'")
+        try:
+            lineas = [(int(producto_id), int(cantidad)) for producto_id, cantidad in lineas]
+        except (TypeError, ValueError):
+            raise ErrorHTTP(400, "Cada línea debe ser [producto_id, cantidad]")
+        return await self._escribir(inventario.registrar_venta, lineas)
+
+    async def _ingresar(self, params, cuerpo):
+        cantidad = _campo(cuerpo, "cantidad", int)
+        if cantidad <= 0:
+            raise ErrorHTTP(400, "Cantidad inválida")
+        return await self._escribir(inventario.ingresar_stock, _campo(cuerpo, "producto_id", int), cantidad)
+
+    async def _precios(self, params, cuerpo):
+        return await self._escribir(inventario.modificar_precios, _campo(cuerpo, "producto_id", int),
+                                    _campo(cuerpo, "costo_real", float), _campo(cuerpo, "costo_comprador", float),
+                                    cuerpo.get("usd_price") or None)
+
+    async def _repreciar(self, params, cuerpo):
+        return await self._escribir(inventario.repreciar_dolares, _campo(cuerpo, "usd_price", float))
+
+    async def _eliminar(self, params, cuerpo):
+        return await self._escribir(inventario.eliminar_producto, _campo(cuerpo, "producto_id", int),
+                                    _campo(cuerpo, "nombre", str))
+
+
+async def servir(host, puerto):
+    servidor = ServidorStock()
+    await servidor.iniciar(host, puerto)
+    print(f"Servidor de stock en http://{host}:{servidor.puerto} (base: {db.DB_NAME})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servidor.detener()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor de stock para varias cajas.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--db", default=db.DB_NAME)
+    args = parser.parse_args()
+    db.usar_base(args.db)
+    try:
+        asyncio.run(servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        sys.exit(0)